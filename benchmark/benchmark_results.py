@@ -0,0 +1,95 @@
+import datetime
+import json
+import os
+import platform
+import resource
+from typing import Dict, List, Optional
+
+
+class BenchmarkResults:
+    """Machine readable benchmark results (JSON) and their comparison against a saved baseline"""
+
+    @classmethod
+    def create(cls, kind: str, results: Dict[str, Dict]) -> Dict:
+        return {
+            "kind": kind,
+            "created": datetime.datetime.now().astimezone().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results,
+        }
+
+    @classmethod
+    def save(cls, data: Dict, file_path: str):
+        dir_path = os.path.dirname(file_path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        with open(file_path, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+    @classmethod
+    def load(cls, file_path: str) -> Dict:
+        with open(file_path) as f:
+            return json.load(f)
+
+    @classmethod
+    def compare(cls, current: Dict, baseline: Dict, higher_is_better: List[str], lower_is_better: List[str], tolerance: float) -> List[str]:
+        """Returns the list of regressions: a metric got worse than `tolerance` (relative) compared to the baseline."""
+        regressions = []
+
+        for name, result in current["results"].items():
+            base_result = baseline["results"].get(name)
+            if not base_result:
+                continue
+
+            for metric in higher_is_better:
+                value, base_value = result.get(metric), base_result.get(metric)
+                if value is not None and base_value and value < base_value * (1 - tolerance):
+                    regressions.append(f"{name}: {metric} {value:.6g} < {base_value:.6g} (baseline)")
+
+            for metric in lower_is_better:
+                value, base_value = result.get(metric), base_result.get(metric)
+                if value is not None and base_value and value > base_value * (1 + tolerance):
+                    regressions.append(f"{name}: {metric} {value:.6g} > {base_value:.6g} (baseline)")
+
+        return regressions
+
+    @classmethod
+    def percentile(cls, values: List[float], percent: float) -> Optional[float]:
+        if not values:
+            return None
+        values = sorted(values)
+        index = min(len(values) - 1, max(0, int(round(percent / 100 * len(values))) - 1))
+        return values[index]
+
+    @classmethod
+    def get_rss_mb(cls) -> float:
+        """Current resident set size (Linux); falls back to the peak value"""
+        try:
+            with open("/proc/self/statm") as f:
+                pages = int(f.read().split()[1])
+            return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+        except (OSError, ValueError, IndexError):
+            return cls.get_peak_rss_mb()
+
+    @classmethod
+    def reset_peak_rss(cls) -> bool:
+        """Linux: resets the peak resident set size ("VmHWM"), so it can be measured per scenario; False: not supported"""
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+            return True
+        except OSError:
+            return False
+
+    @classmethod
+    def get_peak_rss_mb(cls) -> float:
+        """Peak resident set size since `reset_peak_rss` (Linux); falls back to the peak of the whole process"""
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) / 1024  # KB
+        except (OSError, ValueError, IndexError):
+            pass
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks of the per-message hot path (no broker, no database: COPY goes into a fake sink).
+
+Run from the project dir:
+    python -m benchmark.micro_benchmark --output ./__test__/benchmark/micro.json
+    python -m benchmark.micro_benchmark --baseline ./__test__/benchmark/micro.json
+"""
+import datetime
+import statistics
+import sys
+import threading
+import time
+from typing import Callable, Dict, List
+from unittest import mock
+
+import click
+from paho.mqtt.client import MQTTMessage
+from tzlocal import get_localzone
+
+from benchmark.benchmark_results import BenchmarkResults
+from src.database import DatabaseConfKey
+from src.memory_budget import MemoryBudget
+from src.message import Message
+from src.message_store import MessageStore
+from src.mqtt_client import MqttConfKey
+from src.mqtt_listener import MqttListener
+from src.proxy_store import ProxyStore
+from test.fake_connection import FakeConnection
+from test.setup_test import SetupTest
+
+
+BATCH_SIZE = 1000
+
+
+def create_mqtt_messages(count: int, json_payload=False) -> List[MQTTMessage]:
+    mqtt_messages = []
+    for i in range(count):
+        mqtt_message = MQTTMessage(mid=i + 1, topic=f"bench/device{i % 100}/state".encode("utf-8"))
+        mqtt_message.payload = ('{"value": %d, "unit": "W"}' % i if json_payload else str(i)).encode("utf-8")
+        mqtt_message.qos = 1
+        mqtt_messages.append(mqtt_message)
+    return mqtt_messages
+
+
+def create_messages(count: int) -> List[Message]:
+    time_now = datetime.datetime.now(tz=get_localzone())
+    return [
+        Message(message_id=i + 1, topic=f"bench/device{i % 100}/state", text=str(i), qos=1, retain=0, time=time_now)
+        for i in range(count)
+    ]
+
+
+DATABASE_CONFIG = SetupTest.get_fake_database_config(**{DatabaseConfKey.BATCH_SIZE: BATCH_SIZE})
+
+
+MQTT_CONFIG = {
+    MqttConfKey.HOST: "localhost",
+    MqttConfKey.PORT: 1883,
+    MqttConfKey.SUBSCRIPTIONS: ["bench/#"],
+    MqttConfKey.SKIP_SUBSCRIPTION_REGEXES: ["^bench/device9[0-9]/", "^bench/skipped/", "/debug$"],
+}
+
+
+def create_message_store() -> MessageStore:
+    message_store = MessageStore(DATABASE_CONFIG)
+    message_store._connection = FakeConnection(keep_rows=False)
+    return message_store
+
+
+def create_proxy_store() -> ProxyStore:
+    with mock.patch.object(threading.Thread, "start"):  # no writer thread, `_store_messages` is called directly
+        proxy_store = ProxyStore(DATABASE_CONFIG)
+    proxy_store._message_store._connection = FakeConnection(keep_rows=False)
+    return proxy_store
+
+
+def bench_message_create() -> Callable:
+    mqtt_messages = create_mqtt_messages(BATCH_SIZE)
+
+    def run():
+        for mqtt_message in mqtt_messages:
+            Message.create(mqtt_message)
+
+    return run
+
+
+def bench_listener_on_message() -> Callable:
+    listener = MqttListener(MQTT_CONFIG)
+    mqtt_messages = create_mqtt_messages(BATCH_SIZE)
+
+    def run():
+        for mqtt_message in mqtt_messages:
+            listener._on_message(None, None, mqtt_message)
+        listener.get_messages()
+
+    return run
+
+
+def bench_listener_accept_topic() -> Callable:
+    listener = MqttListener(MQTT_CONFIG)
+    topics = [f"bench/device{i % 100}/state" for i in range(BATCH_SIZE)]
+
+    def run():
+        for topic in topics:
+            listener._accept_topic(topic)
+
+    return run
+
+
+def bench_proxy_store_queue() -> Callable:
+    proxy_store = create_proxy_store()
+    messages = create_messages(BATCH_SIZE)
+    messages_bytes = sum(MemoryBudget.message_size(m) for m in messages)
+
+    def run():
+        proxy_store.queue(messages)
+        proxy_store._messages.pop_all()
+        proxy_store._memory_budget.release(messages_bytes)  # as after storing, otherwise the budget fills up (drop path)
+
+    return run
+
+
+def bench_proxy_store_store_messages() -> Callable:
+    proxy_store = create_proxy_store()
+    messages = create_messages(BATCH_SIZE)
+
+    def run():
+        proxy_store.queue(messages)
+        proxy_store._store_messages()
+
+    return run
+
+
+def bench_message_store_store() -> Callable:
+    message_store = create_message_store()
+    messages = create_messages(BATCH_SIZE)
+
+    def run():
+        message_store.store(messages)
+
+    return run
+
+
+BENCHMARKS: Dict[str, Callable[[], Callable]] = {
+    "message_create": bench_message_create,
+    "listener_on_message": bench_listener_on_message,
+    "listener_accept_topic": bench_listener_accept_topic,
+    "proxy_store_queue": bench_proxy_store_queue,
+    "proxy_store_store_messages": bench_proxy_store_store_messages,
+    "message_store_store": bench_message_store_store,
+}
+
+
+def measure(run: Callable, rounds: int, min_round_seconds: float) -> Dict:
+    """Calls `run` (processing `BATCH_SIZE` messages) repeatedly; each round lasts at least `min_round_seconds`."""
+    run()  # warm up
+
+    round_times = []
+    for _ in range(rounds):
+        calls = 0
+        time_start = time.perf_counter()
+        while True:
+            run()
+            calls += 1
+            elapsed = time.perf_counter() - time_start
+            if elapsed >= min_round_seconds:
+                break
+        round_times.append(elapsed / calls / BATCH_SIZE)
+
+    return {
+        "ns_per_message_min": min(round_times) * 1e9,
+        "ns_per_message_median": statistics.median(round_times) * 1e9,
+        "messages_per_second": 1 / min(round_times),
+        "rounds": rounds,
+    }
+
+
+HIGHER_IS_BETTER = ["messages_per_second"]
+LOWER_IS_BETTER = ["ns_per_message_min"]
+
+
+@click.command()
+@click.option("--benchmark", "names", multiple=True, type=click.Choice(list(BENCHMARKS.keys())), help="Run selected benchmarks only")
+@click.option("--rounds", type=int, default=5, show_default=True)
+@click.option("--round-seconds", type=float, default=0.2, show_default=True, help="Minimal duration of a round")
+@click.option("--output", help="Write results as JSON", default=None)
+@click.option("--baseline", type=click.Path(exists=True), help="Compare against saved results; exit code 1 on regression")
+@click.option("--tolerance", type=float, default=0.1, show_default=True, help="Relative tolerance for regressions")
+def _main(names, rounds, round_seconds, output, baseline, tolerance):
+    results = {}
+    for name in (names or BENCHMARKS.keys()):
+        result = measure(BENCHMARKS[name](), rounds, round_seconds)
+        results[name] = result
+        click.echo("{:<30} {:>10.0f} ns/msg (median {:>8.0f})  {:>12.0f} msg/s".format(
+            name, result["ns_per_message_min"], result["ns_per_message_median"], result["messages_per_second"]
+        ))
+
+    data = BenchmarkResults.create("micro", results)
+    if output:
+        BenchmarkResults.save(data, output)
+
+    if baseline:
+        regressions = BenchmarkResults.compare(data, BenchmarkResults.load(baseline), HIGHER_IS_BETTER, LOWER_IS_BETTER, tolerance)
+        for regression in regressions:
+            click.echo("REGRESSION: " + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: import time of the CLI (fresh interpreter), config loading and time to the first stored message
+(service start => retained message stored; needs a local Postgres like the throughput benchmark).
+
+Run from the project dir:
+    python -m benchmark.startup_benchmark --output ./__test__/benchmark/startup.json
+    python -m benchmark.startup_benchmark --no-service --baseline ./__test__/benchmark/startup.json
+"""
+import copy
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Dict, List
+from unittest import mock
+
+import click
+import yaml
+
+from benchmark.benchmark_results import BenchmarkResults
+from src.app_config import AppConfig
+from src.database import DatabaseConfKey
+from src.lifecycle_control import LifecycleControl
+from src.message_store import MessageStore
+from src.mqtt_client import MqttConfKey
+from src.mqtt_pg_logger import run_service
+from test.mocked_lifecycle_control import MockedLifecycleControl
+from test.mqtt_broker import MqttBroker
+from test.setup_test import SetupTest
+
+
+TOPIC_BASE = "bench"
+
+
+def write_config_file(database_config: Dict, broker_host="localhost", broker_port=1883) -> str:
+    config_data = {
+        "database": database_config,
+        "mqtt": {
+            MqttConfKey.HOST: broker_host,
+            MqttConfKey.PORT: broker_port,
+            MqttConfKey.CLIENT_ID: "mqtt-pg-logger-benchmark",
+            MqttConfKey.SUBSCRIPTIONS: [TOPIC_BASE + "/#"],
+        },
+    }
+
+    config_file = SetupTest.get_test_path("benchmark_startup_config.yaml")
+    with open(config_file, "w") as f:
+        yaml.dump(config_data, f, default_flow_style=False)
+    os.chmod(config_file, 0o600)
+    return config_file
+
+
+def run_python(arguments: List[str]) -> Callable[[], float]:
+    """Fresh interpreter each time (no cached modules), so the whole import path is measured."""
+    project_dir = SetupTest.get_project_dir()
+    env = {**os.environ, "PYTHONPATH": project_dir}
+
+    def run() -> float:
+        time_start = time.perf_counter()
+        subprocess.run([sys.executable, *arguments], cwd=project_dir, env=env, check=True, stdout=subprocess.DEVNULL)
+        return time.perf_counter() - time_start
+
+    return run
+
+
+def load_config() -> Callable[[], float]:
+    config_file = write_config_file({DatabaseConfKey.HOST: "localhost", DatabaseConfKey.PORT: 5432, DatabaseConfKey.DATABASE: "bench"})
+
+    def run() -> float:
+        time_start = time.perf_counter()
+        AppConfig(config_file)
+        return time.perf_counter() - time_start
+
+    return run
+
+
+def first_stored_message(broker: MqttBroker) -> Callable[[], float]:
+    """Service start => first (retained) message committed; includes MQTT and database connect."""
+
+    def run() -> float:
+        SetupTest.execute_commands(["TRUNCATE journal"])
+        broker.publish(TOPIC_BASE + "/retained", b"retained", qos=1, retain=True)
+
+        stored_event = threading.Event()
+        original_store = MessageStore.store
+
+        def store(store_self, messages, *args, **kwargs):
+            result = original_store(store_self, messages, *args, **kwargs)
+            stored_event.set()
+            return result
+
+        database_config = copy.deepcopy(SetupTest.get_database_params())
+        database_config[DatabaseConfKey.WAIT_MAX_SECONDS] = 10  # default; must not delay the first message
+        config_file = write_config_file(database_config, broker.host, broker.port)
+
+        mocked_lifecycle = MockedLifecycleControl.get_instance()
+        mocked_lifecycle.reset()
+
+        with mock.patch.object(LifecycleControl, "get_instance", MockedLifecycleControl.get_instance), \
+                mock.patch.object(MessageStore, "store", store):
+            time_start = time.perf_counter()
+            service_thread = threading.Thread(
+                target=run_service, args=(config_file, False, None, "warning", True, False), daemon=True
+            )
+            service_thread.start()
+            try:
+                if not stored_event.wait(30):
+                    raise RuntimeError("first message was not stored in time!")
+                return time.perf_counter() - time_start
+            finally:
+                mocked_lifecycle.shutdown()
+                service_thread.join(30)
+
+    return run
+
+
+def measure(run: Callable[[], float], rounds: int) -> Dict:
+    run()  # warm up (file system cache, ...)
+    times = [run() for _ in range(rounds)]
+    return {
+        "ms_min": min(times) * 1000,
+        "ms_median": statistics.median(times) * 1000,
+        "rounds": rounds,
+    }
+
+
+HIGHER_IS_BETTER = []
+LOWER_IS_BETTER = ["ms_min"]
+
+
+@click.command()
+@click.option("--rounds", type=int, default=5, show_default=True)
+@click.option("--service/--no-service", default=True, show_default=True, help="Measure time to first stored message (needs Postgres)")
+@click.option("--output", help="Write results as JSON", default=None)
+@click.option("--baseline", type=click.Path(exists=True), help="Compare against saved results; exit code 1 on regression")
+@click.option("--tolerance", type=float, default=0.2, show_default=True, help="Relative tolerance for regressions")
+def _main(rounds, service, output, baseline, tolerance):
+    SetupTest.ensure_test_dir()
+
+    benchmarks = {
+        "python_startup": run_python(["-c", "pass"]),  # reference
+        "import_cli": run_python(["-c", "import src.mqtt_pg_logger"]),
+        "cli_help": run_python(["src/mqtt_pg_logger.py", "--help"]),
+        "load_config": load_config(),
+    }
+
+    results = {}
+
+    def run_benchmarks():
+        for name, run in benchmarks.items():
+            result = measure(run, rounds)
+            results[name] = result
+            click.echo("{:<25} {:>10.1f} ms (median {:>8.1f} ms)".format(name, result["ms_min"], result["ms_median"]))
+
+    if service:
+        SetupTest.init_database()
+        try:
+            with MqttBroker() as broker:
+                benchmarks["first_stored_message"] = first_stored_message(broker)
+                run_benchmarks()
+        finally:
+            SetupTest.close_database(shutdown=True)
+    else:
+        run_benchmarks()
+
+    data = BenchmarkResults.create("startup", results)
+    if output:
+        BenchmarkResults.save(data, output)
+
+    if baseline:
+        regressions = BenchmarkResults.compare(data, BenchmarkResults.load(baseline), HIGHER_IS_BETTER, LOWER_IS_BETTER, tolerance)
+        for regression in regressions:
+            click.echo("REGRESSION: " + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark: in-process MQTT broker stand-in => mqtt-pg-logger service => local Postgres.
+
+Run from the project dir:
+    python -m benchmark.throughput_benchmark --output ./__test__/benchmark/throughput.json
+    python -m benchmark.throughput_benchmark --baseline ./__test__/benchmark/throughput.json
+"""
+import copy
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+from unittest import mock
+
+import attr
+import click
+import yaml
+
+from benchmark.benchmark_results import BenchmarkResults
+from src.database import DatabaseConfKey
+from src.lifecycle_control import LifecycleControl
+from src.message_store import MessageStore
+from src.mqtt_client import MqttConfKey
+from src.mqtt_pg_logger import run_service
+from test.mocked_lifecycle_control import MockedLifecycleControl
+from test.mqtt_broker import MqttBroker
+from test.setup_test import SetupTest
+
+
+@attr.s
+class Scenario:
+    name: str = attr.ib()
+
+    message_count: int = attr.ib(default=10000)
+    topic_count: int = attr.ib(default=10)
+    payload_size: int = attr.ib(default=50)
+    json_payload: bool = attr.ib(default=False)
+    rate: int = attr.ib(default=0)  # messages per second; 0 == burst (as fast as possible)
+    qos: int = attr.ib(default=1)
+
+    batch_size: int = attr.ib(default=100)
+    wait_max_seconds: int = attr.ib(default=1)
+
+
+# list values are expanded into a grid (cartesian product)
+DEFAULT_SCENARIOS = [
+    {"name": "burst-plain", "message_count": 20000, "topic_count": 10, "batch_size": [100, 1000, 10000]},
+    {"name": "burst-json", "message_count": 20000, "topic_count": 1000, "json_payload": True, "batch_size": [100, 1000]},
+    {"name": "burst-large-payload", "message_count": 10000, "payload_size": 4000, "batch_size": [100, 1000]},
+    {"name": "steady", "message_count": 5000, "rate": 1000, "wait_max_seconds": [1, 5]},
+]
+
+
+def expand_scenarios(definitions: List[Dict]) -> List[Scenario]:
+    scenarios = []
+    for definition in definitions:
+        grid_keys = [k for k, v in definition.items() if isinstance(v, list)]
+        grid_values = [definition[k] for k in grid_keys]
+
+        for values in itertools.product(*grid_values):
+            data = {**definition, **dict(zip(grid_keys, values))}
+            if grid_keys:
+                data["name"] = "{}[{}]".format(data["name"], ",".join(f"{k}={v}" for k, v in zip(grid_keys, values)))
+            scenarios.append(Scenario(**data))
+
+    return scenarios
+
+
+class LatencyRecorder:
+    """Tracks publish and commit time of each message (payloads are unique)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sent_times: Dict[str, float] = {}
+        self.latencies: List[float] = []
+        self.first_sent: Optional[float] = None
+        self.last_stored: Optional[float] = None
+
+    def sent(self, text: str):
+        now = time.perf_counter()
+        with self._lock:
+            if self.first_sent is None:
+                self.first_sent = now
+            self._sent_times[text] = now
+
+    def stored(self, messages):
+        now = time.perf_counter()
+        with self._lock:
+            self.last_stored = now
+            for message in messages:
+                sent_time = self._sent_times.pop(message.text, None)
+                if sent_time is not None:
+                    self.latencies.append(now - sent_time)
+
+    @property
+    def stored_count(self) -> int:
+        with self._lock:
+            return len(self.latencies)
+
+
+class ThroughputBenchmark:
+
+    TOPIC_BASE = "bench"
+
+    def __init__(self, broker: MqttBroker):
+        self._broker = broker
+
+    def run(self, scenario: Scenario) -> Dict:
+        SetupTest.execute_commands(["TRUNCATE journal"])
+        peak_rss_reset = BenchmarkResults.reset_peak_rss()
+
+        recorder = LatencyRecorder()
+        original_store = MessageStore.store
+
+        def store(store_self, messages, *args, **kwargs):
+            result = original_store(store_self, messages, *args, **kwargs)
+            recorder.stored(messages)
+            return result
+
+        mocked_lifecycle = MockedLifecycleControl.get_instance()
+        mocked_lifecycle.reset()
+
+        with mock.patch.object(LifecycleControl, "get_instance", MockedLifecycleControl.get_instance), \
+                mock.patch.object(MessageStore, "store", store):
+            service_thread = self._start_service(scenario, mocked_lifecycle)
+            try:
+                self._wait_for_subscription()
+                self._publish(scenario, recorder)
+
+                time_out = time.monotonic() + 60 + scenario.message_count / 1000
+                while recorder.stored_count < scenario.message_count and time.monotonic() < time_out:
+                    time.sleep(0.01)
+            finally:
+                mocked_lifecycle.shutdown()
+                service_thread.join(60)
+
+        duration = (recorder.last_stored or time.perf_counter()) - (recorder.first_sent or 0)
+        stored_count = recorder.stored_count
+        percentile = BenchmarkResults.percentile
+
+        return {
+            "scenario": attr.asdict(scenario),
+            "stored": stored_count,
+            "lost": scenario.message_count - stored_count,
+            "duration_seconds": duration,
+            "messages_per_second": stored_count / duration if duration > 0 else None,
+            "latency_p50_ms": self._to_ms(percentile(recorder.latencies, 50)),
+            "latency_p99_ms": self._to_ms(percentile(recorder.latencies, 99)),
+            "latency_max_ms": self._to_ms(max(recorder.latencies) if recorder.latencies else None),
+            "rss_mb": BenchmarkResults.get_rss_mb(),
+            # the peak of the whole process (all scenarios so far) is no per scenario metric
+            "rss_peak_mb": BenchmarkResults.get_peak_rss_mb() if peak_rss_reset else None,
+        }
+
+    def _start_service(self, scenario: Scenario, mocked_lifecycle) -> threading.Thread:
+        database_config = copy.deepcopy(SetupTest.get_database_params())
+        database_config[DatabaseConfKey.BATCH_SIZE] = scenario.batch_size
+        database_config[DatabaseConfKey.WAIT_MAX_SECONDS] = scenario.wait_max_seconds
+
+        config_data = {
+            "database": database_config,
+            "mqtt": {
+                MqttConfKey.HOST: self._broker.host,
+                MqttConfKey.PORT: self._broker.port,
+                MqttConfKey.CLIENT_ID: "mqtt-pg-logger-benchmark",
+                MqttConfKey.SUBSCRIPTIONS: [self.TOPIC_BASE + "/#"],
+            },
+        }
+
+        config_file = SetupTest.get_test_path("benchmark_config.yaml")
+        with open(config_file, "w") as f:
+            yaml.dump(config_data, f, default_flow_style=False)
+        os.chmod(config_file, 0o600)
+
+        def run_service_locally():
+            try:
+                run_service(config_file, False, None, "warning", True, False)
+            except Exception as ex:
+                mocked_lifecycle.set_exception(ex)
+                raise
+
+        service_thread = threading.Thread(target=run_service_locally, daemon=True)
+        service_thread.start()
+        return service_thread
+
+    def _wait_for_subscription(self):
+        time_out = time.monotonic() + 10
+        while time.monotonic() < time_out:
+            if self._broker.subscription_count > 0:
+                return
+            time.sleep(0.01)
+        raise RuntimeError("service did not subscribe in time!")
+
+    def _publish(self, scenario: Scenario, recorder: LatencyRecorder):
+        topics = [f"{self.TOPIC_BASE}/device{i}/state" for i in range(scenario.topic_count)]
+        padding = "x" * max(0, scenario.payload_size - 24)
+        interval = 1 / scenario.rate if scenario.rate > 0 else 0
+        time_start = time.perf_counter()
+
+        for i in range(scenario.message_count):
+            if scenario.json_payload:
+                text = json.dumps({"seq": i, "value": i % 100, "pad": padding})
+            else:
+                text = f"{i} {padding}"
+
+            if interval:
+                delay = time_start + i * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            recorder.sent(text)
+            self._broker.publish(topics[i % len(topics)], text.encode("utf-8"), qos=scenario.qos)
+
+    @classmethod
+    def _to_ms(cls, value: Optional[float]) -> Optional[float]:
+        return None if value is None else value * 1000
+
+
+HIGHER_IS_BETTER = ["messages_per_second"]
+LOWER_IS_BETTER = ["latency_p99_ms", "rss_peak_mb"]
+
+
+@click.command()
+@click.option("--scenario-file", type=click.Path(exists=True), help="YAML file with a list of scenarios (default: built-in grid)")
+@click.option("--scenario", "scenario_filter", multiple=True, help="Run only scenarios whose name starts with this prefix")
+@click.option("--output", help="Write results as JSON", default=None)
+@click.option("--baseline", type=click.Path(exists=True), help="Compare against saved results; exit code 1 on regression")
+@click.option("--tolerance", type=float, default=0.2, show_default=True, help="Relative tolerance for regressions")
+def _main(scenario_file, scenario_filter, output, baseline, tolerance):
+    if scenario_file:
+        with open(scenario_file) as f:
+            definitions = yaml.safe_load(f)
+    else:
+        definitions = DEFAULT_SCENARIOS
+
+    scenarios = expand_scenarios(definitions)
+    if scenario_filter:
+        scenarios = [s for s in scenarios if any(s.name.startswith(p) for p in scenario_filter)]
+
+    SetupTest.ensure_test_dir()
+    SetupTest.init_database()
+
+    results = {}
+    try:
+        with MqttBroker() as broker:
+            benchmark = ThroughputBenchmark(broker)
+            for scenario in scenarios:
+                result = benchmark.run(scenario)
+                results[scenario.name] = result
+                click.echo("{:<50} {:>10.0f} msg/s  p50={:>8.1f}ms  p99={:>8.1f}ms  rss={:>6.1f}MB  lost={}".format(
+                    scenario.name, result["messages_per_second"] or 0, result["latency_p50_ms"] or 0, result["latency_p99_ms"] or 0,
+                    result["rss_mb"], result["lost"]
+                ))
+    finally:
+        SetupTest.close_database(shutdown=True)
+
+    data = BenchmarkResults.create("throughput", results)
+    if output:
+        BenchmarkResults.save(data, output)
+
+    if baseline:
+        regressions = BenchmarkResults.compare(data, BenchmarkResults.load(baseline), HIGHER_IS_BETTER, LOWER_IS_BETTER, tolerance)
+        for regression in regressions:
+            click.echo("REGRESSION: " + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,11 @@
+-- The content of this file is parsed into commands by a quite simple algorithm. So please don't use ";" in comments
+
+-- Optional broker column (config "broker_id_column: true", see README). It is filled with the "broker_id" of the MQTT
+-- broker which received a message (several brokers in one logger). Adding a nullable column doesn't rewrite existing
+-- tables. Adapt the table names if an individual "table_name" is configured.
+
+ALTER TABLE journal ADD COLUMN IF NOT EXISTS broker_id VARCHAR(64);
+
+COMMENT ON COLUMN journal.broker_id is 'Configured id of the receiving MQTT broker (mqtt "broker_id").';
+
+ALTER TABLE journal_staging ADD COLUMN IF NOT EXISTS broker_id VARCHAR(64);
@@ -0,0 +1,20 @@
+-- The content of this file is parsed into commands by a quite simple algorithm. So please don't use ";" in comments
+
+-- Optional staging table for "ingest_mode: staging" (see README). New messages are copied into this UNLOGGED table (no WAL,
+-- no trigger, no index besides the primary key) and are moved into "journal" in larger chunks by a background merger.
+-- Postgres truncates UNLOGGED tables after a crash (not after a clean shutdown), so messages not merged yet get lost then.
+
+CREATE UNLOGGED TABLE IF NOT EXISTS journal_staging (
+    staging_id BIGSERIAL PRIMARY KEY,
+
+    topic VARCHAR(256),
+    text VARCHAR(4096),
+
+    message_id INTEGER,
+    qos INTEGER,
+    retain INTEGER,
+
+    time TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE journal_staging is 'Unlogged ingest buffer, merged into journal (see StagingMerger).';
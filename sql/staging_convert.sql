@@ -0,0 +1,12 @@
+CREATE OR REPLACE FUNCTION journal_try_json(value TEXT)
+  RETURNS JSONB
+  LANGUAGE PLPGSQL
+  IMMUTABLE
+  AS
+$$
+BEGIN
+	RETURN value::JSONB;
+EXCEPTION WHEN OTHERS THEN
+	RETURN NULL;
+END;
+$$
@@ -0,0 +1,17 @@
+-- The content of this file is parsed into commands by a quite simple algorithm. So please don't use ";" in comments
+
+-- Optional typed value columns (config "value_columns: true", see README). They are filled by the logger while a batch is
+-- encoded: bare numeric/boolean payloads or a JSON path per topic (config "value_json_paths"). Adding nullable columns
+-- doesn't rewrite existing tables. Adapt the table names if an individual "table_name" is configured.
+
+ALTER TABLE journal ADD COLUMN IF NOT EXISTS value_num DOUBLE PRECISION;
+ALTER TABLE journal ADD COLUMN IF NOT EXISTS value_bool BOOLEAN;
+
+COMMENT ON COLUMN journal.value_num is 'Numeric value of the payload (bare number or configured JSON path).';
+COMMENT ON COLUMN journal.value_bool is 'Boolean value of the payload (true/false, ON/OFF or configured JSON path).';
+
+ALTER TABLE journal_staging ADD COLUMN IF NOT EXISTS value_num DOUBLE PRECISION;
+ALTER TABLE journal_staging ADD COLUMN IF NOT EXISTS value_bool BOOLEAN;
+
+-- e.g. for aggregations of single topics:
+-- CREATE INDEX CONCURRENTLY journal_topic_time_value_idx ON journal ( topic, time ) INCLUDE ( value_num );
@@ -1,19 +1,43 @@
 import os
+from typing import Dict, List
 
 import yaml
-from jsonschema import validate
+from jsonschema import validators
 
 from src.app_logging import LOGGING_JSONSCHEMA
+from src.app_profiling import PROFILING_JSONSCHEMA
 from src.database import DATABASE_JSONSCHEMA
 from src.mqtt_client import MQTT_JSONSCHEMA
 
 
+# here, not in `control_server`: each command loads the config, but only the service and 'control' need the server
+class ControlConfKey:
+    SOCKET_PATH = "socket_path"
+
+
+CONTROL_JSONSCHEMA = {
+    "type": "object",
+    "properties": {
+        ControlConfKey.SOCKET_PATH: {
+            "type": "string", "minLength": 1,
+            "description": "UNIX socket for inspection and live tuning (see command 'control'). Default: not set (disabled)"
+        },
+    },
+    "additionalProperties": False,
+}
+
+
 CONFIG_JSONSCHEMA = {
     "type": "object",
     "properties": {
         "database": DATABASE_JSONSCHEMA,
         "logging": LOGGING_JSONSCHEMA,
-        "mqtt": MQTT_JSONSCHEMA,
+        "mqtt": {
+            "oneOf": [MQTT_JSONSCHEMA, {"type": "array", "items": MQTT_JSONSCHEMA, "minItems": 1}],
+            "description": "One broker or a list of brokers (each with its own listener, one shared database queue)",
+        },
+        "profiling": PROFILING_JSONSCHEMA,
+        "control": CONTROL_JSONSCHEMA,
     },
     "additionalProperties": False,
     "required": ["database", "mqtt"],
@@ -22,7 +46,10 @@ CONFIG_JSONSCHEMA = {
 
 class AppConfig:
 
+    _validator = None  # built once: `jsonschema.validate` checks the schema itself and builds a new validator on each call
+
     def __init__(self, config_file):
+        self._config_file = config_file
         self._config_data = {}
 
         self.check_config_file_access(config_file)
@@ -31,11 +58,15 @@ class AppConfig:
             file_data = yaml.unsafe_load(stream)
 
         self._config_data = {
-            **{"database": {}, "logging": {}, "mqtt": {}},  # default
+            **{"database": {}, "logging": {}, "mqtt": {}, "profiling": {}, "control": {}},  # default
             **file_data
         }
 
-        validate(file_data, CONFIG_JSONSCHEMA)
+        self.get_validator().validate(file_data)
+
+    @property
+    def config_file(self) -> str:
+        return self._config_file
 
     def get_database_config(self):
         return self._config_data["database"]
@@ -44,7 +75,25 @@ class AppConfig:
         return self._config_data["logging"]
 
     def get_mqtt_config(self):
-        return self._config_data["mqtt"]
+        """The (first) broker; see `get_mqtt_configs`"""
+        return self.get_mqtt_configs()[0]
+
+    def get_mqtt_configs(self) -> List[Dict]:
+        mqtt_config = self._config_data["mqtt"]
+        return mqtt_config if isinstance(mqtt_config, list) else [mqtt_config]
+
+    def get_profiling_config(self):
+        return self._config_data["profiling"]
+
+    def get_control_config(self):
+        return self._config_data["control"]
+
+    @classmethod
+    def get_validator(cls):
+        if cls._validator is None:
+            # the schema itself is checked by the tests (see `TestAppConfig`), not on each start
+            cls._validator = validators.validator_for(CONFIG_JSONSCHEMA)(CONFIG_JSONSCHEMA)
+        return cls._validator
 
     @classmethod
     def check_config_file_access(cls, config_file):
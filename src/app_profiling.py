@@ -0,0 +1,182 @@
+import datetime
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Optional
+
+
+_logger = logging.getLogger(__name__)
+
+
+class ProfilingConfKey:
+    OUTPUT_DIR = "output_dir"
+    SAMPLE_SECONDS = "sample_seconds"
+    SAMPLE_INTERVAL = "sample_interval"
+    TRACEMALLOC_FRAMES = "tracemalloc_frames"
+
+
+PROFILING_JSONSCHEMA = {
+    "type": "object",
+    "properties": {
+        ProfilingConfKey.OUTPUT_DIR: {"type": "string", "minLength": 1, "description": "Directory for profiling results"},
+        ProfilingConfKey.SAMPLE_SECONDS: {
+            "type": "number", "exclusiveMinimum": 0,
+            "description": "Duration (seconds) of thread sampling triggered by SIGUSR1. Default: 30"
+        },
+        ProfilingConfKey.SAMPLE_INTERVAL: {
+            "type": "number", "exclusiveMinimum": 0,
+            "description": "Interval (seconds) between two thread samples. Default: 0.01"
+        },
+        ProfilingConfKey.TRACEMALLOC_FRAMES: {
+            "type": "integer", "minimum": 1,
+            "description": "Stored frames per memory allocation (tracemalloc). Default: 10"
+        },
+    },
+    "additionalProperties": False,
+}
+
+
+class AppProfiling:
+    """
+    On-demand profiling of the running service (no restart needed):
+    - `start_sampling` (SIGUSR1) samples the stacks of all threads and writes a collapsed stack file (flamegraph input).
+    - `snapshot_memory` (SIGUSR2) starts tracemalloc on first call and writes a snapshot diff on each further call.
+    """
+
+    DEFAULT_SAMPLE_SECONDS = 30
+    DEFAULT_SAMPLE_INTERVAL = 0.01
+    DEFAULT_TRACEMALLOC_FRAMES = 10
+
+    TOP_STATS_COUNT = 50
+
+    _lock = threading.Lock()
+
+    _output_dir: Optional[str] = None
+    _sample_seconds = DEFAULT_SAMPLE_SECONDS
+    _sample_interval = DEFAULT_SAMPLE_INTERVAL
+    _tracemalloc_frames = DEFAULT_TRACEMALLOC_FRAMES
+
+    _sampler_thread: Optional[threading.Thread] = None
+    _last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+    @classmethod
+    def configure(cls, config_data):
+        with cls._lock:
+            cls._output_dir = config_data.get(ProfilingConfKey.OUTPUT_DIR)
+            cls._sample_seconds = config_data.get(ProfilingConfKey.SAMPLE_SECONDS, cls.DEFAULT_SAMPLE_SECONDS)
+            cls._sample_interval = config_data.get(ProfilingConfKey.SAMPLE_INTERVAL, cls.DEFAULT_SAMPLE_INTERVAL)
+            cls._tracemalloc_frames = config_data.get(ProfilingConfKey.TRACEMALLOC_FRAMES, cls.DEFAULT_TRACEMALLOC_FRAMES)
+
+    @classmethod
+    def get_output_dir(cls) -> str:
+        output_dir = cls._output_dir or tempfile.gettempdir()
+        os.makedirs(output_dir, exist_ok=True)
+        return output_dir
+
+    @classmethod
+    def is_sampling(cls) -> bool:
+        with cls._lock:
+            return cls._sampler_thread is not None and cls._sampler_thread.is_alive()
+
+    @classmethod
+    def start_sampling(cls, seconds: Optional[float] = None) -> Optional[str]:
+        """Starts sampling all threads in background; returns the result file path (written when finished)."""
+        with cls._lock:
+            if cls._sampler_thread is not None and cls._sampler_thread.is_alive():
+                _logger.warning("thread sampling is already running!")
+                return None
+
+            seconds = seconds or cls._sample_seconds
+            interval = cls._sample_interval
+            file_path = os.path.join(cls.get_output_dir(), "mqtt-pg-logger-{}.collapsed".format(cls._timestamp()))
+
+            cls._sampler_thread = threading.Thread(
+                target=cls._sample_threads, args=(seconds, interval, file_path), name="AppProfiling", daemon=True
+            )
+            cls._sampler_thread.start()
+
+        _logger.info("thread sampling started (%ss) => %s", seconds, file_path)
+        return file_path
+
+    @classmethod
+    def _sample_threads(cls, seconds: float, interval: float, file_path: str):
+        stacks = Counter()
+        sample_count = 0
+        own_thread_id = threading.get_ident()
+        time_end = time.monotonic() + seconds
+
+        try:
+            while time.monotonic() < time_end:
+                thread_names = {t.ident: t.name for t in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread_id:
+                        continue
+                    stacks[cls._collapse_stack(thread_names.get(thread_id, str(thread_id)), frame)] += 1
+                sample_count += 1
+                time.sleep(interval)
+
+            with open(file_path, "w") as f:
+                for stack, count in stacks.most_common():
+                    f.write("{} {}\n".format(stack, count))
+
+            _logger.info("thread sampling finished (%d samples) => %s", sample_count, file_path)
+
+        except Exception as ex:
+            _logger.exception(ex)
+
+    @classmethod
+    def _collapse_stack(cls, thread_name, frame) -> str:
+        """Format used by flamegraph.pl, speedscope etc.: `root;caller;callee`"""
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append("{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+            frame = frame.f_back
+        names.append(thread_name)
+        return ";".join(reversed(names)).replace(" ", "_")
+
+    @classmethod
+    def snapshot_memory(cls) -> Optional[str]:
+        """First call starts tracing, every further call writes the diff to the previous snapshot."""
+        with cls._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(cls._tracemalloc_frames)
+                cls._last_snapshot = tracemalloc.take_snapshot()
+                _logger.info("tracemalloc started; trigger again to get a snapshot diff.")
+                return None
+
+            snapshot = tracemalloc.take_snapshot()
+            last_snapshot = cls._last_snapshot or snapshot
+            cls._last_snapshot = snapshot
+            file_path = os.path.join(cls.get_output_dir(), "mqtt-pg-logger-{}.tracemalloc".format(cls._timestamp()))
+
+        src_dir = os.path.dirname(os.path.abspath(__file__))
+        src_filter = [tracemalloc.Filter(True, os.path.join(src_dir, "*"), all_frames=True)]
+        current, peak = tracemalloc.get_traced_memory()
+
+        with open(file_path, "w") as f:
+            f.write("traced memory: current={} peak={}\n".format(current, peak))
+
+            f.write("\n# top allocations (diff)\n")
+            for stat in snapshot.compare_to(last_snapshot, "lineno")[:cls.TOP_STATS_COUNT]:
+                f.write("{}\n".format(stat))
+
+            # messages get created and queued within the application code
+            f.write("\n# allocations via application code (message queues; diff)\n")
+            app_stats = snapshot.filter_traces(src_filter).compare_to(last_snapshot.filter_traces(src_filter), "traceback")
+            for stat in app_stats[:cls.TOP_STATS_COUNT]:
+                f.write("{}\n".format(stat))
+                for line in stat.traceback.format():
+                    f.write("    {}\n".format(line))
+
+        _logger.info("tracemalloc snapshot diff => %s", file_path)
+        return file_path
+
+    @classmethod
+    def _timestamp(cls) -> str:
+        return datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
@@ -0,0 +1,116 @@
+import logging
+import threading
+from typing import Optional
+
+from src.metrics import Metrics
+
+
+_logger = logging.getLogger(__name__)
+
+
+class BatchController:
+    """
+    Decides about batch size and flush deadline of `ProxyStore`.
+
+    In adaptive mode the observed duration of COPY + commit and the queue depth after each batch drive the decisions:
+    - store duration above target => shrink the batch size (proportional)
+    - backlog (queue depth >= batch size) and store duration below target => grow the batch size (fewer commits per message)
+    - with a target latency the flush deadline is reduced by the (smoothed) store duration
+    All values stay within the configured bounds. Otherwise (static mode) the configured values are used as they are.
+    """
+
+    GROW_FACTOR = 1.5
+    SHRINK_MARGIN = 0.8
+    EWMA_WEIGHT = 0.3
+
+    MAX_WAIT_MAX_SECONDS = 60  # upper bound, also for live tuning (see `ControlServer`)
+
+    def __init__(self, batch_size: int, wait_max_seconds: float, adaptive=False, batch_size_min=1, batch_size_max=10000,
+                 target_store_seconds=1.0, target_latency_seconds: Optional[float] = None):
+        self._lock = threading.Lock()
+
+        self._adaptive = adaptive
+        # static mode: the configured batch size is honoured (also below the adaptive lower bound)
+        self._batch_size_min = max(1, min(batch_size_min if adaptive else 1, batch_size_max))
+        self._batch_size_max = max(self._batch_size_min, batch_size_max)
+        self._target_store_seconds = target_store_seconds
+        self._target_latency_seconds = target_latency_seconds
+        self._wait_max_seconds_limit = self._clamp_wait_max_seconds(wait_max_seconds)
+
+        self._batch_size = self._clamp_batch_size(batch_size)
+        self._wait_max_seconds = self._wait_max_seconds_limit
+        self._store_seconds_avg: Optional[float] = None
+
+        self._publish_metrics()
+
+    @property
+    def batch_size(self) -> int:
+        with self._lock:
+            return self._batch_size
+
+    @batch_size.setter
+    def batch_size(self, value: int):
+        with self._lock:
+            self._batch_size = self._clamp_batch_size(value)
+            self._publish_metrics()
+
+    @property
+    def batch_size_max(self) -> int:
+        return self._batch_size_max
+
+    @property
+    def wait_max_seconds(self) -> float:
+        with self._lock:
+            return self._wait_max_seconds
+
+    @wait_max_seconds.setter
+    def wait_max_seconds(self, value: float):
+        with self._lock:
+            self._wait_max_seconds = self._wait_max_seconds_limit = self._clamp_wait_max_seconds(value)
+            self._publish_metrics()
+
+    def _clamp_batch_size(self, value) -> int:
+        return int(max(self._batch_size_min, min(self._batch_size_max, value)))
+
+    @classmethod
+    def _clamp_wait_max_seconds(cls, value) -> float:
+        return max(0, min(cls.MAX_WAIT_MAX_SECONDS, value))
+
+    def on_stored(self, message_count: int, store_seconds: float, queue_depth: int):
+        """Called after each stored batch"""
+        with self._lock:
+            if self._store_seconds_avg is None:
+                self._store_seconds_avg = store_seconds
+            else:
+                self._store_seconds_avg += self.EWMA_WEIGHT * (store_seconds - self._store_seconds_avg)
+
+            Metrics.set("store.last_store_seconds", store_seconds)
+            Metrics.set("store.last_batch_count", message_count)
+
+            if self._adaptive:
+                self._adapt(message_count, store_seconds, queue_depth)
+
+            self._publish_metrics()
+
+    def _adapt(self, message_count: int, store_seconds: float, queue_depth: int):
+        batch_size = self._batch_size
+
+        if store_seconds > self._target_store_seconds and message_count > 0:
+            batch_size = min(batch_size, message_count * self._target_store_seconds / store_seconds * self.SHRINK_MARGIN)
+        elif queue_depth >= batch_size and message_count >= batch_size and store_seconds < self._target_store_seconds * self.SHRINK_MARGIN:
+            batch_size = batch_size * self.GROW_FACTOR
+
+        batch_size = self._clamp_batch_size(batch_size)
+        if batch_size != self._batch_size:
+            _logger.debug("batch size: %d => %d (stored %d in %.3fs; queue depth: %d)",
+                          self._batch_size, batch_size, message_count, store_seconds, queue_depth)
+            self._batch_size = batch_size
+
+        if self._target_latency_seconds is not None:
+            self._wait_max_seconds = max(0.0, min(self._wait_max_seconds_limit, self._target_latency_seconds - self._store_seconds_avg))
+
+    def _publish_metrics(self):
+        Metrics.set("store.batch_size", self._batch_size)
+        Metrics.set("store.wait_max_seconds", self._wait_max_seconds)
+        if self._store_seconds_avg is not None:
+            Metrics.set("store.avg_store_seconds", self._store_seconds_avg)
@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+import socket
+import stat
+import threading
+from typing import TYPE_CHECKING, Dict, List
+
+from src.metrics import Metrics
+
+if TYPE_CHECKING:  # imported on demand (service and command 'control' only)
+    from src.mqtt_listener import MqttListener
+    from src.proxy_store import ProxyStore
+
+
+_logger = logging.getLogger(__name__)
+
+
+class ControlException(Exception):
+    pass
+
+
+class ControlServer(threading.Thread):
+    """
+    Local UNIX socket (mode 0600: service user only) to inspect and tune the running service without restart. One request
+    per connection: a command line, answered by one JSON line ({"result": ...} or {"error": ...}):
+    - "status": queue depths (listeners and store), batch size, flush deadline, last COPY duration and all metrics
+    - "flush": stores the queued messages without waiting for a full batch
+    - "clean_up": deletes expired messages with the next idle loop of the store
+    - "set batch_size <n>" / "set wait_max_seconds <s>": live tuning (adaptive batching may change them again)
+    """
+
+    ACCEPT_TIMEOUT_SECONDS = 0.5  # reaction time on close
+    REQUEST_TIMEOUT_SECONDS = 5
+    MAX_REQUEST_BYTES = 4096
+
+    SETTINGS = {"batch_size": int, "wait_max_seconds": float}
+
+    def __init__(self, socket_path: str, store: "ProxyStore", mqtt_listeners: List["MqttListener"]):
+        threading.Thread.__init__(self, name=self.__class__.__name__, daemon=True)
+
+        self._socket_path = socket_path
+        self._store = store
+        self._mqtt_listeners = mqtt_listeners
+        self._closing = threading.Event()
+
+        self._commands = {
+            "status": self._status,
+            "flush": self._flush,
+            "clean_up": self._clean_up,
+            "set": self._set,
+        }
+
+        self._remove_stale_socket()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # created with mode 0600 (a `chmod` after `bind` leaves a window); the umask is process wide, but only briefly changed
+        umask = os.umask(0o177)
+        try:
+            self._socket.bind(socket_path)
+        finally:
+            os.umask(umask)
+        self._socket.listen()
+        self._socket.settimeout(self.ACCEPT_TIMEOUT_SECONDS)
+
+        super().start()
+
+    def start(self):
+        raise RuntimeError("started within constructor!")
+
+    def close(self):
+        self._closing.set()
+
+    def _remove_stale_socket(self):
+        """A crashed process leaves its socket file; anything else at this path is not touched."""
+        try:
+            if stat.S_ISSOCK(os.stat(self._socket_path).st_mode):
+                os.remove(self._socket_path)
+        except FileNotFoundError:
+            pass
+
+    def run(self):
+        _logger.info("control socket: %s", self._socket_path)
+        try:
+            while not self._closing.is_set():
+                try:
+                    connection, _ = self._socket.accept()
+                except socket.timeout:
+                    continue
+                with connection:
+                    try:
+                        self._handle(connection)
+                    except OSError as ex:
+                        _logger.warning("control request failed: %s", ex)
+        finally:
+            self._socket.close()
+            self._remove_stale_socket()
+
+    def _handle(self, connection: socket.socket):
+        connection.settimeout(self.REQUEST_TIMEOUT_SECONDS)
+        request = b""
+        while b"\n" not in request and len(request) < self.MAX_REQUEST_BYTES:
+            data = connection.recv(self.MAX_REQUEST_BYTES)
+            if not data:
+                break
+            request += data
+
+        response = self.execute(request.decode("utf-8", errors="replace").split("\n")[0])
+        connection.sendall(json.dumps(response, default=str).encode("utf-8") + b"\n")
+
+    def execute(self, command_line: str) -> Dict:
+        parts = command_line.split()
+        command = self._commands.get(parts[0]) if parts else None
+        if command is None:
+            return {"error": "unknown command '{}' (known: {})".format(command_line.strip(), ", ".join(self._commands))}
+
+        try:
+            result = command(parts[1:])
+        except (ControlException, ValueError) as ex:
+            return {"error": str(ex)}
+        except Exception as ex:
+            _logger.exception(ex)
+            return {"error": str(ex)}
+
+        _logger.info("control command: %s", command_line.strip())  # changes of the running service are traceable
+        return {"result": result}
+
+    def _status(self, _args: List[str]) -> Dict:
+        return {
+            "mqtt_listeners": [listener.get_status() for listener in self._mqtt_listeners],
+            "store": self._store.get_status(),
+            "metrics": Metrics.get_all(),
+        }
+
+    def _flush(self, _args: List[str]) -> Dict:
+        self._store.flush()
+        return self._store.get_status()
+
+    def _clean_up(self, _args: List[str]) -> str:
+        self._store.request_clean_up()
+        return "requested"
+
+    def _set(self, args: List[str]) -> Dict:
+        if len(args) != 2 or args[0] not in self.SETTINGS:
+            raise ControlException("usage: set <{}> <value>".format("|".join(self.SETTINGS)))
+
+        name, value = args[0], self.SETTINGS[args[0]](args[1])
+        if value < 0:
+            raise ControlException("{} must not be negative!".format(name))
+        setattr(self._store.batch_controller, name, value)  # bounded by `batch_size_min` / `batch_size_max`
+        return {name: getattr(self._store.batch_controller, name)}
+
+    @classmethod
+    def send(cls, socket_path: str, command_line: str, timeout_seconds=REQUEST_TIMEOUT_SECONDS) -> Dict:
+        """Client side (see command 'control')"""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout_seconds)
+            client.connect(socket_path)
+            client.sendall(command_line.encode("utf-8") + b"\n")
+            response = b""
+            while not response.endswith(b"\n"):
+                data = client.recv(cls.MAX_REQUEST_BYTES)
+                if not data:
+                    break
+                response += data
+        return json.loads(response.decode("utf-8"))
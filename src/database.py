@@ -1,7 +1,7 @@
 import abc
 import datetime
 import logging
-from typing import Optional
+from typing import List, Optional
 
 import psycopg
 from tzlocal import get_localzone
@@ -23,6 +23,44 @@ class DatabaseConfKey:
     WAIT_MAX_SECONDS = "wait_max_seconds"
     CLEAN_UP_AFTER_DAYS = "clean_up_after_days"
 
+    ADAPTIVE_BATCHING = "adaptive_batching"
+    BATCH_SIZE_MIN = "batch_size_min"
+    BATCH_SIZE_MAX = "batch_size_max"
+    TARGET_STORE_SECONDS = "target_store_seconds"
+    TARGET_LATENCY_SECONDS = "target_latency_seconds"
+
+    INGEST_MODE = "ingest_mode"
+    STAGING_MERGE_SECONDS = "staging_merge_seconds"
+    STAGING_MERGE_CHUNK_SIZE = "staging_merge_chunk_size"
+
+    SHUTDOWN_DRAIN_SECONDS = "shutdown_drain_seconds"
+    SPOOL_FILE = "spool_file"
+    DEAD_LETTER_FILE = "dead_letter_file"
+
+    VALUE_COLUMNS = "value_columns"
+    VALUE_JSON_PATHS = "value_json_paths"
+    BROKER_ID_COLUMN = "broker_id_column"
+
+    ARCHIVE_DIR = "archive_dir"
+    ARCHIVE_FORMAT = "archive_format"
+    ARCHIVE_INTERVAL_SECONDS = "archive_interval_seconds"
+    ARCHIVE_MAX_ROWS_PER_SECOND = "archive_max_rows_per_second"
+
+    MEMORY_BUDGET_MB = "memory_budget_mb"
+    OVERFLOW_POLICY = "overflow_policy"
+    PRIORITY_CLASSES = "priority_classes"
+
+    CONNECTION_ROTATION_SECONDS = "connection_rotation_seconds"
+
+    ASYNC_COMMIT_QOS = "async_commit_qos"
+    ASYNC_COMMIT_TOPIC_REGEXES = "async_commit_topic_regexes"
+
+
+class PriorityClassConfKey:
+    NAME = "name"
+    TOPIC_REGEXES = "topic_regexes"
+    WEIGHT = "weight"
+
 
 DATABASE_JSONSCHEMA = {
     "type": "object",
@@ -47,12 +85,146 @@ DATABASE_JSONSCHEMA = {
             "type": "integer",
             "description": "Delete entries older than <n> days. Deactivate clean up with values values <= 0."
         },
+
+        DatabaseConfKey.ADAPTIVE_BATCHING: {
+            "type": "boolean",
+            "description": "Adapt batch size and flush deadline to the observed store duration and queue depth. Default: False"
+        },
+        DatabaseConfKey.BATCH_SIZE_MIN: {
+            "type": "integer", "minimum": 1,
+            "description": "Lower bound of the adaptive batch size. Default: 10"
+        },
+        DatabaseConfKey.BATCH_SIZE_MAX: {
+            "type": "integer", "minimum": 1, "maximum": 100000,
+            "description": "Upper bound of the batch size. Default: 10000"
+        },
+        DatabaseConfKey.TARGET_STORE_SECONDS: {
+            "type": "number", "exclusiveMinimum": 0,
+            "description": "Adaptive batching: target duration of storing one batch (COPY + commit). Default: 1"
+        },
+        DatabaseConfKey.TARGET_LATENCY_SECONDS: {
+            "type": "number", "exclusiveMinimum": 0,
+            "description": "Adaptive batching: shorten the flush deadline to store messages within this time. Default: not set"
+        },
+
+        DatabaseConfKey.INGEST_MODE: {
+            "type": "string", "enum": ["direct", "staging"],
+            "description": "'direct' (default): COPY into the journal table; 'staging': COPY into the UNLOGGED staging table "
+                           "(see sql/staging.sql), which gets merged into the journal table in background."
+        },
+        DatabaseConfKey.STAGING_MERGE_SECONDS: {
+            "type": "number", "exclusiveMinimum": 0,
+            "description": "Staging mode: merge interval (seconds); bounds the loss on a database crash. Default: 2"
+        },
+        DatabaseConfKey.STAGING_MERGE_CHUNK_SIZE: {
+            "type": "integer", "minimum": 1,
+            "description": "Staging mode: max rows moved per merge transaction. Default: 50000"
+        },
+
+        DatabaseConfKey.SHUTDOWN_DRAIN_SECONDS: {
+            "type": "number", "minimum": 0,
+            "description": "Shutdown: max. time to store the queued messages (max-size batches). Default: 10"
+        },
+        DatabaseConfKey.SPOOL_FILE: {
+            "type": "string", "minLength": 1,
+            "description": "Shutdown: messages not stored within the deadline are saved here and replayed on next start. "
+                           "Default: not set (messages get lost)"
+        },
+
+        DatabaseConfKey.DEAD_LETTER_FILE: {
+            "type": "string", "minLength": 1,
+            "description": "Messages rejected by the database (e.g. too long topic) are saved here (JSON lines with "
+                           "'error'). Default: not set (logged only)"
+        },
+
+        DatabaseConfKey.VALUE_COLUMNS: {
+            "type": "boolean",
+            "description": "Fill the columns 'value_num' and 'value_bool' (see sql/value_columns.sql). Default: False"
+        },
+        DatabaseConfKey.VALUE_JSON_PATHS: {
+            "type": "object", "additionalProperties": {"type": "string"},
+            "description": "Topic regex => JSON path of the value (e.g. 'state.temperature'; first match wins). "
+                           "Default path: 'value'"
+        },
+        DatabaseConfKey.BROKER_ID_COLUMN: {
+            "type": "boolean",
+            "description": "Fill the column 'broker_id' with the 'broker_id' of the MQTT broker (see sql/broker_column.sql). "
+                           "Default: False"
+        },
+
+        DatabaseConfKey.ARCHIVE_DIR: {
+            "type": "string", "minLength": 1,
+            "description": "Expired days (see 'clean_up_after_days') are archived into files (<dir>/YYYY/MM/DD/<first topic "
+                           "level>.<ext>) before deletion. Default: not set (deleted only)"
+        },
+        DatabaseConfKey.ARCHIVE_FORMAT: {
+            "type": "string", "enum": ["parquet", "csv"],
+            "description": "'parquet' (default; needs pyarrow) or 'csv' (gzipped)"
+        },
+        DatabaseConfKey.ARCHIVE_INTERVAL_SECONDS: {
+            "type": "integer", "minimum": 1, "description": "Check for expired days every <n> seconds. Default: 3600"
+        },
+        DatabaseConfKey.ARCHIVE_MAX_ROWS_PER_SECOND: {
+            "type": "integer", "minimum": 0, "description": "Throughput limit of the archiver; 0 disables. Default: 20000"
+        },
+
+        DatabaseConfKey.MEMORY_BUDGET_MB: {
+            "type": "number", "minimum": 0,
+            "description": "Max. memory (MB) of all queued messages (MQTT listener and database queue; payload, topic and "
+                           "object overhead). 0 disables: the database queue is limited to 50000 messages instead. "
+                           "Default: 100"
+        },
+        DatabaseConfKey.OVERFLOW_POLICY: {
+            "type": "string", "enum": ["drop_newest", "drop_oldest"],
+            "description": "Memory budget exhausted: 'drop_newest' (default) drops incoming messages, 'drop_oldest' drops the "
+                           "oldest queued messages in favour of incoming ones."
+        },
+        DatabaseConfKey.PRIORITY_CLASSES: {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    PriorityClassConfKey.NAME: {"type": "string", "minLength": 1},
+                    PriorityClassConfKey.TOPIC_REGEXES: {
+                        "type": "array", "items": {"type": "string", "minLength": 1},
+                        "description": "Topics of this class (first matching class wins). Not set: all other topics",
+                    },
+                    PriorityClassConfKey.WEIGHT: {"type": "integer", "minimum": 1, "description": "Share of each batch. Default: 1"},
+                },
+                "additionalProperties": False,
+                "required": [PriorityClassConfKey.NAME],
+            },
+            "description": "Priority classes of the database queue, highest first. Other topics go into the class without "
+                           "'topic_regexes' (or an implicit lowest class 'default'). Overflow drops the lowest class first."
+        },
+
+        DatabaseConfKey.CONNECTION_ROTATION_SECONDS: {
+            "type": "integer", "minimum": 0,
+            "description": "Replace the database connection after <n> seconds (new one is connected in background before "
+                           "switching). 0 disables. Default: 3600"
+        },
+
+        DatabaseConfKey.ASYNC_COMMIT_QOS: {
+            "type": "array",
+            "items": {"type": "integer", "enum": [0, 1, 2]},
+            "description": "Messages with these QoS levels are committed asynchronously (may get lost on a database crash)."
+        },
+        DatabaseConfKey.ASYNC_COMMIT_TOPIC_REGEXES: {
+            "type": "array",
+            "items": {"type": "string", "minLength": 1},
+            "description": "Messages with matching topics are committed asynchronously (may get lost on a database crash)."
+        },
     },
     "additionalProperties": False,
     "required": [DatabaseConfKey.HOST, DatabaseConfKey.PORT, DatabaseConfKey.DATABASE],
 }
 
 
+class IngestMode:
+    DIRECT = "direct"
+    STAGING = "staging"
+
+
 class DatabaseException(Exception):
     pass
 
@@ -60,6 +232,9 @@ class DatabaseException(Exception):
 class Database(abc.ABC):
 
     DEFAULT_TABLE_NAME = "journal"
+    STAGING_TABLE_SUFFIX = "_staging"
+
+    OPTIONAL_COLUMNS = ["value_num", "value_bool", "broker_id"]  # see `sql/value_columns.sql`, `sql/broker_column.sql`
 
     def __init__(self, config):
         # runtime properties
@@ -77,6 +252,7 @@ class Database(abc.ABC):
         }
 
         self._table_name = config.get(DatabaseConfKey.TABLE_NAME, self.DEFAULT_TABLE_NAME)  # define by SQL scripts
+        self._staging_table_name = self._table_name + self.STAGING_TABLE_SUFFIX
         self._timezone = config.get(DatabaseConfKey.TIMEZONE)
 
     def __enter__(self):
@@ -97,23 +273,55 @@ class Database(abc.ABC):
         if self._connection:
             self._connection.close()
 
+        self._connection = self.create_connection()
+        self._last_connect_time = self._now()
+
+    def create_connection(self):
+        """New session (with timezone set), not yet used. Thread safe: may be called in background."""
         try:
-            self._connection = psycopg.connect(**self._connect_data, autocommit=self._auto_commit)
+            connection = psycopg.connect(**self._connect_data, autocommit=self._auto_commit)
 
-            with self._connection.cursor() as cursor:
+            with connection.cursor() as cursor:
                 time_zone = self._timezone if self._timezone else self.get_default_time_zone_name()
                 stmt = "set timezone='{}'".format(time_zone)
                 try:
                     cursor.execute(stmt)
                 except Exception:
                     _logger.error("setting timezone failed (%s)!", stmt)
+                    connection.close()
                     raise
 
-            self._last_connect_time = self._now()
+            return connection
 
         except psycopg.OperationalError as ex:
             raise DatabaseException(str(ex)) from ex
 
+    def replace_connection(self, connection):
+        """Switches to a connection created by `create_connection`; returns the previous one (to be closed by the caller)."""
+        old_connection = self._connection
+        self._connection = connection
+        self._last_connect_time = self._now()
+        return old_connection
+
+    def rollback(self):
+        """Ends a failed transaction (e.g. after an error of a batch); a broken connection is closed (reconnect)."""
+        try:
+            if self._connection:
+                self._connection.rollback()
+        except Exception as ex:
+            _logger.warning("rollback failed (%s) => reconnect.", ex)
+            self.close()
+
+    def _get_optional_columns(self, table_name: str) -> List[str]:
+        with self._connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT column_name FROM information_schema.columns WHERE table_name = %s AND column_name = ANY(%s)",
+                (table_name, self.OPTIONAL_COLUMNS)
+            )
+            existing_columns = {row[0] for row in cursor.fetchall()}
+        self._connection.rollback()
+        return [c for c in self.OPTIONAL_COLUMNS if c in existing_columns]
+
     def close(self):
         try:
             if self._connection:
@@ -0,0 +1,61 @@
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from src.message import Message
+
+
+class DedupWindow:
+    """
+    Recently received QoS >= 1 messages keyed by (topic, payload hash, message id): a broker redelivers unacknowledged
+    messages of a persistent session after a reconnect with the same message id. Bounded by age and size (oldest first).
+    """
+
+    DEFAULT_MAX_SIZE = 100000
+
+    def __init__(self, max_age_seconds: float, max_size: int = DEFAULT_MAX_SIZE):
+        self._max_age_seconds = max_age_seconds
+        self._max_size = max_size
+        self._entries: OrderedDict[Tuple[str, int, int], float] = OrderedDict()  # insertion order == time order
+
+    def __len__(self):
+        return len(self._entries)
+
+    def is_duplicate(self, message: Message) -> bool:
+        """`contains` and `add` in one step. Not thread-safe (as all methods), called by the MQTT network thread only."""
+        if self.contains(message):
+            return True
+        self.add(message)
+        return False
+
+    def contains(self, message: Message) -> bool:
+        key = self._key(message)
+        if key is None:
+            return False
+        self._evict(time.monotonic())
+        return key in self._entries
+
+    def add(self, message: Message):
+        """The window starts with the first accepted delivery (a dropped message may be redelivered)."""
+        key = self._key(message)
+        if key is None:
+            return
+        self._entries[key] = time.monotonic()
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    @classmethod
+    def _key(cls, message: Message) -> Optional[Tuple[str, int, int]]:
+        if not message.qos or not message.message_id:
+            return None  # QoS 0: no redelivery, no message id
+        return message.topic, hash(message.text), message.message_id
+
+    def _evict(self, now: float):
+        time_limit = now - self._max_age_seconds
+        entries = self._entries
+        while entries:
+            key, time_seen = next(iter(entries.items()))
+            if time_seen >= time_limit:
+                break
+            del entries[key]
@@ -0,0 +1,249 @@
+import datetime
+import logging
+import time
+from typing import List, Optional, Tuple
+
+from psycopg import sql
+
+from src.database import Database
+
+
+_logger = logging.getLogger(__name__)
+
+
+class MigrationCheckpoint:
+
+    def __init__(self, last_journal_id: int, max_journal_id: int, copied_count: int, done: bool):
+        self.last_journal_id = last_journal_id
+        self.max_journal_id = max_journal_id
+        self.copied_count = copied_count
+        self.done = done
+
+
+class JournalMigrator(Database):
+    """
+    Online migration of the flat journal table (`sql/table.sql`) into a table partitioned by time (monthly ranges):
+
+    1. One short transaction creates the partitioned table (same columns, indices and trigger, shared id sequence) and
+       swaps the names: the logger writes into the new table with its next batch, the old one is kept as
+       "<table>_unpartitioned".
+    2. The old rows are copied in chunks (server-side cursor on a separate connection, COPY into the new table). Each
+       chunk is committed together with a checkpoint, so an interrupted migration resumes where it stopped.
+
+    Running it again after the migration creates the partitions of the next months (e.g. monthly by cron); rows beyond
+    the last partition are stored in "<table>_default" and moved into their partition once it gets created.
+    """
+
+    DEFAULT_CHUNK_SIZE = 50000
+    DEFAULT_MONTHS_AHEAD = 12
+
+    OLD_TABLE_SUFFIX = "_unpartitioned"
+    NEW_TABLE_SUFFIX = "_partitioned"
+    CHECKPOINT_TABLE_SUFFIX = "_migration"
+    DEFAULT_PARTITION_SUFFIX = "_default"
+
+    LOCK_TIMEOUT = "10s"  # renaming waits for running batches, but must not block the logger for long
+    LOG_INTERVAL_SECONDS = 10
+
+    COLUMNS = ["journal_id", "topic", "text", "data", "message_id", "qos", "retain", "time"]
+
+    def __init__(self, config):
+        super().__init__(config)
+
+        self._old_table_name = self._table_name + self.OLD_TABLE_SUFFIX
+        self._new_table_name = self._table_name + self.NEW_TABLE_SUFFIX
+        self._checkpoint_table_name = self._table_name + self.CHECKPOINT_TABLE_SUFFIX
+
+        self.copied_count = 0
+
+    def migrate(self, chunk_size=DEFAULT_CHUNK_SIZE, months_ahead=DEFAULT_MONTHS_AHEAD):
+        checkpoint = self._load_checkpoint()
+        if checkpoint is None:
+            checkpoint = self._switch_tables(months_ahead)
+        else:
+            self.ensure_partitions(self._now(), months_ahead)
+
+        if checkpoint.done:
+            _logger.info("migration of '%s' is complete; partitions for the next %d months exist.", self._table_name, months_ahead)
+            return
+
+        self._copy_rows(checkpoint, chunk_size)
+
+    def _load_checkpoint(self) -> Optional[MigrationCheckpoint]:
+        with self._connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", (self._checkpoint_table_name, ))
+            if cursor.fetchone()[0] is None:
+                self._connection.rollback()
+                return None
+
+            cursor.execute(sql.SQL("SELECT last_journal_id, max_journal_id, copied_count, done FROM {}").format(
+                sql.Identifier(self._checkpoint_table_name)
+            ))
+            row = cursor.fetchone()
+        self._connection.rollback()
+
+        return MigrationCheckpoint(*row) if row else None
+
+    def _switch_tables(self, months_ahead: int) -> MigrationCheckpoint:
+        table = sql.Identifier(self._table_name)
+        new_table = sql.Identifier(self._new_table_name)
+        sequence = self._table_name + "_journal_id_seq"  # SERIAL of `sql/table.sql`
+
+        with self._connection.cursor() as cursor:
+            cursor.execute(sql.SQL("SELECT min(time), max(journal_id) FROM {}").format(table))
+            time_min, max_journal_id = cursor.fetchone()
+
+            cursor.execute(sql.SQL("SET LOCAL lock_timeout = {}").format(sql.Literal(self.LOCK_TIMEOUT)))
+            cursor.execute(sql.SQL(
+                "CREATE TABLE {new_table} ("
+                "  journal_id INTEGER NOT NULL DEFAULT nextval({sequence}),"
+                "  topic VARCHAR(256), text VARCHAR(4096), data JSONB,"
+                "  message_id INTEGER, qos INTEGER, retain INTEGER,"
+                "  value_num DOUBLE PRECISION, value_bool BOOLEAN, broker_id VARCHAR(64),"
+                "  time TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,"
+                "  PRIMARY KEY (journal_id, time)"
+                ") PARTITION BY RANGE (time)"
+            ).format(new_table=new_table, sequence=sql.Literal(sequence)))
+            cursor.execute(sql.SQL("CREATE INDEX {} ON {} (time)").format(sql.Identifier(self._new_table_name + "_time_idx"), new_table))
+            cursor.execute(sql.SQL("CREATE INDEX {} ON {} (topic)").format(sql.Identifier(self._new_table_name + "_topic_idx"), new_table))
+            cursor.execute(sql.SQL(
+                "CREATE TRIGGER journal_json_trigger BEFORE INSERT ON {} FOR EACH ROW EXECUTE PROCEDURE journal_text_to_json()"
+            ).format(new_table))
+
+            # the new table has to survive a `DROP TABLE <table>_unpartitioned`
+            cursor.execute(sql.SQL("ALTER SEQUENCE {} OWNED BY {}.journal_id").format(sql.Identifier(sequence), new_table))
+
+            cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(table, sql.Identifier(self._old_table_name)))
+            cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(new_table, table))
+
+            self._create_partitions(cursor, time_min or self._now(), months_ahead, with_default=True)
+
+            cursor.execute(sql.SQL(
+                "CREATE TABLE {} (last_journal_id BIGINT NOT NULL, max_journal_id BIGINT NOT NULL, copied_count BIGINT NOT NULL, "
+                "done BOOLEAN NOT NULL, updated TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+            ).format(sql.Identifier(self._checkpoint_table_name)))
+            cursor.execute(sql.SQL("INSERT INTO {} (last_journal_id, max_journal_id, copied_count, done) VALUES (0, %s, 0, %s)").format(
+                sql.Identifier(self._checkpoint_table_name)
+            ), (max_journal_id or 0, max_journal_id is None))
+
+        self._connection.commit()
+
+        _logger.info("'%s' is partitioned now (old rows: '%s').", self._table_name, self._old_table_name)
+        return MigrationCheckpoint(0, max_journal_id or 0, 0, max_journal_id is None)
+
+    def ensure_partitions(self, time_from: datetime.datetime, months_ahead: int):
+        with self._connection.cursor() as cursor:
+            self._create_partitions(cursor, time_from, months_ahead, with_default=False)
+        self._connection.commit()
+
+    def _create_partitions(self, cursor, time_from: datetime.datetime, months_ahead: int, with_default: bool):
+        time_now = self._now()
+        time_from = time_from.astimezone(time_now.tzinfo)  # same bounds (month starts in local time) on each run
+        time_to = self.add_months(self.month_start(time_now), months_ahead + 1)
+        for name, partition_from, partition_to in self.partition_bounds(self._table_name, time_from, time_to):
+            if with_default:
+                cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM ({}) TO ({})").format(
+                    sql.Identifier(name), sql.Identifier(self._table_name), sql.Literal(partition_from), sql.Literal(partition_to)
+                ))
+            else:
+                self._create_partition(cursor, name, partition_from, partition_to)
+        if with_default:
+            cursor.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} DEFAULT").format(
+                sql.Identifier(self._table_name + self.DEFAULT_PARTITION_SUFFIX), sql.Identifier(self._table_name)
+            ))
+
+    def _create_partition(self, cursor, name: str, partition_from: datetime.datetime, partition_to: datetime.datetime):
+        """
+        Besides the default partition: its rows of the new range (e.g. timestamps far ahead) would let `PARTITION OF` fail,
+        so the partition is created as table, gets these rows and is attached afterwards.
+        """
+        cursor.execute("SELECT to_regclass(%s)", (name, ))
+        if cursor.fetchone()[0] is not None:
+            return
+
+        table = sql.Identifier(self._table_name)
+        partition = sql.Identifier(name)
+        cursor.execute(sql.SQL("SET LOCAL lock_timeout = {}").format(sql.Literal(self.LOCK_TIMEOUT)))
+        cursor.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)").format(partition, table))
+        cursor.execute(sql.SQL(
+            "WITH moved AS (DELETE FROM {} WHERE time >= %s AND time < %s RETURNING *) INSERT INTO {} SELECT * FROM moved"
+        ).format(sql.Identifier(self._table_name + self.DEFAULT_PARTITION_SUFFIX), partition), (partition_from, partition_to))
+        if cursor.rowcount > 0:
+            _logger.info("moved %d row(s) from the default partition into '%s'.", cursor.rowcount, name)
+        cursor.execute(sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM ({}) TO ({})").format(
+            table, partition, sql.Literal(partition_from), sql.Literal(partition_to)
+        ))
+
+    def _copy_rows(self, checkpoint: MigrationCheckpoint, chunk_size: int):
+        columns = self.COLUMNS + self._get_optional_columns(self._old_table_name)
+        select_statement = sql.SQL("SELECT {} FROM {} WHERE journal_id > %s ORDER BY journal_id").format(
+            sql.SQL(", ").join(sql.SQL("data::text") if c == "data" else sql.Identifier(c) for c in columns),
+            sql.Identifier(self._old_table_name)
+        )
+        copy_statement = sql.SQL("COPY {} ({}) FROM STDIN").format(
+            sql.Identifier(self._table_name), sql.SQL(", ").join(sql.Identifier(c) for c in columns)
+        )
+        checkpoint_statement = sql.SQL("UPDATE {} SET last_journal_id = %s, copied_count = %s, done = %s, updated = now()").format(
+            sql.Identifier(self._checkpoint_table_name)
+        )
+
+        time_start = time.monotonic()
+        time_log = time_start
+        copied_count = checkpoint.copied_count
+
+        reader = self.create_connection()  # the cursor must survive the commits of the chunks
+        try:
+            with reader.cursor(name="journal_migration") as read_cursor:
+                read_cursor.itersize = chunk_size
+                read_cursor.execute(select_statement, (checkpoint.last_journal_id, ))
+
+                while True:
+                    rows = read_cursor.fetchmany(chunk_size)
+                    done = len(rows) < chunk_size
+
+                    with self._connection.cursor() as cursor:
+                        if rows:
+                            with cursor.copy(copy_statement) as copy:
+                                for row in rows:
+                                    copy.write_row(row)
+                            checkpoint.last_journal_id = rows[-1][0]
+                        copied_count += len(rows)
+                        self.copied_count += len(rows)
+                        cursor.execute(checkpoint_statement, (checkpoint.last_journal_id, copied_count, done))
+                    self._connection.commit()
+
+                    if done or time.monotonic() - time_log >= self.LOG_INTERVAL_SECONDS:
+                        time_log = time.monotonic()
+                        self._log_progress(checkpoint, copied_count, time_log - time_start)
+                    if done:
+                        break
+        finally:
+            reader.close()
+
+        _logger.info("migration of '%s' is complete; drop '%s' after checking the data.", self._table_name, self._old_table_name)
+
+    def _log_progress(self, checkpoint: MigrationCheckpoint, copied_count: int, seconds: float):
+        progress = min(100.0, 100.0 * checkpoint.last_journal_id / checkpoint.max_journal_id) if checkpoint.max_journal_id else 100.0
+        _logger.info("migrated %d row(s) (%.1f%%, %.0f rows/s)", copied_count, progress, self.copied_count / seconds if seconds > 0 else 0)
+
+    @classmethod
+    def month_start(cls, time_value: datetime.datetime) -> datetime.datetime:
+        return time_value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    @classmethod
+    def add_months(cls, time_value: datetime.datetime, months: int) -> datetime.datetime:
+        month_index = time_value.month - 1 + months
+        return time_value.replace(year=time_value.year + month_index // 12, month=month_index % 12 + 1)
+
+    @classmethod
+    def partition_bounds(cls, table_name: str, time_from: datetime.datetime, time_to: datetime.datetime) \
+            -> List[Tuple[str, datetime.datetime, datetime.datetime]]:
+        """Monthly partitions ("journal_y2023m01") covering `time_from` until (excluding) `time_to`"""
+        partitions = []
+        partition_from = cls.month_start(time_from)
+        while partition_from < time_to:
+            partition_to = cls.add_months(partition_from, 1)
+            name = "{}_y{:04d}m{:02d}".format(table_name, partition_from.year, partition_from.month)
+            partitions.append((name, partition_from, partition_to))
+            partition_from = partition_to
+        return partitions
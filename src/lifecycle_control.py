@@ -4,6 +4,7 @@ import threading
 import time
 from enum import Enum
 
+from src.app_profiling import AppProfiling
 
 _logger = logging.getLogger(__name__)
 
@@ -31,16 +32,37 @@ class LifecycleInstance:
     def __init__(self):
         self._lock = threading.Lock()
         self._proceed = True
+        self._reload_requested = False
 
         if threading.current_thread() is threading.main_thread():
             # integration tests run the service in a thread...
             signal.signal(signal.SIGINT, self._shutdown_signaled)
             signal.signal(signal.SIGTERM, self._shutdown_signaled)
+            if hasattr(signal, "SIGUSR1"):  # not available on Windows
+                signal.signal(signal.SIGUSR1, self._sample_threads_signaled)
+                signal.signal(signal.SIGUSR2, self._snapshot_memory_signaled)
+            if hasattr(signal, "SIGHUP"):
+                signal.signal(signal.SIGHUP, self._reload_signaled)
 
     def _shutdown_signaled(self, sig, _frame):
         _logger.info("shutdown signaled (%s)", sig)
         self.shutdown()
 
+    def _reload_signaled(self, sig, _frame):
+        _logger.info("config reload signaled (%s)", sig)
+        self.request_reload()
+
+    @classmethod
+    def _sample_threads_signaled(cls, sig, _frame):
+        _logger.info("thread sampling signaled (%s)", sig)
+        AppProfiling.start_sampling()
+
+    @classmethod
+    def _snapshot_memory_signaled(cls, sig, _frame):
+        _logger.info("memory snapshot signaled (%s)", sig)
+        # taking a snapshot may take a while, so don't block the main thread within the signal handler
+        threading.Thread(target=AppProfiling.snapshot_memory, name="AppProfilingMemory", daemon=True).start()
+
     def should_proceed(self) -> bool:
         with self._lock:
             return self._proceed
@@ -49,10 +71,22 @@ class LifecycleInstance:
         with self._lock:
             self._proceed = False
 
+    def request_reload(self):
+        with self._lock:
+            self._reload_requested = True
+
+    def pop_reload_request(self) -> bool:
+        """Returns (and resets) the reload flag; the reload itself is done within the runner loop, not the signal handler."""
+        with self._lock:
+            reload_requested = self._reload_requested
+            self._reload_requested = False
+            return reload_requested
+
     def reset(self):
         """Assure that the class gets instantiated before the threads starts"""
         with self._lock:
             self._proceed = True
+            self._reload_requested = False
 
     def notify(self, status: StatusNotification):
         """Overwritten in test by a mock"""
@@ -91,6 +125,14 @@ class LifecycleControl:
     def shutdown(cls):
         cls.get_instance().shutdown()
 
+    @classmethod
+    def request_reload(cls):
+        cls.get_instance().request_reload()
+
+    @classmethod
+    def pop_reload_request(cls) -> bool:
+        return cls.get_instance().pop_reload_request()
+
     @classmethod
     def reset(cls):
         """Assure that the class gets instantiated before the threads starts"""
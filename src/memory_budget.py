@@ -0,0 +1,119 @@
+import logging
+import threading
+from typing import Callable, Optional
+
+from src.database import DatabaseConfKey
+from src.message import Message
+from src.metrics import Metrics
+
+
+_logger = logging.getLogger(__name__)
+
+
+class OverflowPolicy:
+    DROP_NEWEST = "drop_newest"  # incoming messages are dropped
+    DROP_OLDEST = "drop_oldest"  # the oldest queued messages (`ProxyStore`) are dropped in favour of incoming ones
+
+    CHOICES = [DROP_NEWEST, DROP_OLDEST]
+
+
+class MemoryBudget:
+    """
+    Byte accounting of the queued messages (`MqttListener` and `ProxyStore`) against one shared limit. The size of a
+    message is estimated by its topic and payload lengths plus a fixed overhead for the Python objects.
+    """
+
+    MESSAGE_OVERHEAD_BYTES = 400  # `Message` (attrs, __dict__), 2 `str` headers, `datetime`, deque/list slot
+
+    DEFAULT_MEMORY_BUDGET_MB = 100
+
+    def __init__(self, limit_bytes: Optional[int], overflow_policy=OverflowPolicy.DROP_NEWEST):
+        self._lock = threading.Lock()
+        self._limit_bytes = limit_bytes
+        self._overflow_policy = overflow_policy
+        self._used_bytes = 0
+        self._dropped_count = 0
+        self._overflowing = False
+
+        self._evictor: Optional[Callable[[int, Optional[Message]], int]] = None
+
+        Metrics.set("memory.queue_bytes_limit", limit_bytes or 0)
+
+    @classmethod
+    def from_config(cls, config) -> "MemoryBudget":
+        memory_budget_mb = config.get(DatabaseConfKey.MEMORY_BUDGET_MB, cls.DEFAULT_MEMORY_BUDGET_MB)
+        return MemoryBudget(
+            limit_bytes=int(memory_budget_mb * 1024 * 1024) if memory_budget_mb else None,
+            overflow_policy=config.get(DatabaseConfKey.OVERFLOW_POLICY, OverflowPolicy.DROP_NEWEST),
+        )
+
+    @classmethod
+    def message_size(cls, message: Message) -> int:
+        return cls.MESSAGE_OVERHEAD_BYTES + len(message.topic or "") + len(message.text or "")
+
+    @property
+    def used_bytes(self) -> int:
+        with self._lock:
+            return self._used_bytes
+
+    @property
+    def limit_bytes(self) -> Optional[int]:
+        return self._limit_bytes
+
+    @property
+    def dropped_count(self) -> int:
+        with self._lock:
+            return self._dropped_count
+
+    def set_evictor(self, evictor: Callable[[int, Optional[Message]], int]):
+        """
+        `evictor(bytes_needed, message)` drops queued messages (lowest priority and oldest first) and returns the released
+        bytes. `message` None (`drop_oldest`): any queued message; otherwise only messages of lower priority.
+        """
+        self._evictor = evictor
+
+    def acquire(self, size: int, force=False, message: Optional[Message] = None) -> bool:
+        """
+        Returns False if the message has to be dropped (budget exhausted); `force` ignores the limit (shutdown). With
+        `message` (`drop_newest`) queued messages of lower priority are shed in favour of it.
+        """
+        if self._try_acquire(size, force):
+            return True
+
+        drop_oldest = self._overflow_policy == OverflowPolicy.DROP_OLDEST
+        if self._evictor is not None and (drop_oldest or message is not None):
+            with self._lock:
+                bytes_needed = self._used_bytes + size - self._limit_bytes
+            self._evictor(bytes_needed, None if drop_oldest else message)  # releases via `release`, so not within the lock
+            if self._try_acquire(size, force):
+                return True
+
+        self.dropped(1)
+        return False
+
+    def _try_acquire(self, size: int, force: bool) -> bool:
+        with self._lock:
+            if force or self._limit_bytes is None or self._used_bytes + size <= self._limit_bytes:
+                self._used_bytes += size
+                if self._overflowing and not force:
+                    self._overflowing = False
+                    _logger.info("memory budget: accepting messages again (dropped so far: %d).", self._dropped_count)
+                return True
+            return False
+
+    def release(self, size: int):
+        with self._lock:
+            self._used_bytes = max(0, self._used_bytes - size)
+
+    def dropped(self, count: int):
+        with self._lock:
+            self._dropped_count += count
+            log_overflow = not self._overflowing
+            self._overflowing = True
+
+        Metrics.inc("memory.dropped_messages", count)
+        if log_overflow:
+            _logger.error("memory budget (%d bytes) exhausted => dropping messages (%s)!", self._limit_bytes, self._overflow_policy)
+
+    def publish_metrics(self):
+        Metrics.set("memory.queue_bytes", self.used_bytes)
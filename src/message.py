@@ -6,6 +6,8 @@ from paho.mqtt.client import MQTTMessage
 
 @attr.s
 class Message:
+    CONTENT_TYPE_USER_PROPERTY = "content-type"
+
     message_id: int = attr.ib(default=None)
 
     topic: str = attr.ib(default=None)
@@ -17,6 +19,12 @@ class Message:
 
     time: datetime.datetime = attr.ib(default=False)
 
+    # MQTT v5 hint (property "content type" or user property "content-type"), not stored
+    content_type: str = attr.ib(default=None)
+
+    # configured id of the receiving broker (several brokers, see `MqttConfKey.BROKER_ID`)
+    broker_id: str = attr.ib(default=None)
+
     @classmethod
     def ensure_string(cls, value_in) -> str:
         if isinstance(value_in, bytes):
@@ -34,4 +42,18 @@ class Message:
             qos=mqtt_message.qos,
             retain=mqtt_message.retain,
             # time=None  # `mqtt_message.timestamp` is not compatible with postgres
+            content_type=cls.get_content_type(mqtt_message),
         )
+
+    @classmethod
+    def get_content_type(cls, mqtt_message: MQTTMessage):
+        properties = getattr(mqtt_message, "properties", None)  # MQTT v5 only
+        if properties is None:
+            return None
+
+        content_type = getattr(properties, "ContentType", None)
+        if content_type is None:
+            for key, value in getattr(properties, "UserProperty", []):
+                if key.lower() == cls.CONTENT_TYPE_USER_PROPERTY:
+                    return value
+        return content_type
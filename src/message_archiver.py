@@ -0,0 +1,254 @@
+import datetime
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from typing import List, Optional, Tuple
+
+from psycopg import IsolationLevel, sql
+
+from src.database import DatabaseConfKey
+from src.message_exporter import ExportFormat, MessageExporter
+from src.message_store import MessageStore
+
+
+_logger = logging.getLogger(__name__)
+
+
+class MessageArchiver(MessageExporter):
+    """
+    Moves expired days of the journal into files ("<archive_dir>/YYYY/MM/DD/<first topic level>.parquet" or ".csv.gz")
+    before deleting them. Export and delete of a day run in one REPEATABLE READ transaction, so rows arriving meanwhile
+    (e.g. late timestamps) are neither archived nor deleted.
+    """
+
+    DEFAULT_MAX_ROWS_PER_SECOND = 20000
+    DELETE_CHUNK_SIZE = 10000  # rows per DELETE statement (throttling)
+
+    FILE_NAME_REGEX = re.compile(r"[^A-Za-z0-9._-]")
+    NULL_TOPIC_ROOT = "_null"  # file name of the rows without topic
+
+    def __init__(self, config, stop_event: Optional[threading.Event] = None):
+        super().__init__(config)
+
+        self._archive_dir = config[DatabaseConfKey.ARCHIVE_DIR]
+        self._archive_format = config.get(DatabaseConfKey.ARCHIVE_FORMAT, ExportFormat.PARQUET)
+        self._clean_up_after_days = config.get(DatabaseConfKey.CLEAN_UP_AFTER_DAYS, MessageStore.DEFAULT_CLEAN_UP_AFTER_DAYS)
+        self._max_rows_per_second = config.get(DatabaseConfKey.ARCHIVE_MAX_ROWS_PER_SECOND, self.DEFAULT_MAX_ROWS_PER_SECOND)
+        self._stop_event = stop_event or threading.Event()
+
+        self.archived_count = 0
+
+        self._throttle_start = time.monotonic()
+        self._throttle_count = 0
+
+    def connect(self):
+        super().connect()
+        self._connection.isolation_level = IsolationLevel.REPEATABLE_READ
+
+    def get_archive_file_path(self, day: datetime.date, topic_root: str) -> str:
+        name = self.FILE_NAME_REGEX.sub("_", topic_root) or "_"
+        if name != topic_root:
+            name += "-{:08x}".format(zlib.crc32(topic_root.encode("utf-8")))  # "a b" and "a_b" must not collide
+        extension = ".parquet" if self._archive_format == ExportFormat.PARQUET else ".csv.gz"
+        dir_path = os.path.join(self._archive_dir, "{:04d}".format(day.year), "{:02d}".format(day.month), "{:02d}".format(day.day))
+
+        # late rows of an already archived day go into an additional file
+        file_path = os.path.join(dir_path, name + extension)
+        counter = 0
+        while os.path.exists(file_path):
+            counter += 1
+            file_path = os.path.join(dir_path, "{}.{}{}".format(name, counter, extension))
+        return file_path
+
+    def get_expired_day(self) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+        """The oldest day (local time) which has expired completely."""
+        if self._clean_up_after_days <= 0:
+            return None
+        time_limit = self._now() - datetime.timedelta(days=self._clean_up_after_days)
+
+        with self._connection.cursor() as cursor:
+            cursor.execute(sql.SQL("SELECT min(time) FROM {} WHERE time < %s").format(sql.Identifier(self._table_name)), (time_limit, ))
+            time_min = cursor.fetchone()[0]
+        self._connection.rollback()
+
+        if time_min is None:
+            return None
+        return self.get_day_range(time_min.astimezone(time_limit.tzinfo).date(), time_limit)
+
+    @classmethod
+    def get_day_range(cls, day: datetime.date, time_limit: datetime.datetime) \
+            -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+        time_zone = time_limit.tzinfo
+        day_from = datetime.datetime.combine(day, datetime.time(), tzinfo=time_zone)
+        day_to = datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time(), tzinfo=time_zone)  # DST safe
+        return (day_from, day_to) if day_to <= time_limit else None
+
+    def archive_day(self, day_from: datetime.datetime, day_to: datetime.datetime) -> int:
+        """Exports (one file per first topic level) and deletes one day; returns the number of archived rows."""
+        table = sql.Identifier(self._table_name)
+        archived_count = 0
+        file_paths = []
+
+        self.get_columns()  # not within the transaction of the day
+        try:
+            with self._connection.cursor() as cursor:
+                cursor.execute(sql.SQL(
+                    "SELECT split_part(topic, '/', 1), count(*) FROM {} WHERE time >= %s AND time < %s GROUP BY 1"
+                ).format(table), (day_from, day_to))
+                topic_roots = cursor.fetchall()
+
+            for topic_root, expected_count in topic_roots:
+                file_path = self.get_archive_file_path(day_from.date(), self.NULL_TOPIC_ROOT if topic_root is None else topic_root)
+                file_paths.append(file_path)
+                file_count = self._archive_file(file_path, day_from, day_to, topic_root)
+                if file_count != expected_count:
+                    raise RuntimeError("archived {} instead of {} rows into '{}'!".format(file_count, expected_count, file_path))
+                archived_count += file_count
+
+            deleted_count = self._delete_day(day_from, day_to)
+            if deleted_count != archived_count:
+                raise RuntimeError("would delete {} instead of {} archived rows!".format(deleted_count, archived_count))
+
+            self._connection.commit()
+
+        except Exception:
+            self._connection.rollback()
+            for file_path in file_paths:  # the rows were not deleted
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            raise
+
+        self.archived_count += archived_count
+        _logger.info("archived %d row(s) of %s into %d file(s).", archived_count, day_from.date(), len(file_paths))
+        return archived_count
+
+    @classmethod
+    def topic_root_condition(cls, topic_root: Optional[str]) -> sql.Composable:
+        """
+        The rows of a first topic level (expression of the count in `archive_day`). Not as MQTT topic filter: topic names
+        may contain "+" or "#" (no wildcards there), a filter "<root>/#" would select other rows than counted.
+        """
+        if topic_root is None:
+            return sql.SQL("topic IS NULL")
+        return sql.SQL("split_part(topic, '/', 1) = {}").format(sql.Literal(topic_root))
+
+    def _archive_file(self, file_path: str, time_from: datetime.datetime, time_to: datetime.datetime,
+                      topic_root: Optional[str]) -> int:
+        topics = self.topic_root_condition(topic_root)
+        temp_file_path = file_path + ".tmp"
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        self.exported_count = 0
+        self._start_throttle()
+        try:
+            if self._archive_format == ExportFormat.PARQUET:
+                self._export_parquet(temp_file_path, time_from, time_to, topics, self.DEFAULT_ROW_GROUP_SIZE)
+            else:
+                self._export_csv(temp_file_path, time_from, time_to, topics, compress=True)
+            os.replace(temp_file_path, file_path)
+        finally:
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+
+        return self.exported_count
+
+    def _delete_day(self, day_from: datetime.datetime, day_to: datetime.datetime) -> int:
+        """Deletes in chunks (throttled); the rows deleted before are not visible anymore within the transaction."""
+        table = sql.Identifier(self._table_name)
+        statement = sql.SQL(
+            "DELETE FROM {table} WHERE time >= %(from)s AND time < %(to)s AND journal_id IN ("
+            "SELECT journal_id FROM {table} WHERE time >= %(from)s AND time < %(to)s LIMIT %(limit)s)"
+        ).format(table=table)
+        params = {"from": day_from, "to": day_to, "limit": self.DELETE_CHUNK_SIZE}
+
+        deleted_count = 0
+        self._start_throttle()
+        with self._connection.cursor() as cursor:
+            while True:
+                cursor.execute(statement, params)
+                deleted_count += cursor.rowcount
+                self._throttle(cursor.rowcount)
+                if cursor.rowcount < self.DELETE_CHUNK_SIZE:
+                    break
+        return deleted_count
+
+    def _start_throttle(self):
+        self._throttle_start = time.monotonic()
+        self._throttle_count = 0
+
+    def _chunk_exported(self, row_count: int):
+        self._throttle(row_count)
+
+    def _throttle(self, row_count: int):
+        """Keeps below `archive_max_rows_per_second` (I/O of the database is shared with ingest)."""
+        self._throttle_count += row_count
+        if self._max_rows_per_second > 0:
+            wait_seconds = self._throttle_count / self._max_rows_per_second - (time.monotonic() - self._throttle_start)
+            if wait_seconds > 0 and self._stop_event.wait(wait_seconds):
+                raise InterruptedError("archiving stopped")
+
+
+class Archiver(threading.Thread):
+    """
+    Background thread (own database connection) which archives and deletes the expired days (instead of the clean up of
+    `MessageStore`). Errors are logged only, the next run starts after `archive_interval_seconds`.
+    """
+
+    DEFAULT_INTERVAL_SECONDS = 3600
+
+    def __init__(self, config):
+        # daemon: a running export must not delay the shutdown, its transaction is rolled back
+        threading.Thread.__init__(self, name=self.__class__.__name__, daemon=True)
+
+        self._closing = threading.Event()
+        self._archiver = MessageArchiver(config, self._closing)
+        self._interval_seconds = config.get(DatabaseConfKey.ARCHIVE_INTERVAL_SECONDS, self.DEFAULT_INTERVAL_SECONDS)
+
+        self.check_requirements(config)
+
+        super().start()
+
+    @classmethod
+    def check_requirements(cls, config):
+        """Called before any thread of the service is started (see `Runner`)."""
+        if config.get(DatabaseConfKey.ARCHIVE_FORMAT, ExportFormat.PARQUET) == ExportFormat.PARQUET:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError as ex:
+                raise RuntimeError("Parquet archives need the package 'pyarrow' (or archive_format: csv)!") from ex
+
+    def start(self):
+        raise RuntimeError("started within constructor!")
+
+    def close(self):
+        self._closing.set()
+
+    def run(self):
+        try:
+            while not self._closing.is_set():
+                try:
+                    self.archive()
+                except InterruptedError:
+                    pass
+                except Exception as ex:
+                    _logger.exception(ex)
+                    self._archiver.close()  # reconnect on next run
+
+                self._closing.wait(self._interval_seconds)
+        finally:
+            self._archiver.close()
+
+    def archive(self) -> List[int]:
+        if not self._archiver.is_connected:
+            self._archiver.connect()
+
+        counts = []
+        while not self._closing.is_set():
+            day_range = self._archiver.get_expired_day()
+            if day_range is None:
+                break
+            counts.append(self._archiver.archive_day(*day_range))
+        return counts
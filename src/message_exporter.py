@@ -0,0 +1,228 @@
+import concurrent.futures
+import datetime
+import gzip
+import logging
+import os
+import time
+from typing import List, Optional, Tuple, Union
+
+from psycopg import sql
+
+from src.database import Database
+
+
+_logger = logging.getLogger(__name__)
+
+
+class ExportFormat:
+    CSV = "csv"
+    PARQUET = "parquet"
+
+    CHOICES = [CSV, PARQUET]
+
+    @classmethod
+    def from_file_name(cls, file_name: str) -> str:
+        return cls.PARQUET if file_name.endswith(".parquet") else cls.CSV
+
+
+class MessageExporter(Database):
+    """
+    Streams a time (and topic) range of the journal into a file without loading it into memory:
+    - CSV (gzipped if the file name ends with ".gz") via `COPY ... TO STDOUT`
+    - Parquet via a server-side cursor, written in row groups of fixed size (needs `pyarrow`)
+    The optional columns (`OPTIONAL_COLUMNS`) are exported if the table has them.
+    """
+
+    COLUMNS = ["journal_id", "topic", "text", "data", "message_id", "qos", "retain", "time"]
+
+    DEFAULT_ROW_GROUP_SIZE = 100000
+    DEFAULT_COMPRESS_LEVEL = 6
+
+    def __init__(self, config):
+        super().__init__(config)
+
+        self.exported_count = 0
+        self._columns: Optional[List[str]] = None
+
+    def get_columns(self) -> List[str]:
+        """Exported columns; call it outside of a running transaction (the first call ends it)."""
+        if self._columns is None:
+            self._columns = self.COLUMNS + self._get_optional_columns(self._table_name)
+        return self._columns
+
+    def connect(self):
+        super().connect()
+        self._columns = None  # columns may have been added meanwhile
+
+    @classmethod
+    def export_parallel(cls, config, file_path: str, time_from: datetime.datetime, time_to: datetime.datetime,
+                        topics: Optional[List[str]] = None, export_format: Optional[str] = None, workers=1,
+                        row_group_size=DEFAULT_ROW_GROUP_SIZE) -> List[str]:
+        """Splits the time range into slices, which are exported in parallel (own connection) into separate files."""
+        export_format = export_format or ExportFormat.from_file_name(file_path)
+
+        if workers <= 1:
+            with cls(config) as exporter:
+                exporter.export(file_path, time_from, time_to, topics, export_format, row_group_size)
+            return [file_path]
+
+        slices = cls.split_time_range(time_from, time_to, workers)
+        file_paths = [cls.get_part_file_path(file_path, i + 1) for i in range(len(slices))]
+
+        def export_slice(index):
+            with cls(config) as slice_exporter:
+                slice_from, slice_to = slices[index]
+                slice_exporter.export(file_paths[index], slice_from, slice_to, topics, export_format, row_group_size)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(export_slice, i) for i in range(len(slices))]:
+                future.result()  # raises exceptions of workers
+
+        return file_paths
+
+    @classmethod
+    def split_time_range(cls, time_from: datetime.datetime, time_to: datetime.datetime, count: int) \
+            -> List[Tuple[datetime.datetime, datetime.datetime]]:
+        step = (time_to - time_from) / count
+        slices = []
+        for i in range(count):
+            slice_to = time_to if i == count - 1 else time_from + step * (i + 1)
+            slices.append((time_from + step * i, slice_to))
+        return slices
+
+    @classmethod
+    def get_part_file_path(cls, file_path: str, part: int) -> str:
+        """"journal.csv.gz" => "journal.part001.csv.gz\""""
+        dir_name, base_name = os.path.split(file_path)
+        name, dot, extensions = base_name.partition(".")
+        return os.path.join(dir_name, "{}.part{:03d}{}{}".format(name, part, dot, extensions))
+
+    @classmethod
+    def topic_condition(cls, topics: Optional[List[Optional[str]]]) -> sql.Composable:
+        """MQTT topic filters (with "+" and "#" wildcards) as SQL condition; None: rows without topic"""
+        if not topics:
+            return sql.SQL("TRUE")
+
+        conditions = []
+        for topic in topics:
+            if topic is None:
+                conditions.append(sql.SQL("topic IS NULL"))
+            elif topic == "#":
+                return sql.SQL("TRUE")
+            elif "+" not in topic and "#" not in topic:
+                conditions.append(sql.SQL("topic = {}").format(sql.Literal(topic)))
+            elif "+" not in topic and topic.endswith("/#"):
+                parent = topic[:-2]  # "a/#" matches "a" too
+                like = parent.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "/%"
+                conditions.append(sql.SQL("topic = {} OR topic LIKE {}").format(sql.Literal(parent), sql.Literal(like)))
+            else:
+                regex = "/".join("[^/]*" if level == "+" else cls._escape_regex(level) for level in topic.split("/"))
+                if regex.endswith("/#"):
+                    regex = regex[:-2] + "(/.*)?"
+                conditions.append(sql.SQL("topic ~ {}").format(sql.Literal("^" + regex + "$")))
+
+        return sql.SQL("({})").format(sql.SQL(" OR ").join(conditions))
+
+    @classmethod
+    def _escape_regex(cls, text: str) -> str:
+        return "".join("\\" + c if c in ".^$*+?()[]{}|\\" else c for c in text)
+
+    def _select_statement(self, time_from, time_to, topics: Union[Optional[List[Optional[str]]], sql.Composable],
+                          text_columns=False) -> sql.Composable:
+        """`topics`: MQTT topic filters (see `topic_condition`) or an SQL condition"""
+        columns = [sql.SQL("data::text") if text_columns and c == "data" else sql.Identifier(c) for c in self.get_columns()]
+        return sql.SQL("SELECT {columns} FROM {table} WHERE time >= {time_from} AND time < {time_to} AND {topics} ORDER BY time").format(
+            columns=sql.SQL(", ").join(columns),
+            table=sql.Identifier(self._table_name),
+            time_from=sql.Literal(time_from),
+            time_to=sql.Literal(time_to),
+            topics=topics if isinstance(topics, sql.Composable) else self.topic_condition(topics),
+        )
+
+    def export(self, file_path: str, time_from: datetime.datetime, time_to: datetime.datetime, topics: Optional[List[str]] = None,
+               export_format: Optional[str] = None, row_group_size=DEFAULT_ROW_GROUP_SIZE) -> int:
+        export_format = export_format or ExportFormat.from_file_name(file_path)
+        temp_file_path = file_path + ".tmp"
+        time_start = time.monotonic()
+
+        dir_path = os.path.dirname(file_path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+
+        self.get_columns()
+        try:
+            if export_format == ExportFormat.PARQUET:
+                self._export_parquet(temp_file_path, time_from, time_to, topics, row_group_size)
+            else:
+                self._export_csv(temp_file_path, time_from, time_to, topics, compress=file_path.endswith(".gz"))
+            os.replace(temp_file_path, file_path)
+        finally:
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+            self._connection.rollback()  # read only
+
+        seconds = time.monotonic() - time_start
+        _logger.info("exported %d row(s) into '%s' (%.0f rows/s)", self.exported_count, file_path,
+                     self.exported_count / seconds if seconds > 0 else 0)
+        return self.exported_count
+
+    def _export_csv(self, file_path, time_from, time_to, topics, compress: bool):
+        copy_statement = sql.SQL("COPY ({}) TO STDOUT WITH CSV HEADER").format(self._select_statement(time_from, time_to, topics))
+
+        if compress:
+            stream = gzip.open(file_path, "wb", compresslevel=self.DEFAULT_COMPRESS_LEVEL)
+        else:
+            stream = open(file_path, "wb")
+
+        with stream:
+            with self._connection.cursor() as cursor:
+                with cursor.copy(copy_statement) as copy:
+                    for data in copy:
+                        stream.write(data)
+                        self._chunk_exported(data.count(b"\n"))  # rows (estimated: line breaks within values count too)
+                self.exported_count = max(cursor.rowcount, 0)
+
+    def _export_parquet(self, file_path, time_from, time_to, topics, row_group_size: int):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as ex:
+            raise RuntimeError("Parquet export needs the package 'pyarrow' (pip install pyarrow)!") from ex
+
+        column_types = {
+            "journal_id": pyarrow.int64(),
+            "topic": pyarrow.string(),
+            "text": pyarrow.string(),
+            "data": pyarrow.string(),  # JSON
+            "message_id": pyarrow.int32(),
+            "qos": pyarrow.int32(),
+            "retain": pyarrow.int32(),
+            "time": pyarrow.timestamp("us", tz="UTC"),
+            "value_num": pyarrow.float64(),
+            "value_bool": pyarrow.bool_(),
+            "broker_id": pyarrow.string(),
+        }
+        schema = pyarrow.schema([(c, column_types[c]) for c in self.get_columns()])
+
+        statement = self._select_statement(time_from, time_to, topics, text_columns=True)
+        cursor_name = "export_{}".format(id(self))
+
+        with pyarrow.parquet.ParquetWriter(file_path, schema, compression="zstd") as writer:
+            with self._connection.cursor(name=cursor_name) as cursor:
+                cursor.itersize = row_group_size
+                cursor.execute(statement)
+                while True:
+                    rows = cursor.fetchmany(row_group_size)
+                    if not rows:
+                        break
+                    columns = list(zip(*rows))
+                    table = pyarrow.Table.from_arrays(
+                        [pyarrow.array(columns[i], type=field.type) for i, field in enumerate(schema)], schema=schema
+                    )
+                    writer.write_table(table, row_group_size=row_group_size)
+                    self.exported_count += len(rows)
+                    self._chunk_exported(len(rows))
+
+    def _chunk_exported(self, row_count: int):
+        """Called after each written chunk (Parquet: row group); e.g. for throttling."""
+        pass
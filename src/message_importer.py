@@ -0,0 +1,239 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+from tzlocal import get_localzone
+
+from src.database import DatabaseConfKey, IngestMode
+from src.message import Message
+from src.message_store import MessageStore
+from src.mqtt_client import MqttConfKey
+from src.topic_filter import TopicFilter
+
+
+_logger = logging.getLogger(__name__)
+
+
+class MessageImporterException(Exception):
+    pass
+
+
+class MessageImporter:
+    """
+    Bulk import of recovered messages (bypasses `ProxyStore`):
+    - JSON lines (`*.jsonl`, `*.json`): one object per line with `topic`, `payload` (or `text`), `time` and optional `qos`,
+      `retain`, `message_id`.
+    - CSV (`*.csv`) with header, e.g. journal dumps (`COPY journal TO ... WITH CSV HEADER`).
+    Files may be gzipped (`*.gz`). Lines are streamed into a bounded queue of batches, so memory usage doesn't depend on
+    the file size. Several workers (each with its own database connection) store the batches in parallel via COPY.
+    """
+
+    DEFAULT_WORKERS = 4
+    DEFAULT_BATCH_SIZE = 10000
+
+    PROGRESS_INTERVAL_SECONDS = 10
+
+    def __init__(self, database_config, mqtt_config, workers=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE):
+        # bulk import: COPY directly into the journal table, even if the service uses the staging table
+        self._database_config = {**database_config, DatabaseConfKey.INGEST_MODE: IngestMode.DIRECT}
+        self._workers = max(1, workers)
+        self._batch_size = max(1, batch_size)
+
+        self._topic_filter = TopicFilter(mqtt_config.get(MqttConfKey.SKIP_SUBSCRIPTION_REGEXES))
+        self._filter_message_id_0 = mqtt_config.get(MqttConfKey.FILTER_MESSAGE_ID_0, False)
+
+        self._lock = threading.Lock()
+        self._batches: Optional[queue.Queue] = None
+        self._worker_exception: Optional[Exception] = None
+
+        self._read_count = 0
+        self._skipped_count = 0
+        self._invalid_count = 0
+        self._stored_count = 0
+
+    @property
+    def stored_count(self) -> int:
+        with self._lock:
+            return self._stored_count
+
+    @property
+    def skipped_count(self) -> int:
+        return self._skipped_count
+
+    @property
+    def invalid_count(self) -> int:
+        return self._invalid_count
+
+    def import_files(self, files: List[str]) -> int:
+        self._batches = queue.Queue(maxsize=self._workers * 2)
+        threads = [
+            threading.Thread(target=self._store_batches, name=f"{self.__class__.__name__}-{i}", daemon=True)
+            for i in range(self._workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        time_start = time.monotonic()
+        time_last_log = time_start
+
+        try:
+            for file in files:
+                _logger.info("importing '%s'...", file)
+                batch = []
+                for message in self.read_messages(file):
+                    batch.append(message)
+                    if len(batch) >= self._batch_size:
+                        self._queue_batch(batch)
+                        batch = []
+
+                    if time.monotonic() - time_last_log > self.PROGRESS_INTERVAL_SECONDS:
+                        time_last_log = time.monotonic()
+                        self._log_progress(time_start)
+
+                if batch:
+                    self._queue_batch(batch)
+
+        finally:
+            for _ in threads:
+                self._batches.put(None)  # stop marker
+            for thread in threads:
+                thread.join()
+
+        self._check_worker_exception()
+        self._log_progress(time_start)
+        return self.stored_count
+
+    def _queue_batch(self, batch: List[Message]):
+        while True:
+            self._check_worker_exception()
+            try:
+                self._batches.put(batch, timeout=1)  # blocks if workers fall behind => constant memory
+                return
+            except queue.Full:
+                pass
+
+    def _check_worker_exception(self):
+        with self._lock:
+            if self._worker_exception:
+                raise MessageImporterException("import aborted!") from self._worker_exception
+
+    def _store_batches(self):
+        message_store = None
+        try:
+            message_store = MessageStore(self._database_config)
+            message_store.connect()
+
+            while True:
+                batch = self._batches.get()
+                if batch is None:
+                    break
+                message_store.store(batch)
+                with self._lock:
+                    self._stored_count += len(batch)
+
+        except Exception as ex:
+            _logger.exception(ex)
+            with self._lock:
+                self._worker_exception = ex
+            # drain the queue to not block the reader
+            while self._batches.get() is not None:
+                pass
+        finally:
+            if message_store is not None:
+                message_store.close()
+
+    def _log_progress(self, time_start: float):
+        stored_count = self.stored_count
+        seconds = time.monotonic() - time_start
+        _logger.info(
+            "import: read=%d; stored=%d (%.0f rows/s); skipped=%d; invalid=%d",
+            self._read_count, stored_count, stored_count / seconds if seconds > 0 else 0, self._skipped_count, self._invalid_count
+        )
+
+    def read_messages(self, file: str) -> Iterator[Message]:
+        """Streams the messages of a file which passes the configured filters."""
+        if file.endswith(".gz"):
+            stream = io.TextIOWrapper(gzip.open(file, "rb"), encoding="utf-8")
+            file = file[:-3]
+        else:
+            stream = open(file, "r", encoding="utf-8")
+
+        with stream:
+            if file.endswith(".csv"):
+                records = csv.DictReader(stream)
+            else:
+                records = (line for line in stream if line.strip())
+
+            for record in records:
+                self._read_count += 1
+                try:
+                    if isinstance(record, str):
+                        record = json.loads(record)
+                    message = self.parse_record(record)
+                except (ValueError, TypeError, AttributeError) as ex:
+                    self._invalid_count += 1
+                    _logger.debug("invalid record (%s): %s", ex, record)
+                    continue
+
+                if not self._topic_filter.accept(message.topic) or \
+                        (self._filter_message_id_0 and message.message_id is not None and message.message_id <= 0):
+                    self._skipped_count += 1
+                    continue
+
+                yield message
+
+    @classmethod
+    def parse_record(cls, record: Dict) -> Message:
+        topic = record.get("topic")
+        if not topic:
+            raise ValueError("no topic")
+
+        text = record.get("payload", record.get("text"))
+        if text is not None and not isinstance(text, str):
+            text = json.dumps(text)  # payload was stored as JSON object
+
+        return Message(
+            message_id=cls._parse_int(record.get("message_id", record.get("mid"))),
+            topic=topic,
+            text=text,
+            qos=cls._parse_int(record.get("qos")),
+            retain=cls._parse_int(record.get("retain")),
+            time=cls.parse_time(record.get("time", record.get("timestamp"))),
+            broker_id=record.get("broker_id"),
+        )
+
+    @classmethod
+    def parse_time(cls, value) -> datetime.datetime:
+        if value is None or value == "":
+            raise ValueError("no time")
+
+        if isinstance(value, (int, float)):
+            return datetime.datetime.fromtimestamp(value, tz=get_localzone())
+
+        value = value.strip()
+        if value.endswith("Z"):
+            value = value[:-1] + "+00:00"
+        if len(value) > 19 and value[-3] in "+-" and value[-2:].isdigit():
+            value += ":00"  # Postgres output like "2023-01-02 03:04:05.123+01" (unsupported by Python < 3.11)
+        time_value = datetime.datetime.fromisoformat(value)
+
+        if time_value.tzinfo is None:
+            time_value = time_value.replace(tzinfo=get_localzone())
+        return time_value
+
+    @classmethod
+    def _parse_int(cls, value) -> Optional[int]:
+        if value is None or value == "":
+            return None
+        if isinstance(value, bool):
+            return int(value)
+        if isinstance(value, str) and value.lower() in ("true", "false"):
+            return 1 if value.lower() == "true" else 0
+        return int(value)
@@ -0,0 +1,76 @@
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+from src.message import Message
+
+
+_logger = logging.getLogger(__name__)
+
+
+class MessageSpool:
+    """
+    Local file for messages, which couldn't be stored within the shutdown deadline. They are replayed on the next start.
+    The format (JSON lines) is the one of `MessageImporter`, so a spool file can be imported manually too.
+    Also used for dead letters (rows rejected by the database, see `MessageStore`) with an additional "error" field.
+    """
+
+    def __init__(self, file_path: str):
+        self._file_path = file_path
+
+    @property
+    def file_path(self) -> str:
+        return self._file_path
+
+    def exists(self) -> bool:
+        return os.path.isfile(self._file_path)
+
+    def save(self, messages: List[Message], errors: Optional[List[str]] = None):
+        """Appends (previous left overs are kept) and syncs to disk."""
+        dir_path = os.path.dirname(self._file_path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+
+        with open(self._file_path, "a", encoding="utf-8") as stream:
+            for index, message in enumerate(messages):
+                record = self.to_record(message)
+                if errors:
+                    record["error"] = errors[index]
+                stream.write(json.dumps(record))
+                stream.write("\n")
+            stream.flush()
+            os.fsync(stream.fileno())
+
+        _logger.warning("saved %d message(s) into '%s'.", len(messages), self._file_path)
+
+    def load(self) -> List[Message]:
+        from src.message_importer import MessageImporter  # circular: `MessageStore` uses the spool for dead letters
+
+        messages = []
+        with open(self._file_path, "r", encoding="utf-8") as stream:
+            for line in stream:
+                if not line.strip():
+                    continue
+                try:
+                    messages.append(MessageImporter.parse_record(json.loads(line)))
+                except (ValueError, TypeError, AttributeError) as ex:
+                    _logger.error("skipped invalid spool record (%s): %s", ex, line.strip())
+        return messages
+
+    def remove(self):
+        os.remove(self._file_path)
+
+    @classmethod
+    def to_record(cls, message: Message) -> Dict:
+        record = {
+            "topic": message.topic,
+            "payload": message.text,
+            "time": message.time.isoformat() if message.time else None,
+            "qos": message.qos,
+            "retain": message.retain,
+            "message_id": message.message_id,
+        }
+        if message.broker_id is not None:
+            record["broker_id"] = message.broker_id
+        return record
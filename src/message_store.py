@@ -1,26 +1,69 @@
 import datetime
 import logging
-from typing import Optional
+from typing import List, Optional, Tuple
 
-from psycopg import sql
+from psycopg import errors, sql
 
-from src.database import Database, DatabaseConfKey
+from src.database import Database, DatabaseConfKey, DatabaseException, IngestMode
 from src.lifecycle_control import LifecycleControl, StatusNotification
+from src.message import Message
+from src.message_spool import MessageSpool
+from src.metrics import Metrics
+from src.topic_rules import TopicRules
+from src.value_extractor import ValueExtractor
 
 _logger = logging.getLogger(__name__)
 
 
+class PartialStoreException(DatabaseException):
+    """A split batch failed after its synchronous part was committed: only `unstored_messages` have to be retried."""
+
+    def __init__(self, unstored_messages: List[Message]):
+        super().__init__("storing {} asynchronously committed message(s) failed".format(len(unstored_messages)))
+        self.unstored_messages = unstored_messages
+
+
 class MessageStore(Database):
 
-    DEFAULT_BATCH_SIZE = 100
-    DEFAULT_WAIT_MAX_SECONDS = 10
     DEFAULT_CLEAN_UP_AFTER_DAYS = 14
 
+    # rejected rows (e.g. topic too long, invalid characters); the rest of the batch is fine
+    ROW_ERRORS = (errors.DataError, errors.IntegrityError)
+
     def __init__(self, config):
         super().__init__(config)
 
-        self._batch_size = max(config.get(DatabaseConfKey.BATCH_SIZE, self.DEFAULT_BATCH_SIZE), 10000)
+        # batching is handled by `ProxyStore` (`BatchController`)
         self._clean_up_after_days = config.get(DatabaseConfKey.CLEAN_UP_AFTER_DAYS, self.DEFAULT_CLEAN_UP_AFTER_DAYS)
+        if config.get(DatabaseConfKey.ARCHIVE_DIR):
+            self._clean_up_after_days = 0  # expired rows are archived and deleted by `Archiver`
+
+        # staging mode: the merger (`StagingMerger`) moves the messages into the journal table
+        is_staging = config.get(DatabaseConfKey.INGEST_MODE, IngestMode.DIRECT) == IngestMode.STAGING
+        self._copy_table_name = self._staging_table_name if is_staging else self._table_name
+
+        # low-value messages are committed without waiting for the WAL flush (`synchronous_commit = off`)
+        self._async_commit_qos = set(config.get(DatabaseConfKey.ASYNC_COMMIT_QOS) or [])
+        self._async_commit_topics = TopicRules(
+            [(regex, True) for regex in config.get(DatabaseConfKey.ASYNC_COMMIT_TOPIC_REGEXES) or []], default=False
+        )
+
+        # typed values (`value_num`, `value_bool`) are derived while the batch gets encoded
+        self._value_extractor = ValueExtractor(config) if config.get(DatabaseConfKey.VALUE_COLUMNS) else None
+        # several brokers feed one store (see `Runner`)
+        self._broker_id_column = bool(config.get(DatabaseConfKey.BROKER_ID_COLUMN))
+        columns = ["message_id", "topic", "text", "qos", "retain", "time"]
+        if self._value_extractor is not None:
+            columns.extend(["value_num", "value_bool"])
+        if self._broker_id_column:
+            columns.append("broker_id")
+        self._copy_statement = sql.SQL("COPY {} ({}) FROM STDIN").format(
+            sql.Identifier(self._copy_table_name), sql.SQL(", ").join(sql.Identifier(c) for c in columns)
+        )
+
+        # rows rejected by the database are isolated (bisection) and saved there; without: logged only
+        dead_letter_file = config.get(DatabaseConfKey.DEAD_LETTER_FILE)
+        self._dead_letter_spool = MessageSpool(dead_letter_file) if dead_letter_file else None
 
         self._last_clean_up_time = self._now()
         self._last_connect_time = None
@@ -54,22 +97,31 @@ class MessageStore(Database):
     def last_store_time(self) -> Optional[datetime.datetime]:
         return self._last_store_time
 
+    def is_async_commit(self, message: Message) -> bool:
+        return message.qos in self._async_commit_qos or self._async_commit_topics.get(message.topic)
+
     def store(self, messages):
         if not messages:
             return
 
-        copy_statement = sql.SQL("COPY {} (message_id, topic, text, qos, retain, time) FROM STDIN") \
-            .format(sql.Identifier(self._table_name))
-
-        with self._connection.cursor() as cursor:
-            with cursor.copy(copy_statement) as copy:
-                for m in messages:
-                    data = (m.message_id, m.topic, m.text, m.qos, m.retain, m.time)
-                    copy.write_row(data)
-            cursor_rowcount = cursor.rowcount
-
-        self._connection.commit()
+        if self._async_commit_qos or self._async_commit_topics:
+            # split batch: critical messages are committed synchronously (first), the rest asynchronously
+            sync_messages = []
+            async_messages = []
+            for m in messages:
+                (async_messages if self.is_async_commit(m) else sync_messages).append(m)
+
+            cursor_rowcount = self._copy_messages(sync_messages, synchronous_commit=True)
+            try:
+                cursor_rowcount += self._copy_messages(async_messages, synchronous_commit=False)
+            except Exception as ex:
+                if not sync_messages:
+                    raise
+                raise PartialStoreException(async_messages) from ex  # the sync part must not be stored twice
+        else:
+            cursor_rowcount = self._copy_messages(messages, synchronous_commit=True)
 
+        self._last_store_time = self._now()
         self._status_stored_message_count += cursor_rowcount
         _logger.debug("%d row(s) inserted.", cursor_rowcount)
 
@@ -79,8 +131,94 @@ class MessageStore(Database):
 
         LifecycleControl.notify(StatusNotification.MESSAGE_STORE_STORED)
 
+    def _copy_messages(self, messages: List[Message], synchronous_commit: bool) -> int:
+        """Stores messages in one transaction; rejected rows are isolated and dead-lettered, the rest gets stored."""
+        if not messages:
+            return 0
+
+        try:
+            with self._connection.cursor() as cursor:
+                if not synchronous_commit:
+                    cursor.execute("SET LOCAL synchronous_commit = off")
+                cursor_rowcount = self._copy_rows(cursor, messages)
+
+            self._connection.commit()
+            return cursor_rowcount
+
+        except self.ROW_ERRORS as ex:
+            self._connection.rollback()
+            _logger.warning("batch of %d message(s) rejected (%s) => isolating invalid rows.", len(messages), ex)
+
+        dead_letters = []
+        # idle after the rollback: one transaction (committed at exit), so the blocks of `_copy_bisecting` are savepoints
+        with self._connection.transaction():
+            with self._connection.cursor() as cursor:
+                if not synchronous_commit:
+                    cursor.execute("SET LOCAL synchronous_commit = off")
+                cursor_rowcount = self._copy_bisecting(cursor, messages, dead_letters)
+
+        self._save_dead_letters(dead_letters)
+        return cursor_rowcount
+
+    def _copy_rows(self, cursor, messages: List[Message]) -> int:
+        value_extractor = self._value_extractor
+        broker_id_column = self._broker_id_column
+        with cursor.copy(self._copy_statement) as copy:
+            if value_extractor is None and not broker_id_column:
+                for m in messages:
+                    data = (m.message_id, m.topic, m.text, m.qos, m.retain, m.time)
+                    copy.write_row(data)
+            else:
+                for m in messages:
+                    data = (m.message_id, m.topic, m.text, m.qos, m.retain, m.time)
+                    if value_extractor is not None:
+                        try:
+                            data += value_extractor.extract(m)  # value_num, value_bool
+                        except Exception as ex:  # the values are optional, the message must never fail the batch
+                            _logger.warning("value extraction failed (%s): %s", m.topic, ex)
+                            data += ValueExtractor.NO_VALUE
+                    if broker_id_column:
+                        data += (m.broker_id, )
+                    copy.write_row(data)
+        return cursor.rowcount
+
+    def _copy_bisecting(self, cursor, messages: List[Message], dead_letters: List[Tuple[Message, str]]) -> int:
+        """
+        The batch was rejected: both halves are copied within savepoints of the transaction of `_copy_messages`, failing
+        halves are split further. So k invalid rows need O(k log n) COPYs; other errors roll back the whole batch.
+        """
+        if len(messages) == 1:
+            try:
+                with self._connection.transaction():  # savepoint
+                    return self._copy_rows(cursor, messages)
+            except self.ROW_ERRORS as ex:
+                dead_letters.append((messages[0], str(ex).strip()))
+                return 0
+
+        cursor_rowcount = 0
+        middle = len(messages) // 2
+        for half in [messages[:middle], messages[middle:]]:
+            try:
+                with self._connection.transaction():  # savepoint
+                    cursor_rowcount += self._copy_rows(cursor, half)
+            except self.ROW_ERRORS:
+                cursor_rowcount += self._copy_bisecting(cursor, half, dead_letters)
+        return cursor_rowcount
+
+    def _save_dead_letters(self, dead_letters: List[Tuple[Message, str]]):
+        Metrics.inc("store.dead_letters", len(dead_letters))
+        for message, error in dead_letters:
+            _logger.error("message rejected by database (topic: %s): %s", message.topic, error)
+
+        if self._dead_letter_spool is not None and dead_letters:
+            try:
+                self._dead_letter_spool.save([m for m, _ in dead_letters], [e for _, e in dead_letters])
+            except Exception as ex:
+                _logger.exception(ex)
+
     def clean_up(self):
         if self._clean_up_after_days <= 0:
+            self._last_clean_up_time = self._now()  # not due again with the next store loop
             return  # skip
 
         time_limit = self._now() - datetime.timedelta(days=self._clean_up_after_days)
@@ -0,0 +1,37 @@
+import threading
+from typing import Dict, Union
+
+
+Number = Union[int, float]
+
+
+class Metrics:
+    """Process wide registry of counters and gauges (e.g. queue depths, batch sizes), readable at runtime (see `ControlServer`)"""
+
+    _lock = threading.Lock()
+    _values: Dict[str, Number] = {}
+
+    @classmethod
+    def set(cls, name: str, value: Number):
+        with cls._lock:
+            cls._values[name] = value
+
+    @classmethod
+    def inc(cls, name: str, value: Number = 1):
+        with cls._lock:
+            cls._values[name] = cls._values.get(name, 0) + value
+
+    @classmethod
+    def get(cls, name: str, default=None):
+        with cls._lock:
+            return cls._values.get(name, default)
+
+    @classmethod
+    def get_all(cls, prefix: str = "") -> Dict[str, Number]:
+        with cls._lock:
+            return {k: v for k, v in cls._values.items() if k.startswith(prefix)}
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._values.clear()
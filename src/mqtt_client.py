@@ -4,8 +4,12 @@ import threading
 from typing import Optional
 
 import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
 from tzlocal import get_localzone
 
+from src.rate_limiter import RATE_LIMITS_JSONSCHEMA
+
 
 _logger = logging.getLogger(__name__)
 
@@ -26,8 +30,28 @@ class MqttConfKey:
 
     FILTER_MESSAGE_ID_0 = "filter_message_id_0"
 
+    RECONNECT = "reconnect"
+    RECONNECT_DELAY_MIN_SECONDS = "reconnect_delay_min_seconds"
+    RECONNECT_DELAY_MAX_SECONDS = "reconnect_delay_max_seconds"
+    CLEAN_SESSION = "clean_session"
+    SESSION_EXPIRY_SECONDS = "session_expiry_seconds"
+
     SUBSCRIPTIONS = "subscriptions"
     SKIP_SUBSCRIPTION_REGEXES = "skip_subscription_regexes"
+    SUBSCRIPTION_IDENTIFIERS = "subscription_identifiers"
+
+    DEDUP_WINDOW_SECONDS = "dedup_window_seconds"
+    DEDUP_WINDOW_SIZE = "dedup_window_size"
+
+    RATE_LIMITS = "rate_limits"
+
+    BROKER_ID = "broker_id"
+
+    TIMESTAMP_JSON_FIELD = "timestamp_json_field"
+    TIMESTAMP_USER_PROPERTY = "timestamp_user_property"
+    TIMESTAMP_TOPIC_REGEXES = "timestamp_topic_regexes"
+    TIMESTAMP_MAX_FUTURE_SECONDS = "timestamp_max_future_seconds"
+    TIMESTAMP_MAX_PAST_SECONDS = "timestamp_max_past_seconds"
 
     TEST_SUBSCRIPTION_BASE = "test_subscription_base"  # Test only
 
@@ -69,8 +93,71 @@ MQTT_JSONSCHEMA = {
             "description": "Filter all messages with Message ID 0. Default: False. '0' is reserved as an invalid Message ID.",
         },
 
+        MqttConfKey.RECONNECT: {
+            "type": "boolean",
+            "description": "Reconnect (with backoff) and resubscribe within the process instead of exiting on a lost "
+                           "connection (=> restart by systemd). Default: False",
+        },
+        MqttConfKey.RECONNECT_DELAY_MIN_SECONDS: {"type": "integer", "minimum": 1, "description": "Default: 1"},
+        MqttConfKey.RECONNECT_DELAY_MAX_SECONDS: {"type": "integer", "minimum": 1, "description": "Default: 60"},
+        MqttConfKey.CLEAN_SESSION: {
+            "type": "boolean",
+            "description": "False: persistent session, the broker queues messages (QoS >= 1) while disconnected "
+                           "(needs a fixed client_id). Default: False with 'reconnect' and 'client_id', otherwise True",
+        },
+        MqttConfKey.SESSION_EXPIRY_SECONDS: {
+            "type": "integer", "minimum": 0,
+            "description": "MQTT v5 only: how long the broker keeps a persistent session. Default: 3600",
+        },
+
         MqttConfKey.SUBSCRIPTIONS: SUBSCRIPTION_JSONSCHEMA,
         MqttConfKey.SKIP_SUBSCRIPTION_REGEXES: SKIP_SUBSCRIPTION_JSONSCHEMA,
+        MqttConfKey.SUBSCRIPTION_IDENTIFIERS: {
+            "type": "boolean",
+            "description": "MQTT v5 (protocol: 5) only: subscribe with subscription identifiers, which restrict the regex "
+                           "checks per message to the skip regexes relevant for the matched subscription. Default: True",
+        },
+
+        MqttConfKey.DEDUP_WINDOW_SECONDS: {
+            "type": "number", "minimum": 0,
+            "description": "Skip QoS >= 1 messages with the same topic, payload and message id received within <n> seconds "
+                           "(redeliveries after a reconnect). 0 disables. Default: 0",
+        },
+        MqttConfKey.DEDUP_WINDOW_SIZE: {
+            "type": "integer", "minimum": 1,
+            "description": "Max. number of remembered messages for 'dedup_window_seconds'. Default: 100000",
+        },
+
+        MqttConfKey.RATE_LIMITS: RATE_LIMITS_JSONSCHEMA,
+
+        MqttConfKey.BROKER_ID: {
+            "type": "string", "minLength": 1, "maxLength": 64,
+            "description": "Stored with each message (column 'broker_id', see database 'broker_id_column'), e.g. a site name",
+        },
+
+        MqttConfKey.TIMESTAMP_JSON_FIELD: {
+            "type": "string", "minLength": 1,
+            "description": "Message time from this JSON payload field (nested: 'meta.time'); epoch seconds/milliseconds "
+                           "or ISO 8601. Default: not set (arrival time)",
+        },
+        MqttConfKey.TIMESTAMP_USER_PROPERTY: {
+            "type": "string", "minLength": 1,
+            "description": "MQTT v5 only: message time from this user property (preferred to the JSON field)",
+        },
+        MqttConfKey.TIMESTAMP_TOPIC_REGEXES: {
+            "type": "array", "items": {"type": "string", "minLength": 1},
+            "description": "Extract timestamps only for matching topics. Default: all topics",
+        },
+        MqttConfKey.TIMESTAMP_MAX_FUTURE_SECONDS: {
+            "type": "integer", "minimum": 0,
+            "description": "Timestamps further in the future are ignored (arrival time is used). Default: 300",
+        },
+        MqttConfKey.TIMESTAMP_MAX_PAST_SECONDS: {
+            "type": "integer", "minimum": 0,
+            "description": "Older timestamps (e.g. unsynchronized device clocks: 1970) are ignored (arrival time is used); "
+                           "e.g. the clean up window. Default: not set (no limit)",
+        },
+
         MqttConfKey.TEST_SUBSCRIPTION_BASE: {
             "type": "string",
             "minLength": 1,
@@ -94,18 +181,27 @@ class MqttClient:
     DEFAULT_PORT_SSL = 8883
     DEFAULT_PROTOCOL = 4  # 5==MQTTv5, default: 4==MQTTv311, 3==MQTTv31
     DEFAULT_QUALITY = 1
+    DEFAULT_RECONNECT_DELAY_MIN_SECONDS = 1
+    DEFAULT_RECONNECT_DELAY_MAX_SECONDS = 60
+    DEFAULT_SESSION_EXPIRY_SECONDS = 3600
+
+    # CONNACK return codes (v3) / reason codes (v5) which won't heal by reconnecting (configuration errors)
+    FATAL_CONNECT_CODES = {1, 2, 4, 5, 0x84, 0x85, 0x86, 0x87, 0x8C}
 
     def __init__(self, config):
 
         self._host = None
         self._port = None
         self._keepalive = None
+        self._protocol = None
 
         self._client = None
         self._is_connected = False
         self._connection_error_info: Optional[str] = None
         self._subscribed = False
         self._shutdown = False
+        self._session_present = False
+        self._disconnected_logged = False
 
         self._lock = threading.Lock()
 
@@ -114,6 +210,7 @@ class MqttClient:
         self._keepalive = config.get(MqttConfKey.KEEPALIVE, self.DEFAULT_KEEPALIVE)
 
         protocol = config.get(MqttConfKey.PROTOCOL, self.DEFAULT_PROTOCOL)
+        self._protocol = protocol
         client_id = config.get(MqttConfKey.CLIENT_ID)
         ssl_ca_certs = config.get(MqttConfKey.SSL_CA_CERTS)
         ssl_certfile = config.get(MqttConfKey.SSL_CERTFILE)
@@ -130,7 +227,17 @@ class MqttClient:
         if not self._host or not subscriptions:
             raise ValueError("mandatory mqtt configuration not found ({}, {})'!".format(MqttConfKey.HOST, MqttConfKey.SUBSCRIPTIONS))
 
-        self._client = mqtt.Client(client_id=client_id, protocol=protocol)
+        # resilient mode: paho's network loop reconnects with exponential backoff
+        self._reconnect = config.get(MqttConfKey.RECONNECT, False)
+        self._clean_session = config.get(MqttConfKey.CLEAN_SESSION, not (self._reconnect and client_id))
+        self._session_expiry_seconds = config.get(MqttConfKey.SESSION_EXPIRY_SECONDS, self.DEFAULT_SESSION_EXPIRY_SECONDS)
+        if not self._clean_session and not client_id:
+            raise ValueError("a persistent session ({}: false) needs a '{}'!".format(MqttConfKey.CLEAN_SESSION, MqttConfKey.CLIENT_ID))
+
+        if protocol == mqtt.MQTTv5:
+            self._client = mqtt.Client(client_id=client_id, protocol=protocol)  # v5: "clean start" is a connect parameter
+        else:
+            self._client = mqtt.Client(client_id=client_id, clean_session=self._clean_session, protocol=protocol)
 
         if is_ssl:
             self._client.tls_set(ca_certs=ssl_ca_certs, certfile=ssl_certfile, keyfile=ssl_keyfile)
@@ -146,7 +253,10 @@ class MqttClient:
         self._client.on_message = self._on_message
         self._client.on_publish = self._on_publish
 
-        self._client.reconnect_delay_set()
+        self._client.reconnect_delay_set(
+            min_delay=config.get(MqttConfKey.RECONNECT_DELAY_MIN_SECONDS, self.DEFAULT_RECONNECT_DELAY_MIN_SECONDS),
+            max_delay=config.get(MqttConfKey.RECONNECT_DELAY_MAX_SECONDS, self.DEFAULT_RECONNECT_DELAY_MAX_SECONDS),
+        )
 
     @property
     def is_connected(self):
@@ -154,7 +264,15 @@ class MqttClient:
             return self._is_connected
 
     def connect(self):
-        self._client.connect_async(self._host, port=self._port, keepalive=self._keepalive)
+        if self.is_mqtt_v5:
+            properties = Properties(PacketTypes.CONNECT)
+            if not self._clean_session:
+                properties.SessionExpiryInterval = self._session_expiry_seconds
+            self._client.connect_async(
+                self._host, port=self._port, keepalive=self._keepalive, clean_start=self._clean_session, properties=properties
+            )
+        else:
+            self._client.connect_async(self._host, port=self._port, keepalive=self._keepalive)
         self._client.loop_start()
         _logger.debug("%s is connecting...", self.__class__.__name__)
 
@@ -171,6 +289,7 @@ class MqttClient:
         """
         Check for rarely unexpected disconnects, but when happens, it's not clear how to heal. At least the loop has to be restarted.
         Best to restart the whole app. Recognise a stopped service in system log.
+        Resilient mode (`reconnect`): paho reconnects in background, only configuration errors lead to an exit.
         """
         with self._lock:
             is_connected = self._is_connected
@@ -178,27 +297,50 @@ class MqttClient:
 
         if connection_error_info:
             raise MqttException(connection_error_info)  # leads to exit => restarted by systemd
-        if not is_connected:
+        if not is_connected and not self._reconnect:
             raise MqttException("MQTT is not connected!")
 
-    def _on_connect(self, _mqtt_client, _userdata, _flags, rc):
-        """MQTT callback is called when client connects to MQTT server."""
+    @property
+    def is_mqtt_v5(self) -> bool:
+        return self._protocol == mqtt.MQTTv5
+
+    def _on_connect(self, _mqtt_client, _userdata, flags, rc, _properties=None):
+        """MQTT callback is called when client connects to MQTT server (MQTT v5: `rc` are `ReasonCodes` + properties)."""
         class_name = self.__class__.__name__
+        rc = getattr(rc, "value", rc)
         if rc == 0:
             with self._lock:
                 self._is_connected = True
-            _logger.debug("%s was connected.", class_name)
+                # persistent session: the broker kept subscriptions and queued messages
+                self._session_present = bool(flags.get("session present")) if flags else False
+                was_disconnected = self._disconnected_logged
+                self._disconnected_logged = False
+            if was_disconnected:
+                _logger.info("%s was reconnected (session present: %s).", class_name, self._session_present)
+            else:
+                _logger.debug("%s was connected.", class_name)
         else:
             connection_error_info = f"{class_name} connection failed (#{rc}: {mqtt.error_string(rc)})!"
             _logger.error(connection_error_info)
             with self._lock:
                 self._is_connected = False
-                self._connection_error_info = connection_error_info
+                if not self._reconnect or rc in self.FATAL_CONNECT_CODES:
+                    self._connection_error_info = connection_error_info
 
-    def _on_disconnect(self, _mqtt_client, _userdata, rc):
+    def _on_disconnect(self, _mqtt_client, _userdata, rc, _properties=None):
         """MQTT callback for when the client disconnects from the MQTT server."""
         class_name = self.__class__.__name__
+        rc = getattr(rc, "value", rc)
         connection_error_info = None
+        if rc != 0 and not self._shutdown and self._reconnect:
+            with self._lock:
+                self._is_connected = False
+                log_disconnect = not self._disconnected_logged  # paho calls it on each failed reconnect too
+                self._disconnected_logged = True
+            if log_disconnect:
+                _logger.warning("%s connection was lost (#%s: %s) => reconnecting...", class_name, rc, mqtt.error_string(rc))
+            return
+
         if rc != 0:
             connection_error_info = f"{class_name} connection was lost (#{rc}: {mqtt.error_string(rc)}) => abort => restart!"
 
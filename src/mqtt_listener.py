@@ -1,24 +1,34 @@
 import logging
-import re
-from typing import List, Set
+from typing import Dict, List, Optional, Set, Tuple
 
 import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
 
+from src.dedup_window import DedupWindow
 from src.lifecycle_control import LifecycleControl, StatusNotification
+from src.memory_budget import MemoryBudget
 from src.message import Message
+from src.metrics import Metrics
 from src.mqtt_client import MqttConfKey, MqttClient, MqttException
+from src.rate_limiter import RateLimiter
+from src.timestamp_extractor import TimestampExtractor
+from src.topic_filter import TopicFilter
 
 _logger = logging.getLogger(__name__)
 
 
 class MqttListener(MqttClient):
 
-    def __init__(self, config):
+    def __init__(self, config, memory_budget: Optional[MemoryBudget] = None):
         super().__init__(config)
 
         self._subscriptions = set()
-        self._skip_subscription_regexes = []
         self._messages: List[Message] = []
+        self._messages_bytes = 0
+
+        self._memory_budget = memory_budget  # shared with `ProxyStore` (see `Runner`); None: no accounting
+        self._broker_id = config.get(MqttConfKey.BROKER_ID)
 
         self._status_received_message_count = 0
         self._status_skipped_message_count = 0
@@ -27,16 +37,32 @@ class MqttListener(MqttClient):
         # MQTT V3 Protocol Specification: Do not use Message ID 0. It is reserved as an invalid Message ID.
         self._filter_message_id_0 = config.get(MqttConfKey.FILTER_MESSAGE_ID_0, False)
 
-        skip_subscription_regexes = self.list_to_set(config.get(MqttConfKey.SKIP_SUBSCRIPTION_REGEXES))
-        for skip_subscription_regex in skip_subscription_regexes:
-            if skip_subscription_regex:
-                self._skip_subscription_regexes.append(re.compile(skip_subscription_regex))
+        self._topic_filter = TopicFilter(config.get(MqttConfKey.SKIP_SUBSCRIPTION_REGEXES))
+
+        dedup_window_seconds = config.get(MqttConfKey.DEDUP_WINDOW_SECONDS, 0)
+        self._dedup_window = DedupWindow(
+            dedup_window_seconds, config.get(MqttConfKey.DEDUP_WINDOW_SIZE, DedupWindow.DEFAULT_MAX_SIZE)
+        ) if dedup_window_seconds else None
+
+        rate_limiter = RateLimiter(config.get(MqttConfKey.RATE_LIMITS))
+        self._rate_limiter = rate_limiter if rate_limiter else None
+
+        timestamp_extractor = TimestampExtractor(config)
+        self._timestamp_extractor = timestamp_extractor if timestamp_extractor else None
 
         subscriptions = config.get(MqttConfKey.SUBSCRIPTIONS)
         self._subscriptions = self.list_to_set(subscriptions)
         if not self._subscriptions:
             self._subscribed = True
 
+        # MQTT v5: the broker tells which subscription(s) a message matched => per subscription prepared filters
+        self._subscription_ids_enabled = config.get(MqttConfKey.SUBSCRIPTION_IDENTIFIERS, True)
+        self._subscription_ids_available = True  # CONNACK property
+        self._subscription_ids: Dict[str, int] = {}
+        self._subscription_filters: Dict[int, TopicFilter] = {}
+        self._subscription_ids, self._subscription_filters = \
+            self._create_subscription_filters(self._topic_filter, self._subscriptions)
+
     @property
     def is_connected(self):
         with self._lock:
@@ -45,7 +71,7 @@ class MqttListener(MqttClient):
     def connect(self):
         super().connect()
 
-        time_step = 0.05
+        time_step = 0.01  # subscribe soon after the CONNACK (time to first message)
         time_counter = 0
 
         try:
@@ -60,18 +86,86 @@ class MqttListener(MqttClient):
             self._subscribed = False
             raise
 
+    def reload(self, config):
+        """
+        Applies changed `subscriptions` and `skip_subscription_regexes` without reconnect: new topics are subscribed before
+        removed ones get unsubscribed, so there is no gap. Messages already received are kept.
+        """
+        subscriptions = self.list_to_set(config.get(MqttConfKey.SUBSCRIPTIONS))
+
+        # all filters are created first and swapped together: `_accept_topic` uses either the old or the new ones
+        topic_filter = TopicFilter(config.get(MqttConfKey.SKIP_SUBSCRIPTION_REGEXES))
+        subscription_ids, subscription_filters = self._create_subscription_filters(topic_filter, subscriptions)
+
+        with self._lock:
+            added = sorted(subscriptions - self._subscriptions)
+            removed = sorted(self._subscriptions - subscriptions)
+            self._subscriptions = subscriptions
+            self._topic_filter = topic_filter
+            self._subscription_ids = subscription_ids
+            self._subscription_filters = subscription_filters
+            subscribed = self._subscribed and self._is_connected
+
+        # not subscribed yet (not connected): `_try_to_subscribe` uses the new subscriptions
+        if not subscribed:
+            with self._lock:
+                self._subscribed = not subscriptions  # also a persistent session needs the new subscriptions
+        else:
+            if added:
+                self._subscribe(added)
+            if removed:
+                result, _ = self._client.unsubscribe(removed)
+                self._check_result(result, "could not unsubscribe MQTT topics", removed)
+
+        _logger.info("reloaded MQTT subscriptions (added: %s; removed: %s)", added, removed)
+
+    def _create_subscription_filters(self, topic_filter: TopicFilter, subscriptions: Set[str]) \
+            -> Tuple[Dict[str, int], Dict[int, TopicFilter]]:
+        """
+        MQTT v5: each subscription gets an identifier and a filter with only the regexes which may match its topics.
+        Existing identifiers are kept.
+        """
+        subscription_ids = {s: i for s, i in self._subscription_ids.items() if s in subscriptions}
+        next_id = max(self._subscription_ids.values(), default=0) + 1
+        for subscription in sorted(subscriptions):
+            if subscription not in subscription_ids:
+                subscription_ids[subscription] = next_id
+                next_id += 1
+
+        # unknown ids (e.g. in-flight messages of removed subscriptions) fall back to `self._topic_filter`
+        subscription_filters = {i: topic_filter.restrict(s) for s, i in subscription_ids.items()}
+        return subscription_ids, subscription_filters
+
+    @property
+    def _use_subscription_ids(self) -> bool:
+        return self._subscription_ids_enabled and self._subscription_ids_available and self.is_mqtt_v5
+
+    def _subscribe(self, topics: List[str]):
+        subs_qos = 1  # qos for subscriptions, not used, but necessary
+
+        if self._use_subscription_ids:
+            for topic in topics:  # the identifier is a property of the whole SUBSCRIBE packet
+                properties = Properties(PacketTypes.SUBSCRIBE)
+                properties.SubscriptionIdentifier = self._subscription_ids[topic]
+                result, _ = self._client.subscribe(topic, subs_qos, properties=properties)
+                self._check_result(result, "could not subscribe to MQTT topics", [topic])
+        else:
+            result, _ = self._client.subscribe([(s, subs_qos) for s in topics])
+            self._check_result(result, "could not subscribe to MQTT topics", topics)
+
+    @classmethod
+    def _check_result(cls, result, error_text, topics: List[str]):
+        if result != mqtt.MQTT_ERR_SUCCESS:
+            error_info = "{} (#{})".format(mqtt.error_string(result), result)
+            raise MqttException(f"{error_text}: {error_info}; topics: {topics}")
+
     def _try_to_subscribe(self) -> bool:
         """wait for getting mqtt connect callback called"""
         if not self._subscribed and self._is_connected:
             with self._lock:
-                channels = [c for c in self._subscriptions]
+                channels = sorted(self._subscriptions)
             if channels:
-                subs_qos = 1  # qos for subscriptions, not used, but necessary
-                subscriptions = [(s, subs_qos) for s in channels]
-                result, dummy = self._client.subscribe(subscriptions)
-                if result != mqtt.MQTT_ERR_SUCCESS:
-                    error_info = "{} (#{})".format(mqtt.error_string(result), result)
-                    raise MqttException(f"could not subscribe to MQTT topics): {error_info}; topics: {channels}")
+                self._subscribe(channels)
 
                 self._subscribed = True
                 LifecycleControl.notify(StatusNotification.MQTT_LISTENER_SUBSCRIBED)
@@ -87,14 +181,48 @@ class MqttListener(MqttClient):
                 items_set.add(item)
         return items_set
 
+    def get_status(self) -> Dict:
+        with self._lock:
+            queue_depth = len(self._messages)
+            queue_bytes = self._messages_bytes
+        return {
+            "broker_id": self._broker_id,
+            "host": "{}:{}".format(self._host, self._port),
+            "connected": self.is_connected,
+            "queue_depth": queue_depth,
+            "queue_bytes": queue_bytes,
+        }
+
     def get_messages(self) -> List[Message]:
         with self._lock:
             messages = self._messages
+            messages_bytes = self._messages_bytes
             self._messages = []
+            self._messages_bytes = 0
+        if self._memory_budget is not None:
+            self._memory_budget.release(messages_bytes)  # the receiver (`ProxyStore.queue`) accounts for them again
+        if self._rate_limiter is not None:
+            messages.extend(self._rate_limiter.pop_pending())  # mode "aggregate"
         return messages
 
-    def _on_connect(self, mqtt_client, userdata, flags, rc):
-        super()._on_connect(mqtt_client, userdata, flags, rc)
+    def ensure_connection(self):
+        super().ensure_connection()
+
+        if self._reconnect:
+            self._try_to_subscribe()  # after a reconnect without session
+
+    def _on_connect(self, mqtt_client, userdata, flags, rc, properties=None):
+        super()._on_connect(mqtt_client, userdata, flags, rc, properties)
+
+        if getattr(rc, "value", rc) == 0 and not self._session_present:
+            with self._lock:
+                if self._subscriptions:
+                    self._subscribed = False  # subscriptions got lost with the session => `_try_to_subscribe`
+
+        if properties is not None:
+            self._subscription_ids_available = bool(getattr(properties, "SubscriptionIdentifierAvailable", 1))
+            if not self._subscription_ids_available and self._subscription_ids_enabled:
+                _logger.info("MQTT broker doesn't support subscription identifiers.")
 
         if rc == 0:
             LifecycleControl.notify(StatusNotification.MQTT_LISTENER_CONNECTED)
@@ -104,17 +232,38 @@ class MqttListener(MqttClient):
         try:
             if mqtt_message is not None:
                 message = Message.create(mqtt_message)
-                message.time = self._now()
+                message.broker_id = self._broker_id
+                properties = getattr(mqtt_message, "properties", None)  # MQTT v5 only
+
+                time = None
+                if self._timestamp_extractor is not None:
+                    time = self._timestamp_extractor.extract(message, properties)
+                message.time = time or self._now()  # arrival time
                 _logger.debug("message received: %s", message)
 
-                accept_message = self._accept_topic(message.topic)
+                subscription_ids = getattr(properties, "SubscriptionIdentifier", None) if properties is not None else None
+                accept_message = self._accept_topic(message.topic, subscription_ids)
+                if accept_message and message.message_id <= 0 and self._filter_message_id_0:
+                    accept_message = False
+                if accept_message and self._dedup_window is not None and self._dedup_window.contains(message):
+                    accept_message = False
+                    Metrics.inc("mqtt.duplicates")
+                if accept_message and self._rate_limiter is not None:
+                    accept_message = self._rate_limiter.accept(message)
+
+                message_size = 0
+                if accept_message and self._memory_budget is not None:
+                    # not within `self._lock`: overflow sheds from the `ProxyStore` queue
+                    message_size = MemoryBudget.message_size(message)
+                    accept_message = self._memory_budget.acquire(message_size, message=message)
+
+                if accept_message and self._dedup_window is not None:
+                    self._dedup_window.add(message)  # not before: the redelivery of a dropped message is no duplicate
 
                 with self._lock:
-                    if accept_message:
-                        if message.message_id <= 0 and self._filter_message_id_0:
-                            accept_message = False
                     if accept_message:
                         self._messages.append(message)
+                        self._messages_bytes += message_size
 
                     self._status_received_message_count += 1
                     self._status_skipped_message_count += 0 if accept_message else 1
@@ -134,13 +283,11 @@ class MqttListener(MqttClient):
         except Exception as ex:
             _logger.exception(ex)
 
-    def _accept_topic(self, topic) -> bool:
-        accept = True
-        # `self._skip_subscription_regexes` only used within threaded context, so no use of `self._lock`!
-        for regex in self._skip_subscription_regexes:
-            if regex.match(topic):
-                accept = False
-                _logger.debug('skipped topic: "%s"', topic)
-                break
-
-        return accept
+    def _accept_topic(self, topic, subscription_ids: Optional[List[int]] = None) -> bool:
+        with self._lock:  # consistent filters (see `reload`)
+            topic_filter = self._topic_filter
+            subscription_filters = self._subscription_filters
+        if subscription_ids and self._use_subscription_ids:
+            # any matched subscription will do: its filter contains all regexes which may match the topic
+            topic_filter = subscription_filters.get(subscription_ids[0], topic_filter)
+        return topic_filter.accept(topic)
@@ -1,20 +1,30 @@
 #!/usr/bin/env python3
+import datetime
+import json
 import logging
 import sys
-from typing import Optional
 
 import click
+from tzlocal import get_localzone
 
-from src.app_config import AppConfig
+from src.app_config import AppConfig, ControlConfKey
 from src.app_logging import AppLogging, LOGGING_CHOICES
-from src.runner import Runner
-from src.schema_creator import SchemaCreator
+from src.app_profiling import AppProfiling
 
 
 _logger = logging.getLogger(__name__)
 
 
-@click.command()
+# the commands import their modules on demand (startup time), so their defaults are repeated here (see `TestCommandLine`)
+IMPORT_DEFAULT_WORKERS = 4  # `MessageImporter.DEFAULT_WORKERS`
+IMPORT_DEFAULT_BATCH_SIZE = 10000  # `MessageImporter.DEFAULT_BATCH_SIZE`
+EXPORT_FORMAT_CHOICES = ["csv", "parquet"]  # `ExportFormat.CHOICES`
+EXPORT_DEFAULT_ROW_GROUP_SIZE = 100000  # `MessageExporter.DEFAULT_ROW_GROUP_SIZE`
+MIGRATE_DEFAULT_CHUNK_SIZE = 50000  # `JournalMigrator.DEFAULT_CHUNK_SIZE`
+MIGRATE_DEFAULT_MONTHS_AHEAD = 12  # `JournalMigrator.DEFAULT_MONTHS_AHEAD`
+
+
+@click.group(invoke_without_command=True)
 @click.option(
     "--config-file",
     default="/etc/mqtt-pg-logger.yaml",
@@ -46,9 +56,121 @@ _logger = logging.getLogger(__name__)
     is_flag=True,
     help="Systemd/journald integration: skip timestamp + prints to console"
 )
-def _main(config_file, create, log_file, log_level, print_logs, systemd_mode):
+@click.pass_context
+def _main(ctx, config_file, create, log_file, log_level, print_logs, systemd_mode):
+    """Logs MQTT messages to a Postgres database (runs as service if no command is given)."""
+    if ctx.invoked_subcommand is not None:
+        # options are shared with the commands; commands always print their progress
+        ctx.obj = {"config_file": config_file, "log_file": log_file, "log_level": log_level, "print_logs": True, "systemd_mode": False}
+        return
+
+    _run_and_exit(run_service, config_file, create, log_file, log_level, print_logs, systemd_mode)
+
+
+@_main.command(name="import")
+@click.argument("files", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--workers",
+    default=IMPORT_DEFAULT_WORKERS,
+    help="Parallel database connections",
+    show_default=True,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--batch-size",
+    default=IMPORT_DEFAULT_BATCH_SIZE,
+    help="Rows per COPY batch",
+    show_default=True,
+    type=click.IntRange(min=1),
+)
+@click.pass_obj
+def _import(options, files, workers, batch_size):
+    """Imports captured messages (JSON lines or CSV, optionally gzipped)."""
+    _run_and_exit(import_messages, files=files, workers=workers, batch_size=batch_size, **options)
+
+
+DATETIME_FORMATS = ["%Y-%m-%d", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S"]
+
+
+@_main.command(name="export")
+@click.argument("output", type=click.Path(dir_okay=False))
+@click.option(
+    "--from", "time_from",
+    required=True,
+    help="Start time (inclusive, local time)",
+    type=click.DateTime(DATETIME_FORMATS),
+)
+@click.option(
+    "--to", "time_to",
+    help="End time (exclusive, local time)  [default: now]",
+    type=click.DateTime(DATETIME_FORMATS),
+)
+@click.option(
+    "--topic", "topics",
+    multiple=True,
+    help="MQTT topic filter (wildcards \"+\" and \"#\" supported); can be repeated  [default: all]",
+)
+@click.option(
+    "--format", "export_format",
+    help="Output format  [default: derived from file extension; \"*.parquet\" or CSV (gzipped if \"*.gz\")]",
+    type=click.Choice(EXPORT_FORMAT_CHOICES, case_sensitive=False),
+)
+@click.option(
+    "--workers",
+    default=1,
+    help="Parallel exports of time slices into separate files (\"<name>.partNNN.<ext>\")",
+    show_default=True,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--row-group-size",
+    default=EXPORT_DEFAULT_ROW_GROUP_SIZE,
+    help="Rows per Parquet row group (and per server side cursor fetch)",
+    show_default=True,
+    type=click.IntRange(min=1),
+)
+@click.pass_obj
+def _export(options, output, time_from, time_to, topics, export_format, workers, row_group_size):
+    """Exports a time range of the journal (CSV or Parquet)."""
+    _run_and_exit(
+        export_messages, output=output, time_from=time_from, time_to=time_to, topics=list(topics), export_format=export_format,
+        workers=workers, row_group_size=row_group_size, **options
+    )
+
+
+@_main.command(name="migrate")
+@click.option(
+    "--chunk-size",
+    default=MIGRATE_DEFAULT_CHUNK_SIZE,
+    help="Rows per copied chunk (one transaction with checkpoint)",
+    show_default=True,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--months-ahead",
+    default=MIGRATE_DEFAULT_MONTHS_AHEAD,
+    help="Create monthly partitions until <n> months ahead",
+    show_default=True,
+    type=click.IntRange(min=0),
+)
+@click.pass_obj
+def _migrate(options, chunk_size, months_ahead):
+    """Migrates the journal online into a time partitioned table (resumes after interruption)."""
+    _run_and_exit(migrate_journal, chunk_size=chunk_size, months_ahead=months_ahead, **options)
+
+
+@_main.command(name="control")
+@click.argument("command", nargs=-1, required=True)
+@click.pass_obj
+def _control(options, command):
+    """Sends a command to the running service (config 'control.socket_path'): status, flush, clean_up,
+    set batch_size <n>, set wait_max_seconds <s>"""
+    _run_and_exit(control_service, command_line=" ".join(command), **options)
+
+
+def _run_and_exit(func, *args, **kwargs):
     try:
-        run_service(config_file, create, log_file, log_level, print_logs, systemd_mode)
+        func(*args, **kwargs)
 
     except KeyboardInterrupt:
         pass  # exits 0 by default
@@ -58,26 +180,35 @@ def _main(config_file, create, log_file, log_level, print_logs, systemd_mode):
         sys.exit(1)  # a simple return is not understood by click
 
 
+def configure_app(config_file, log_file, log_level, print_logs, systemd_mode) -> AppConfig:
+    app_config = AppConfig(config_file)
+    AppLogging.configure(
+        app_config.get_logging_config(),
+        log_file, log_level, print_logs, systemd_mode
+    )
+    AppProfiling.configure(app_config.get_profiling_config())
+    return app_config
+
+
 def run_service(config_file, create, log_file, log_level, print_logs, systemd_mode):
     """Logs MQTT messages to a Postgres database."""
 
-    creator: Optional[SchemaCreator] = None
-    runner: Optional[Runner] = None
+    creator = None
+    runner = None
 
     try:
-        app_config = AppConfig(config_file)
-        AppLogging.configure(
-            app_config.get_logging_config(),
-            log_file, log_level, print_logs, systemd_mode
-        )
+        app_config = configure_app(config_file, log_file, log_level, print_logs, systemd_mode)
 
         _logger.debug("start")
 
+        # imported on demand, each path loads only what it needs (startup time)
         if create:
+            from src.schema_creator import SchemaCreator
             creator = SchemaCreator(app_config.get_database_config())
             creator.connect()
             creator.create_schema()
         else:
+            from src.runner import Runner
             runner = Runner(app_config)
             runner.loop()
 
@@ -90,5 +221,55 @@ def run_service(config_file, create, log_file, log_level, print_logs, systemd_mo
             runner.close()
 
 
+def import_messages(config_file, log_file, log_level, print_logs, systemd_mode, files, workers, batch_size):
+    """Imports messages from files (bypasses the MQTT broker)."""
+    from src.message_importer import MessageImporter
+
+    app_config = configure_app(config_file, log_file, log_level, print_logs, systemd_mode)
+
+    importer = MessageImporter(app_config.get_database_config(), app_config.get_mqtt_config(), workers, batch_size)
+    importer.import_files(files)
+
+
+def export_messages(config_file, log_file, log_level, print_logs, systemd_mode, output, time_from, time_to, topics, export_format,
+                    workers, row_group_size):
+    """Exports messages into files."""
+    from src.message_exporter import MessageExporter
+
+    app_config = configure_app(config_file, log_file, log_level, print_logs, systemd_mode)
+
+    time_from = time_from.replace(tzinfo=get_localzone())
+    time_to = time_to.replace(tzinfo=get_localzone()) if time_to else datetime.datetime.now(tz=get_localzone())
+
+    MessageExporter.export_parallel(
+        app_config.get_database_config(), output, time_from, time_to, topics, export_format, workers, row_group_size
+    )
+
+
+def migrate_journal(config_file, log_file, log_level, print_logs, systemd_mode, chunk_size, months_ahead):
+    """Migrates the journal table into a partitioned one, while the service keeps running."""
+    from src.journal_migrator import JournalMigrator
+
+    app_config = configure_app(config_file, log_file, log_level, print_logs, systemd_mode)
+
+    with JournalMigrator(app_config.get_database_config()) as migrator:
+        migrator.migrate(chunk_size, months_ahead)
+
+
+def control_service(config_file, log_file, log_level, print_logs, systemd_mode, command_line):
+    """Prints the JSON response of the control socket; exits with 1 on errors."""
+    from src.control_server import ControlServer
+
+    app_config = AppConfig(config_file)  # no logging setup: the output is JSON only
+    socket_path = app_config.get_control_config().get(ControlConfKey.SOCKET_PATH)
+    if not socket_path:
+        raise ValueError("no control socket configured (control.socket_path)!")
+
+    response = ControlServer.send(socket_path, command_line)
+    click.echo(json.dumps(response, indent=2))
+    if "error" in response:
+        sys.exit(1)
+
+
 if __name__ == '__main__':
     _main()  # exit codes must be handled by click!
@@ -0,0 +1,145 @@
+import math
+from collections import deque
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from src.database import DatabaseConfKey, PriorityClassConfKey
+from src.memory_budget import MemoryBudget
+from src.message import Message
+from src.metrics import Metrics
+from src.topic_rules import TopicRules
+
+
+class PriorityClass:
+
+    def __init__(self, name: str, weight: int):
+        self.name = name
+        self.weight = weight
+        self.messages: Deque[Message] = deque()
+
+
+class PriorityQueues:
+    """
+    Queue of `ProxyStore` with one FIFO per priority class. A batch is filled by weight from the non-empty classes (so
+    lower classes are not starved) and topped up in priority order. Overflow sheds the oldest messages of the lowest
+    non-empty class first. Without configured classes it is a single FIFO.
+
+    Not thread-safe: guarded by the lock of `ProxyStore`.
+    """
+
+    DEFAULT_CLASS_NAME = "default"
+
+    def __init__(self, config):
+        self._classes: List[PriorityClass] = []
+        rules: List[Tuple[str, int]] = []
+        default_index = None
+
+        for class_config in config.get(DatabaseConfKey.PRIORITY_CLASSES) or []:
+            index = len(self._classes)
+            self._classes.append(PriorityClass(
+                class_config[PriorityClassConfKey.NAME], class_config.get(PriorityClassConfKey.WEIGHT, 1)
+            ))
+            topic_regexes = class_config.get(PriorityClassConfKey.TOPIC_REGEXES)
+            if topic_regexes is None:
+                if default_index is None:
+                    default_index = index
+            else:
+                rules.extend((regex, index) for regex in topic_regexes)
+
+        if default_index is None:
+            default_index = len(self._classes)
+            self._classes.append(PriorityClass(self.DEFAULT_CLASS_NAME, 1))
+
+        self._class_indexes = TopicRules(rules, default=default_index)
+
+    @property
+    def has_classes(self) -> bool:
+        return len(self._classes) > 1
+
+    def __len__(self):
+        return sum(len(c.messages) for c in self._classes)
+
+    def __iter__(self) -> Iterator[Message]:
+        for priority_class in self._classes:
+            yield from priority_class.messages
+
+    def class_index(self, message: Message) -> int:
+        """0: highest priority"""
+        return self._class_indexes.get(message.topic)
+
+    def append(self, message: Message):
+        self._classes[self.class_index(message)].messages.append(message)
+
+    def put_back(self, messages: List[Message]):
+        """Returns a taken batch (failed store) to the front of their queues."""
+        for message in reversed(messages):
+            self._classes[self.class_index(message)].messages.appendleft(message)
+
+    def pop_batch(self, batch_size: int) -> List[Message]:
+        """Weighted share per non-empty class, the rest in priority order; high priority messages come first."""
+        if len(self._classes) == 1:
+            return self._pop(self._classes[0].messages, batch_size)
+
+        active_classes = [c for c in self._classes if c.messages]
+        weight_sum = sum(c.weight for c in active_classes)
+        batches = [self._pop(c.messages, math.ceil(batch_size * c.weight / weight_sum)) for c in active_classes]
+
+        free_count = batch_size - sum(len(b) for b in batches)
+        if free_count < 0:  # rounded up shares: give back at the low end
+            for priority_class, batch in zip(reversed(active_classes), reversed(batches)):
+                give_back = min(-free_count, len(batch))
+                if give_back:
+                    priority_class.messages.extendleft(reversed(batch[-give_back:]))
+                    del batch[-give_back:]
+                    free_count += give_back
+                if free_count == 0:
+                    break
+
+        for priority_class, batch in zip(active_classes, batches):
+            if free_count <= 0:
+                break
+            top_up = self._pop(priority_class.messages, free_count)
+            batch.extend(top_up)
+            free_count -= len(top_up)
+
+        return [m for batch in batches for m in batch]
+
+    @classmethod
+    def _pop(cls, messages: Deque[Message], count: int) -> List[Message]:
+        batch = []
+        while len(batch) < count:
+            try:
+                batch.append(messages.popleft())
+            except IndexError:
+                break
+        return batch
+
+    def pop_all(self) -> List[Message]:
+        messages = list(self)
+        for priority_class in self._classes:
+            priority_class.messages.clear()
+        return messages
+
+    def shed(self, bytes_needed: int, below_index: Optional[int] = None) -> Tuple[int, int]:
+        """
+        Drops the oldest messages of the lowest classes until `bytes_needed` are released; `below_index`: only classes
+        of lower priority. Returns the released bytes and the number of dropped messages.
+        """
+        released_bytes = 0
+        dropped_count = 0
+        lowest_index = len(self._classes) - 1
+        stop_index = -1 if below_index is None else below_index
+        for index in range(lowest_index, stop_index, -1):
+            messages = self._classes[index].messages
+            class_dropped_count = 0
+            while released_bytes < bytes_needed and messages:
+                released_bytes += MemoryBudget.message_size(messages.popleft())
+                class_dropped_count += 1
+            if class_dropped_count:
+                dropped_count += class_dropped_count
+                Metrics.inc("store.shed_messages." + self._classes[index].name, class_dropped_count)
+            if released_bytes >= bytes_needed:
+                break
+        return released_bytes, dropped_count
+
+    def depths(self) -> Dict[str, int]:
+        return {c.name: len(c.messages) for c in self._classes}
@@ -2,14 +2,18 @@ import datetime
 import logging
 import threading
 import time
-from collections import deque
-from typing import List
+from typing import Dict, List, Optional
 
 from tzlocal import get_localzone
 
+from src.batch_controller import BatchController
 from src.database import DatabaseConfKey
+from src.memory_budget import MemoryBudget
 from src.message import Message
-from src.message_store import MessageStore
+from src.message_spool import MessageSpool
+from src.message_store import MessageStore, PartialStoreException
+from src.metrics import Metrics
+from src.priority_queues import PriorityQueues
 
 
 _logger = logging.getLogger(__name__)
@@ -18,34 +22,97 @@ _logger = logging.getLogger(__name__)
 class ProxyStore(threading.Thread):
     """An async proxy to MessageStore which handles batches, queuing"""
 
-    RECONNECT_AFTER_SECONDS = 3600
+    DEFAULT_CONNECTION_ROTATION_SECONDS = 3600
 
     DEFAULT_BATCH_SIZE = 100
+    DEFAULT_BATCH_SIZE_MIN = 10
+    DEFAULT_BATCH_SIZE_MAX = 10000
     DEFAULT_WAIT_MAX_SECONDS = 10
+    DEFAULT_TARGET_STORE_SECONDS = 1.0
+    DEFAULT_SHUTDOWN_DRAIN_SECONDS = 10
 
-    QUEUE_LIMIT = 50000
+    QUEUE_LIMIT = 50000  # message count limit, only without memory budget (`memory_budget_mb: 0`)
     WAIT_AFTER_ERROR_SECONDS = 20
     FORCE_CLEAN_UP_AFTER_SECONDS = 3000
     LAZY_CLEAN_UP_AFTER_SECONDS = 300
 
-    def __init__(self, config):
-        threading.Thread.__init__(self)
+    def __init__(self, config, memory_budget: Optional[MemoryBudget] = None):
+        threading.Thread.__init__(self, name=self.__class__.__name__)  # thread name shows up in profiling results
 
         # runtime properties
         self._message_store = MessageStore(config)
         self._closing = False
         self._lock = threading.Lock()
-        self._messages = deque()
+        self._messages = PriorityQueues(config)
         self._write_immediately = False
+        self._clean_up_requested = False
+        self._last_store_seconds: Optional[float] = None  # COPY + commit of the last batch
+        self._first_store = True  # don't wait for a full batch after start (time to first stored message)
 
         self._last_error_text = None
 
+        # make-before-break connection rotation: the standby connection is created in background
+        self._rotation_seconds = config.get(DatabaseConfKey.CONNECTION_ROTATION_SECONDS, self.DEFAULT_CONNECTION_ROTATION_SECONDS)
+        self._rotation_thread: Optional[threading.Thread] = None
+        self._standby_connection = None
+
         # configuration
-        self._batch_size = min(config.get(DatabaseConfKey.BATCH_SIZE, self.DEFAULT_BATCH_SIZE), 10000)
-        self._wait_max_seconds = min(config.get(DatabaseConfKey.WAIT_MAX_SECONDS, self.DEFAULT_WAIT_MAX_SECONDS), 60)
+        batch_size_max = config.get(DatabaseConfKey.BATCH_SIZE_MAX, self.DEFAULT_BATCH_SIZE_MAX)
+        self._batch_controller = BatchController(
+            batch_size=min(config.get(DatabaseConfKey.BATCH_SIZE, self.DEFAULT_BATCH_SIZE), batch_size_max),
+            wait_max_seconds=config.get(DatabaseConfKey.WAIT_MAX_SECONDS, self.DEFAULT_WAIT_MAX_SECONDS),  # max. 60
+            adaptive=config.get(DatabaseConfKey.ADAPTIVE_BATCHING, False),
+            batch_size_min=config.get(DatabaseConfKey.BATCH_SIZE_MIN, self.DEFAULT_BATCH_SIZE_MIN),
+            batch_size_max=batch_size_max,
+            target_store_seconds=config.get(DatabaseConfKey.TARGET_STORE_SECONDS, self.DEFAULT_TARGET_STORE_SECONDS),
+            target_latency_seconds=config.get(DatabaseConfKey.TARGET_LATENCY_SECONDS),
+        )
+
+        self._drain_seconds = config.get(DatabaseConfKey.SHUTDOWN_DRAIN_SECONDS, self.DEFAULT_SHUTDOWN_DRAIN_SECONDS)
+        spool_file = config.get(DatabaseConfKey.SPOOL_FILE)
+        self._spool = MessageSpool(spool_file) if spool_file else None
+
+        # shared with `MqttListener` (see `Runner`); overflow sheds from this queue
+        self._memory_budget = memory_budget or MemoryBudget.from_config(config)
+        self._memory_budget.set_evictor(self._shed)
 
         super().start()
 
+    @property
+    def drain_seconds(self) -> float:
+        return self._drain_seconds
+
+    @property
+    def batch_controller(self) -> BatchController:
+        return self._batch_controller
+
+    def flush(self):
+        """Stores the queued messages without waiting for a full batch or the flush deadline."""
+        with self._lock:
+            self._write_immediately = True
+
+    def request_clean_up(self):
+        """Runs the clean up with the next idle loop (within the store thread, which owns the connection)."""
+        with self._lock:
+            self._clean_up_requested = True
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            queue_depth = len(self._messages)
+            queue_depths = self._messages.depths()
+        wait_max_seconds = self._batch_controller.wait_max_seconds
+        last_store_time = self._message_store.last_store_time
+        return {
+            "queue_depth": queue_depth,
+            "queue_depths": queue_depths,
+            "queue_bytes": self._memory_budget.used_bytes,
+            "batch_size": self._batch_controller.batch_size,
+            "wait_max_seconds": wait_max_seconds,
+            "flush_deadline": (last_store_time + datetime.timedelta(seconds=wait_max_seconds)).isoformat(),
+            "last_store_time": last_store_time.isoformat(),
+            "last_store_seconds": self._last_store_seconds,
+        }
+
     def close(self):
         with self._lock:
             self._closing = True
@@ -55,22 +122,46 @@ class ProxyStore(threading.Thread):
             return bool(self._closing)
 
     def queue(self, messages: List[Message], write_immediately=False):
-        added = 0
-        lost_messages = None
-
-        with self._lock:
-            if write_immediately and not self._write_immediately:
+        # closing: intake was stopped, so the budget is not needed to drain the listener (see `Runner.close`)
+        closing = self._is_closing()
+        queue_limit = self.QUEUE_LIMIT if self._memory_budget.limit_bytes is None and not closing else None
+        lost_count = 0
+        for message in messages:
+            if queue_limit is not None:
+                with self._lock:
+                    queue_full = len(self._messages) >= queue_limit
+                if queue_full:
+                    lost_count += 1
+                    continue
+
+            # not within `self._lock`: overflow sheds via `_shed` (also messages of this call)
+            if self._memory_budget.acquire(MemoryBudget.message_size(message), force=closing, message=message):
+                with self._lock:
+                    self._messages.append(message)
+
+        if lost_count:
+            Metrics.inc("memory.dropped_messages", lost_count)
+            _logger.error("message queue limit (%d) reached => lost %d messages!", queue_limit, lost_count)
+
+        if write_immediately:
+            with self._lock:
                 self._write_immediately = True
 
-            for message in messages:
-                if len(self._messages) > self.QUEUE_LIMIT:
-                    lost_messages = len(messages) - added
-                    break
-                self._messages.append(message)
-                added += 1
+        self._memory_budget.publish_metrics()
 
-        if lost_messages is not None:
-            _logger.error("message queue limit (%d) reached => lost %d messages!", self.QUEUE_LIMIT, lost_messages)
+    def _shed(self, bytes_needed: int, message: Optional[Message]) -> int:
+        """
+        Memory budget exhausted: drops queued messages (lowest priority class and oldest first) until `bytes_needed` are
+        released. With `message` (`drop_newest`) only messages of lower priority classes are dropped.
+        """
+        with self._lock:
+            below_index = None if message is None else self._messages.class_index(message)
+            released_bytes, dropped_count = self._messages.shed(bytes_needed, below_index)
+
+        self._memory_budget.release(released_bytes)
+        if dropped_count:
+            self._memory_budget.dropped(dropped_count)
+        return released_bytes
 
     def _close_connection(self):
         try:
@@ -85,6 +176,8 @@ class ProxyStore(threading.Thread):
         step_time = 0.05
 
         try:
+            self._replay_spool()
+
             while not self._is_closing():
                 busy = False
 
@@ -97,12 +190,8 @@ class ProxyStore(threading.Thread):
                     if self._clean_up():
                         busy = True
 
-                if self._message_store.last_connect_time is not None:
-                    diff_seconds = (self._now() - self._message_store.last_connect_time).total_seconds()
-                    if diff_seconds > self.RECONNECT_AFTER_SECONDS:
-                        _logger.debug(f"automatically closing connection after {self.RECONNECT_AFTER_SECONDS}s.")
-                        self._close_connection()
-                        busy = True
+                if self._rotate_connection():
+                    busy = True
 
                 time.sleep(step_time / 100 if busy else step_time)
 
@@ -111,7 +200,107 @@ class ProxyStore(threading.Thread):
             _logger.exception(ex)
             self.close()
         finally:
+            self._drain()
             self._close_connection()
+            self._close_standby_connection()
+
+    def _rotate_connection(self) -> bool:
+        """Called between batches: switches to the standby connection if ready, starts to create one if due."""
+        with self._lock:
+            standby_connection = self._standby_connection
+            self._standby_connection = None
+
+        if standby_connection is not None:
+            old_connection = self._message_store.replace_connection(standby_connection)
+            if old_connection is not None:
+                # closing may take a round trip, so not within the ingest path
+                threading.Thread(target=self._close_quietly, args=(old_connection, ), name="ProxyStoreClose", daemon=True).start()
+            _logger.debug("database connection rotated.")
+            return True
+
+        last_connect_time = self._message_store.last_connect_time
+        if self._rotation_seconds <= 0 or last_connect_time is None or self._rotation_thread is not None:
+            return False
+
+        if (self._now() - last_connect_time).total_seconds() > self._rotation_seconds:
+            self._rotation_thread = threading.Thread(target=self._create_standby_connection, name="ProxyStoreRotation", daemon=True)
+            self._rotation_thread.start()
+        return False
+
+    def _create_standby_connection(self):
+        try:
+            connection = self._message_store.create_connection()
+        except Exception as ex:
+            # the current connection keeps working, next try after the error delay
+            _logger.error("creating standby database connection failed: %s", ex)
+            time.sleep(self.WAIT_AFTER_ERROR_SECONDS)
+            connection = None
+
+        with self._lock:
+            closing = self._closing
+            if not closing:
+                self._standby_connection = connection
+        if closing and connection is not None:
+            self._close_quietly(connection)
+        self._rotation_thread = None
+
+    def _close_standby_connection(self):
+        with self._lock:
+            standby_connection = self._standby_connection
+            self._standby_connection = None
+        if standby_connection is not None:
+            self._close_quietly(standby_connection)
+
+    @classmethod
+    def _close_quietly(cls, connection):
+        try:
+            connection.close()
+        except Exception as ex:
+            _logger.exception(ex)
+
+    def _replay_spool(self):
+        """Stores the messages spooled at the last shutdown (before any new message)."""
+        if self._spool is None or not self._spool.exists():
+            return
+
+        messages = self._spool.load()
+        self._check_connection()
+        batch_size = self._batch_controller.batch_size_max
+        for i in range(0, len(messages), batch_size):
+            self._message_store.store(messages[i:i + batch_size])
+        # removed not before all are stored; an abort leads to a replay (and duplicates) on the next start
+        self._spool.remove()
+        _logger.info("replayed %d spooled message(s) from '%s'.", len(messages), self._spool.file_path)
+
+    def _drain(self):
+        """Shutdown: stores the queued messages in max-size batches until the deadline; left overs are spooled."""
+        time_deadline = time.monotonic() + self._drain_seconds
+        batch_size = self._batch_controller.batch_size_max
+        self._message_store.rollback()  # after a failed store the connection is within an aborted transaction
+        try:
+            while self._messages and time.monotonic() < time_deadline:
+                self._check_connection()
+                self._store_messages(batch_size)
+        except Exception as ex:
+            _logger.error("draining message queue failed: %s", ex)
+
+        with self._lock:
+            messages = self._messages.pop_all()
+        self._memory_budget.release(sum(MemoryBudget.message_size(m) for m in messages))
+
+        self.spool(messages)
+
+    def spool(self, messages: List[Message]):
+        """Saves messages for the next start (drain left overs; or from `Runner.close` if this thread has died)."""
+        if messages:
+            if self._spool is None:
+                _logger.error("no spool file configured => lost %d messages!", len(messages))
+                return
+            try:
+                self._spool.save(messages)
+            except Exception as ex:
+                _logger.exception(ex)
+                _logger.error("lost %d messages!", len(messages))
 
     def _check_connection(self) -> bool:
         """Separated to mock and test without threads"""
@@ -123,7 +312,10 @@ class ProxyStore(threading.Thread):
 
     def _clean_up(self):
         """Separated to mock and test without threads"""
-        if self._should_clean_up_items():
+        with self._lock:
+            clean_up_requested = self._clean_up_requested
+            self._clean_up_requested = False
+        if clean_up_requested or self._should_clean_up_items():
             self._message_store.clean_up()
             return True
         return False
@@ -133,32 +325,48 @@ class ProxyStore(threading.Thread):
         if message_count == 0:
             return False
 
-        if self._write_immediately:
+        if self._write_immediately or self._first_store:
             return True
 
-        if message_count >= self._batch_size:
+        if message_count >= self._batch_controller.batch_size:
             return True
 
         diff_seconds = (self._now() - self._message_store.last_store_time).total_seconds()
-        if diff_seconds > self._wait_max_seconds:
+        if diff_seconds > self._batch_controller.wait_max_seconds:
             return True
 
         return False
 
-    def _store_messages(self) -> bool:
-        messages = []
+    def _store_messages(self, batch_size: Optional[int] = None) -> bool:
+        batch_size = batch_size or self._batch_controller.batch_size
 
         with self._lock:
-            while len(messages) < self._batch_size:
-                try:
-                    m = self._messages.popleft()
-                    messages.append(m)
-                except IndexError:
-                    self._write_immediately = False
-                    break
+            messages = self._messages.pop_batch(batch_size)  # weighted by priority class
+            if len(messages) < batch_size:
+                self._write_immediately = False
 
         if messages:
-            self._message_store.store(messages)
+            self._first_store = False
+            time_start = time.monotonic()
+            try:
+                self._message_store.store(messages)
+            except Exception as ex:
+                unstored_messages = ex.unstored_messages if isinstance(ex, PartialStoreException) else messages
+                with self._lock:
+                    self._messages.put_back(unstored_messages)  # keep them for a retry, draining or spooling
+                stored_bytes = sum(MemoryBudget.message_size(m) for m in messages) - \
+                    sum(MemoryBudget.message_size(m) for m in unstored_messages)
+                self._memory_budget.release(stored_bytes)
+                raise
+            self._last_store_seconds = time.monotonic() - time_start
+            self._memory_budget.release(sum(MemoryBudget.message_size(m) for m in messages))
+            self._memory_budget.publish_metrics()
+            queue_depth = len(self._messages)
+            self._batch_controller.on_stored(len(messages), self._last_store_seconds, queue_depth)
+            Metrics.set("store.queue_depth", queue_depth)
+            if self._messages.has_classes:
+                for name, depth in self._messages.depths().items():
+                    Metrics.set("store.queue_depth." + name, depth)
 
         self._last_error_text = None
 
@@ -0,0 +1,173 @@
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from src.message import Message
+from src.metrics import Metrics
+
+
+class RateLimitConfKey:
+    TOPIC_REGEX = "topic_regex"
+    RATE = "rate"
+    BURST = "burst"
+    PER_TOPIC = "per_topic"
+    MODE = "mode"
+    SAMPLE_EVERY = "sample_every"
+
+
+class RateLimitMode:
+    DROP = "drop"  # over-limit messages are dropped
+    SAMPLE = "sample"  # every n-th over-limit message is kept
+    AGGREGATE = "aggregate"  # the latest over-limit message per topic is kept and stored as soon as the limit allows
+
+    CHOICES = [DROP, SAMPLE, AGGREGATE]
+
+
+RATE_LIMITS_JSONSCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            RateLimitConfKey.TOPIC_REGEX: {"type": "string", "minLength": 1},
+            RateLimitConfKey.RATE: {"type": "number", "exclusiveMinimum": 0, "description": "Messages per second"},
+            RateLimitConfKey.BURST: {"type": "number", "minimum": 1, "description": "Bucket size. Default: max(1, rate)"},
+            RateLimitConfKey.PER_TOPIC: {
+                "type": "boolean",
+                "description": "True (default): a bucket per topic; False: one bucket for all matching topics (prefix)"
+            },
+            RateLimitConfKey.MODE: {"type": "string", "enum": RateLimitMode.CHOICES, "description": "Default: drop"},
+            RateLimitConfKey.SAMPLE_EVERY: {"type": "integer", "minimum": 2, "description": "Mode 'sample'. Default: 10"},
+        },
+        "additionalProperties": False,
+        "required": [RateLimitConfKey.TOPIC_REGEX, RateLimitConfKey.RATE],
+    },
+    "description": "Rate limits (token buckets) per topic regex; first match wins.",
+}
+
+
+class TokenBucket:
+
+    __slots__ = ("rule", "tokens", "time_last", "over_limit_count")
+
+    def __init__(self, rule: "RateLimitRule", now: float):
+        self.rule = rule
+        self.tokens = rule.burst
+        self.time_last = now
+        self.over_limit_count = 0
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.rule.burst, self.tokens + (now - self.time_last) * self.rule.rate)
+        self.time_last = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class RateLimitRule:
+
+    DEFAULT_SAMPLE_EVERY = 10
+
+    def __init__(self, config: Dict):
+        self.regex = re.compile(config[RateLimitConfKey.TOPIC_REGEX])
+        self.rate = float(config[RateLimitConfKey.RATE])
+        self.burst = float(config.get(RateLimitConfKey.BURST, max(1.0, self.rate)))
+        self.per_topic = config.get(RateLimitConfKey.PER_TOPIC, True)
+        self.mode = config.get(RateLimitConfKey.MODE, RateLimitMode.DROP)
+        self.sample_every = config.get(RateLimitConfKey.SAMPLE_EVERY, self.DEFAULT_SAMPLE_EVERY)
+
+        self.shared_bucket: Optional[TokenBucket] = None
+        self.metric_name = "rate_limit.dropped." + self.regex.pattern
+
+
+class RateLimiter:
+    """
+    Token buckets per topic or per rule (topic prefix), so a single flooding device cannot crowd out the other topics.
+    The bucket of a topic is cached (constant time lookup after the first message). Drops are counted per rule (metrics
+    "rate_limit.dropped.<topic_regex>"; per topic, wildcard rules would add metrics without bound).
+    """
+
+    MAX_CACHE_SIZE = 100000
+
+    def __init__(self, rules_config: Optional[List[Dict]]):
+        self._rules = [RateLimitRule(c) for c in rules_config or []]
+        self._lock = threading.Lock()  # `accept` (MQTT thread) and `pop_pending` (runner)
+        self._buckets: Dict[str, Optional[TokenBucket]] = {}  # topic => bucket (None: no limit)
+        self._pending: Dict[str, Tuple[TokenBucket, Message]] = {}  # mode "aggregate": latest over-limit message
+
+    def __bool__(self):
+        return bool(self._rules)
+
+    def accept(self, message: Message) -> bool:
+        """False: dropped or kept back (mode "aggregate", see `pop_pending`)."""
+        topic = message.topic
+        now = time.monotonic()
+
+        with self._lock:
+            try:
+                bucket = self._buckets[topic]
+            except KeyError:
+                bucket = self._create_bucket(topic, now)
+
+            if bucket is None:
+                return True
+
+            if topic in self._pending:
+                self._keep_back(topic, bucket, message)  # keeps the order; the latest value wins
+                return False
+
+            if bucket.take(now):
+                return True
+
+            rule = bucket.rule
+            if rule.mode == RateLimitMode.SAMPLE:
+                bucket.over_limit_count += 1
+                if bucket.over_limit_count % rule.sample_every == 0:
+                    return True
+            elif rule.mode == RateLimitMode.AGGREGATE:
+                self._keep_back(topic, bucket, message)
+                return False
+
+        self._dropped(bucket.rule)
+        return False
+
+    def pop_pending(self) -> List[Message]:
+        """Mode "aggregate": the kept back messages, for which the limit allows a message again."""
+        if not self._pending:
+            return []
+
+        messages = []
+        now = time.monotonic()
+        with self._lock:
+            for topic, (bucket, message) in list(self._pending.items()):
+                if bucket.take(now):
+                    messages.append(message)
+                    del self._pending[topic]
+        return messages
+
+    def _keep_back(self, topic: str, bucket: TokenBucket, message: Message):
+        if topic in self._pending:
+            self._dropped(bucket.rule)  # replaced
+        self._pending[topic] = (bucket, message)
+
+    @classmethod
+    def _dropped(cls, rule: RateLimitRule):
+        Metrics.inc(rule.metric_name)
+
+    def _create_bucket(self, topic: str, now: float) -> Optional[TokenBucket]:
+        bucket = None
+        for rule in self._rules:
+            if rule.regex.match(topic):
+                if rule.per_topic:
+                    bucket = TokenBucket(rule, now)
+                else:
+                    if rule.shared_bucket is None:
+                        rule.shared_bucket = TokenBucket(rule, now)
+                    bucket = rule.shared_bucket
+                break
+
+        if len(self._buckets) >= self.MAX_CACHE_SIZE:
+            self._buckets = {}  # per topic buckets start full again
+        self._buckets[topic] = bucket
+        return bucket
@@ -1,9 +1,17 @@
 import logging
 import time
+from typing import List, Optional
 
+from src.app_config import AppConfig, ControlConfKey
+from src.control_server import ControlServer
+from src.database import DatabaseConfKey, IngestMode
 from src.lifecycle_control import LifecycleControl, StatusNotification
+from src.memory_budget import MemoryBudget
+from src.message_archiver import Archiver
+from src.mqtt_client import MqttConfKey
 from src.mqtt_listener import MqttListener
 from src.proxy_store import ProxyStore
+from src.staging_merger import StagingMerger
 
 
 _logger = logging.getLogger(__name__)
@@ -11,13 +19,46 @@ _logger = logging.getLogger(__name__)
 
 class Runner:
 
+    JOIN_MARGIN_SECONDS = 5
+
     def __init__(self, app_config):
         self._shutdown = False
+        self._app_config = app_config
+
+        self._store: Optional[ProxyStore] = None
+        self._staging_merger: Optional[StagingMerger] = None
+        self._archiver: Optional[Archiver] = None
+        self._mqtt_listeners: List[MqttListener] = []
+        self._control_server: Optional[ControlServer] = None
+
+        database_config = app_config.get_database_config()
+        if database_config.get(DatabaseConfKey.ARCHIVE_DIR):
+            Archiver.check_requirements(database_config)  # before any thread is started
+
+        try:
+            self._start_components(app_config, database_config)
+        except Exception:
+            self.close()  # already started (non-daemon) threads would keep the process alive
+            raise
+
+    def _start_components(self, app_config, database_config):
+        memory_budget = MemoryBudget.from_config(database_config)  # all in-memory queues
+        self._store = ProxyStore(database_config, memory_budget)
+
+        if database_config.get(DatabaseConfKey.INGEST_MODE) == IngestMode.STAGING:
+            self._staging_merger = StagingMerger(database_config)
 
-        self._store = ProxyStore(app_config.get_database_config())
+        if database_config.get(DatabaseConfKey.ARCHIVE_DIR):
+            self._archiver = Archiver(database_config)
 
-        self._mqtt = MqttListener(app_config.get_mqtt_config())
-        self._mqtt.connect()
+        # one listener (own network thread) per broker, all feed the same store
+        for mqtt_config in app_config.get_mqtt_configs():
+            self._mqtt_listeners.append(MqttListener(mqtt_config, memory_budget))
+            self._mqtt_listeners[-1].connect()
+
+        socket_path = app_config.get_control_config().get(ControlConfKey.SOCKET_PATH)
+        if socket_path:
+            self._control_server = ControlServer(socket_path, self._store, self._mqtt_listeners)
 
     def loop(self):
         """endless loop"""
@@ -29,15 +70,25 @@ class Runner:
 
                 if not self._store.is_alive():
                     raise RuntimeError("database thread was finished! abort.")
+                if self._staging_merger is not None and not self._staging_merger.is_alive():
+                    raise RuntimeError("staging merger thread was finished! abort.")
 
-                messages = self._mqtt.get_messages()
-                if messages:
-                    there_has_been_messages_to_notify = True
-                    self._store.queue(messages)
+                if LifecycleControl.pop_reload_request():
+                    self.reload()
+
+                message_count = 0
+                for mqtt_listener in self._mqtt_listeners:
+                    messages = mqtt_listener.get_messages()
+                    if messages:
+                        message_count += len(messages)
+                        self._store.queue(messages)
 
-                if len(messages) == 0:
+                if message_count > 0:
+                    there_has_been_messages_to_notify = True
+                else:
                     # not busy
-                    self._mqtt.ensure_connection()
+                    for mqtt_listener in self._mqtt_listeners:
+                        mqtt_listener.ensure_connection()
 
                     if there_has_been_messages_to_notify:
                         there_has_been_messages_to_notify = False
@@ -49,10 +100,65 @@ class Runner:
             # gets called without signal-handler
             _logger.debug("finishing...")
 
+    def reload(self):
+        """SIGHUP: applies changed MQTT subscriptions (and skip regexes); other changes need a restart."""
+        try:
+            app_config = AppConfig(self._app_config.config_file)
+        except Exception as ex:
+            _logger.error("config reload failed, keeping current config: %s", ex)
+            return
+
+        old_mqtt_configs = self._app_config.get_mqtt_configs()
+        new_mqtt_configs = app_config.get_mqtt_configs()
+        if len(new_mqtt_configs) == len(self._mqtt_listeners):  # brokers are matched by position
+            for mqtt_listener, mqtt_config in zip(self._mqtt_listeners, new_mqtt_configs):
+                mqtt_listener.reload(mqtt_config)
+
+        ignored = [
+            section for section, old_config, new_config in [
+                ("database", self._app_config.get_database_config(), app_config.get_database_config()),
+                ("mqtt", [self._without_subscriptions(c) for c in old_mqtt_configs],
+                 [self._without_subscriptions(c) for c in new_mqtt_configs]),
+            ] if old_config != new_config
+        ]
+        if ignored:
+            _logger.warning("config reload: changes of section(s) %s need a restart!", ignored)
+
+        self._app_config = app_config
+
+    @classmethod
+    def _without_subscriptions(cls, mqtt_config):
+        skipped = [MqttConfKey.SUBSCRIPTIONS, MqttConfKey.SKIP_SUBSCRIPTION_REGEXES]
+        return {k: v for k, v in mqtt_config.items() if k not in skipped}
+
     def close(self):
-        if self._mqtt is not None:
-            self._mqtt.close()
-            self._mqtt = None
+        if self._control_server is not None:
+            self._control_server.close()
+            self._control_server.join(self.JOIN_MARGIN_SECONDS)
+            self._control_server = None
+
+        messages = []
+        for mqtt_listener in self._mqtt_listeners:
+            mqtt_listener.close()  # stop intake first
+        for mqtt_listener in self._mqtt_listeners:
+            messages.extend(mqtt_listener.get_messages())
+        self._mqtt_listeners = []
         if self._store is not None:
+            if self._store.is_alive():
+                # the store thread drains its queue (bounded by `shutdown_drain_seconds`) and spools the left overs
+                self._store.queue(messages, write_immediately=True)
+            else:
+                self._store.spool(messages)  # died (e.g. database down), its queue was drained and spooled already
             self._store.close()
+            if self._store.is_alive():
+                self._store.join(self._store.drain_seconds + self.JOIN_MARGIN_SECONDS)
+                if self._store.is_alive():
+                    _logger.warning("database thread is still draining...")
             self._store = None
+        if self._staging_merger is not None:
+            self._staging_merger.close()  # final merge (store thread was joined before)
+            self._staging_merger = None
+        if self._archiver is not None:
+            self._archiver.close()  # an aborted day is rolled back and archived again on the next start
+            self._archiver.join(self.JOIN_MARGIN_SECONDS)
+            self._archiver = None
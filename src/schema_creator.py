@@ -40,6 +40,24 @@ class SchemaCreator(Database):
         self._execute_commands([command])
         _logger.info("json convert trigger created.")
 
+        script = self.get_script_path("staging.sql")
+        commands = DatabaseUtils.load_commands(script)
+        self._execute_commands(commands)
+        script = self.get_script_path("staging_convert.sql")
+        command = DatabaseUtils.load_as_single_command(script)
+        self._execute_commands([command])
+        _logger.info("staging table created.")
+
+        script = self.get_script_path("value_columns.sql")
+        commands = DatabaseUtils.load_commands(script)
+        self._execute_commands(commands)
+        _logger.info("value columns created.")
+
+        script = self.get_script_path("broker_column.sql")
+        commands = DatabaseUtils.load_commands(script)
+        self._execute_commands(commands)
+        _logger.info("broker column created.")
+
         self._connection.commit()
 
     @classmethod
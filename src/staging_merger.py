@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+
+from psycopg import sql
+
+from src.database import Database, DatabaseConfKey
+
+
+_logger = logging.getLogger(__name__)
+
+
+class StagingStore(Database):
+    """Moves messages from the UNLOGGED staging table into the journal table (set based, chunk wise)"""
+
+    def __init__(self, config):
+        super().__init__(config)
+
+        # optional columns filled by `MessageStore`
+        self._value_columns = bool(config.get(DatabaseConfKey.VALUE_COLUMNS))
+        self._broker_id_column = bool(config.get(DatabaseConfKey.BROKER_ID_COLUMN))
+
+    def check_staging_table(self):
+        with self._connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s), to_regproc('journal_try_json')", (self._staging_table_name, ))
+            table_oid, function_oid = cursor.fetchone()
+        self._connection.rollback()
+
+        if table_oid is None or function_oid is None:
+            raise RuntimeError(
+                "staging table ({}) or function (journal_try_json) does not exist! execute './sql/staging.sql' and "
+                "'./sql/staging_convert.sql' (adapt the table name if necessary).".format(self._staging_table_name)
+            )
+
+    def merge_chunk(self, chunk_size: int) -> int:
+        """Moves up to `chunk_size` rows (the oldest ones) in one transaction; returns the number of moved rows."""
+        # JSON conversion is done within the statement, the journal trigger skips rows with `data` already set
+        value_columns = sql.SQL(
+            (", value_num, value_bool" if self._value_columns else "") + (", broker_id" if self._broker_id_column else "")
+        )
+        statement = sql.SQL(
+            "WITH moved AS ("
+            "  DELETE FROM {staging} WHERE staging_id IN (SELECT staging_id FROM {staging} ORDER BY staging_id LIMIT {chunk_size})"
+            "  RETURNING staging_id, message_id, topic, text, qos, retain, time{value_columns}"
+            ") "
+            "INSERT INTO {table} (message_id, topic, text, data, qos, retain, time{value_columns}) "
+            "SELECT message_id, topic, text, CASE WHEN text SIMILAR TO '(\\{{|\\[)%' THEN journal_try_json(text) END, qos, retain, time"
+            "{value_columns} FROM moved ORDER BY staging_id"
+        ).format(
+            staging=sql.Identifier(self._staging_table_name),
+            table=sql.Identifier(self._table_name),
+            chunk_size=sql.Literal(chunk_size),
+            value_columns=value_columns,
+        )
+
+        with self._connection.cursor() as cursor:
+            cursor.execute(statement)
+            cursor_rowcount = cursor.rowcount
+
+        self._connection.commit()
+        return cursor_rowcount
+
+
+class StagingMerger(threading.Thread):
+    """
+    Background thread (own database connection) for `ingest_mode: staging`: periodically moves the staged messages
+    into the journal table. A final merge runs on close. Recovery: messages staged by a crashed service are merged after
+    the restart; after a database crash Postgres truncates the UNLOGGED staging table, so only the messages of the last
+    merge interval may get lost.
+    """
+
+    DEFAULT_MERGE_SECONDS = 2
+    DEFAULT_CHUNK_SIZE = 50000
+
+    def __init__(self, config):
+        threading.Thread.__init__(self, name=self.__class__.__name__)
+
+        self._store = StagingStore(config)
+        self._closing = threading.Event()
+
+        self._merge_seconds = config.get(DatabaseConfKey.STAGING_MERGE_SECONDS, self.DEFAULT_MERGE_SECONDS)
+        self._chunk_size = config.get(DatabaseConfKey.STAGING_MERGE_CHUNK_SIZE, self.DEFAULT_CHUNK_SIZE)
+
+        self.merged_count = 0
+
+        super().start()
+
+    def start(self):
+        raise RuntimeError("started within constructor!")
+
+    def close(self):
+        self._closing.set()
+
+    def run(self):
+        try:
+            self._store.connect()
+            self._store.check_staging_table()
+
+            while not self._closing.wait(self._merge_seconds):
+                self.merge()
+
+            self.merge()  # final merge of what was stored before closing
+
+        except Exception as ex:
+            # stop thread => shutdown service (see `Runner`) => restart via systemd
+            _logger.exception(ex)
+        finally:
+            self._store.close()
+
+    def merge(self) -> int:
+        merged_count = 0
+        time_start = time.monotonic()
+
+        while True:
+            chunk_count = self._store.merge_chunk(self._chunk_size)
+            merged_count += chunk_count
+            if chunk_count < self._chunk_size:
+                break
+
+        self.merged_count += merged_count
+        if merged_count > 0:
+            _logger.debug("merged %d staged row(s) in %.3fs", merged_count, time.monotonic() - time_start)
+
+        return merged_count
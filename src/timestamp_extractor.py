@@ -0,0 +1,138 @@
+import datetime
+import json
+import logging
+from typing import Callable, Dict, Optional
+
+from tzlocal import get_localzone
+
+from src.message import Message
+from src.mqtt_client import MqttConfKey
+from src.topic_rules import TopicRules
+
+
+_logger = logging.getLogger(__name__)
+
+
+TimestampParser = Callable[[object], datetime.datetime]
+
+
+class TimestampExtractor:
+    """
+    Takes the message time from a JSON field of the payload or from a MQTT v5 user property (instead of the arrival time).
+
+    The format of a timestamp (epoch seconds/milliseconds, ISO 8601 with or without offset) is detected once per topic
+    and cached, as a device always sends the same format. Implausible timestamps (too far in the future or, if configured,
+    in the past) are ignored.
+    """
+
+    DEFAULT_MAX_FUTURE_SECONDS = 300
+
+    EPOCH_MILLISECONDS_THRESHOLD = 1e11  # larger epoch values are milliseconds (seconds: year 5138)
+
+    MAX_CACHE_SIZE = 100000
+
+    def __init__(self, config):
+        self._json_path = (config.get(MqttConfKey.TIMESTAMP_JSON_FIELD) or "").split(".")
+        self._json_path = [p for p in self._json_path if p]
+        self._user_property = config.get(MqttConfKey.TIMESTAMP_USER_PROPERTY)
+        self._max_future_seconds = config.get(MqttConfKey.TIMESTAMP_MAX_FUTURE_SECONDS, self.DEFAULT_MAX_FUTURE_SECONDS)
+        self._max_past_seconds = config.get(MqttConfKey.TIMESTAMP_MAX_PAST_SECONDS)
+
+        regexes = config.get(MqttConfKey.TIMESTAMP_TOPIC_REGEXES)
+        self._topics = TopicRules([(regex, True) for regex in regexes or []], default=not regexes)
+
+        # cheap pre-check before parsing JSON: the (last) field name must be part of the payload
+        self._json_key = '"{}"'.format(self._json_path[-1]) if self._json_path else None
+
+        self._parsers: Dict[str, TimestampParser] = {}  # detected format per topic
+        self._local_zone = get_localzone()
+
+    def __bool__(self):
+        return bool(self._json_path or self._user_property)
+
+    def extract(self, message: Message, properties=None) -> Optional[datetime.datetime]:
+        """Returns None if there is no (valid) timestamp; the caller uses the arrival time then."""
+        if not self._topics.get(message.topic):
+            return None
+
+        value = None
+        if self._user_property and properties is not None:
+            for key, property_value in getattr(properties, "UserProperty", []):
+                if key == self._user_property:
+                    value = property_value
+                    break
+        if value is None and self._json_key:
+            value = self._extract_json_value(message.text)
+        if value is None or isinstance(value, bool):
+            return None
+
+        time = self._parse(message.topic, value)
+        if time is not None and (self._max_future_seconds is not None or self._max_past_seconds is not None):
+            ahead_seconds = (time - datetime.datetime.now(tz=self._local_zone)).total_seconds()
+            if self._max_future_seconds is not None and ahead_seconds > self._max_future_seconds:
+                _logger.debug("timestamp of '%s' is in the future (%s) => ignored", message.topic, time)
+                return None
+            if self._max_past_seconds is not None and -ahead_seconds > self._max_past_seconds:
+                _logger.debug("timestamp of '%s' is too old (%s) => ignored", message.topic, time)
+                return None
+        return time
+
+    def _extract_json_value(self, text: Optional[str]):
+        if not text or text[0] != "{" or self._json_key not in text:
+            return None
+        try:
+            value = json.loads(text)
+        except ValueError:
+            return None
+        for key in self._json_path:
+            if not isinstance(value, dict):
+                return None
+            value = value.get(key)
+        return value
+
+    def _parse(self, topic: str, value) -> Optional[datetime.datetime]:
+        parser = self._parsers.get(topic)
+        if parser is not None:
+            try:
+                return parser(value)
+            except (ValueError, TypeError, AttributeError, OverflowError, OSError):
+                pass  # format changed => detect again
+
+        parser = self.detect_parser(value)
+        if parser is None:
+            _logger.debug("unknown timestamp format of '%s': %s", topic, value)
+            return None
+
+        if len(self._parsers) >= self.MAX_CACHE_SIZE:
+            self._parsers = {}
+        self._parsers[topic] = parser
+        return parser(value)
+
+    def detect_parser(self, value) -> Optional[TimestampParser]:
+        for parser in [self.parse_epoch_seconds, self.parse_epoch_milliseconds, self.parse_iso]:
+            try:
+                parser(value)
+                return parser
+            except (ValueError, TypeError, AttributeError, OverflowError, OSError):
+                pass
+        return None
+
+    def parse_epoch_seconds(self, value) -> datetime.datetime:
+        number = float(value)  # also numeric strings
+        if number > self.EPOCH_MILLISECONDS_THRESHOLD:
+            raise ValueError("epoch milliseconds")
+        return datetime.datetime.fromtimestamp(number, tz=self._local_zone)
+
+    def parse_epoch_milliseconds(self, value) -> datetime.datetime:
+        number = float(value)
+        if number <= self.EPOCH_MILLISECONDS_THRESHOLD:
+            raise ValueError("epoch seconds")
+        return datetime.datetime.fromtimestamp(number / 1000, tz=self._local_zone)
+
+    def parse_iso(self, value) -> datetime.datetime:
+        if value.endswith("Z"):
+            value = value[:-1] + "+00:00"  # unsupported by Python < 3.11
+        time = datetime.datetime.fromisoformat(value)
+        if time.tzinfo is None:
+            time = time.replace(tzinfo=self._local_zone)
+        return time
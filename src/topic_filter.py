@@ -0,0 +1,68 @@
+import logging
+import re
+from typing import Iterable, List
+
+
+_logger = logging.getLogger(__name__)
+
+
+class TopicFilter:
+    """Skips topics matching one of the configured regexes (`skip_subscription_regexes`)"""
+
+    REGEX_SPECIAL_CHARS = set(".^$*+?{}[]\\|()")
+
+    def __init__(self, skip_regexes: Iterable[str]):
+        self._skip_regexes: List[re.Pattern] = []
+
+        for skip_regex in set(skip_regexes or []):
+            if skip_regex:
+                self._skip_regexes.append(re.compile(skip_regex))
+
+    def __bool__(self):
+        return bool(self._skip_regexes)
+
+    def restrict(self, subscription: str) -> "TopicFilter":
+        """
+        Filter with only those regexes, which may match topics received via `subscription` (MQTT v5 subscription
+        identifiers). Regexes are compared by their literal prefix (`re.match` anchors at the start), so the check is
+        conservative: a kept regex may still not match.
+        """
+        if subscription.startswith("$share/"):
+            subscription = subscription.split("/", 2)[2] if subscription.count("/") >= 2 else ""
+
+        restricted = TopicFilter([])
+        if "+" not in subscription and "#" not in subscription:
+            restricted._skip_regexes = [r for r in self._skip_regexes if r.match(subscription)]
+            return restricted
+
+        subscription_prefix = re.split(r"[+#]", subscription, 1)[0]
+        for regex in self._skip_regexes:
+            regex_prefix = self.literal_prefix(regex.pattern)
+            if regex_prefix.startswith(subscription_prefix) or subscription_prefix.startswith(regex_prefix):
+                restricted._skip_regexes.append(regex)
+        return restricted
+
+    @classmethod
+    def literal_prefix(cls, pattern: str) -> str:
+        """Leading characters every match has to start with, e.g. "^abc/de" for "^abc/def?" => "abc/de"."""
+        if "|" in pattern:
+            return ""  # alternatives (maybe nested), no common prefix
+        if pattern.startswith("^"):
+            pattern = pattern[1:]
+
+        prefix = []
+        for char in pattern:
+            if char in cls.REGEX_SPECIAL_CHARS:
+                if char in "?*{" and prefix:
+                    prefix.pop()  # previous char is optional
+                break
+            prefix.append(char)
+        return "".join(prefix)
+
+    def accept(self, topic: str) -> bool:
+        for regex in self._skip_regexes:
+            if regex.match(topic):
+                _logger.debug('skipped topic: "%s"', topic)
+                return False
+
+        return True
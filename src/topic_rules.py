@@ -0,0 +1,36 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class TopicRules:
+    """
+    Maps topics to values via regexes (first match wins). Results are cached per topic, as the number of distinct topics is
+    usually small compared to the number of messages; the cache is reset when it grows too large.
+    """
+
+    MAX_CACHE_SIZE = 100000
+
+    def __init__(self, rules: Iterable[Tuple[str, Any]], default: Any = None):
+        self._rules: List[Tuple[re.Pattern, Any]] = [(re.compile(regex), value) for regex, value in rules]
+        self._default = default
+        self._cache: Dict[str, Any] = {}
+
+    def __bool__(self):
+        return bool(self._rules)
+
+    def get(self, topic: str) -> Optional[Any]:
+        try:
+            return self._cache[topic]
+        except KeyError:
+            pass
+
+        value = self._default
+        for regex, rule_value in self._rules:
+            if regex.match(topic):
+                value = rule_value
+                break
+
+        if len(self._cache) >= self.MAX_CACHE_SIZE:
+            self._cache = {}
+        self._cache[topic] = value
+        return value
@@ -0,0 +1,80 @@
+import json
+import math
+from typing import List, Optional, Tuple
+
+from src.database import DatabaseConfKey
+from src.message import Message
+from src.topic_rules import TopicRules
+
+
+class ValueExtractor:
+    """
+    Typed values for the columns `value_num` and `value_bool` (see `sql/value_columns.sql`), derived while a batch gets
+    encoded: bare payloads ("23.5", "true", "ON") are taken directly, JSON objects by a path per topic regex
+    (`value_json_paths`, first match wins; default: "value"). JSON is only parsed if the payload may contain the path.
+    """
+
+    DEFAULT_JSON_PATH = "value"
+
+    TRUE_TEXTS = {"true", "on"}
+    FALSE_TEXTS = {"false", "off"}
+
+    NO_VALUE = (None, None)
+
+    def __init__(self, config):
+        json_paths = config.get(DatabaseConfKey.VALUE_JSON_PATHS) or {}
+        self._json_paths = TopicRules(
+            [(regex, self.split_path(path)) for regex, path in json_paths.items()], default=self.split_path(self.DEFAULT_JSON_PATH)
+        )
+
+    @classmethod
+    def split_path(cls, path: str) -> List[str]:
+        return [p for p in (path or "").split(".") if p]
+
+    def extract(self, message: Message) -> Tuple[Optional[float], Optional[bool]]:
+        text = message.text
+        if not text:
+            return self.NO_VALUE
+
+        if text[0] != "{":
+            return self.to_value(text.strip())
+
+        if message.content_type and "json" not in message.content_type:
+            return self.NO_VALUE
+
+        path = self._json_paths.get(message.topic)
+        if not path or '"{}"'.format(path[-1]) not in text:
+            return self.NO_VALUE
+        try:
+            value = json.loads(text)
+        except ValueError:
+            return self.NO_VALUE
+        for key in path:
+            if not isinstance(value, dict):
+                return self.NO_VALUE
+            value = value.get(key)
+        return self.to_value(value)
+
+    @classmethod
+    def to_value(cls, value) -> Tuple[Optional[float], Optional[bool]]:
+        if isinstance(value, bool):
+            return None, value
+        if isinstance(value, (int, float)):
+            try:
+                number = float(value)
+            except OverflowError:  # JSON integers are unbounded
+                return cls.NO_VALUE
+            return (number, None) if math.isfinite(number) else cls.NO_VALUE
+        if isinstance(value, str) and value:
+            lower_value = value.lower()
+            if lower_value in cls.TRUE_TEXTS:
+                return None, True
+            if lower_value in cls.FALSE_TEXTS:
+                return None, False
+            if lower_value[0] in "0123456789+-.":  # cheap check before the exception path
+                try:
+                    number = float(value)
+                except ValueError:
+                    return cls.NO_VALUE
+                return (number, None) if math.isfinite(number) else cls.NO_VALUE
+        return cls.NO_VALUE
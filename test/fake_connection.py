@@ -0,0 +1,115 @@
+import contextlib
+from typing import Callable, List, Optional
+
+from psycopg import errors
+from psycopg.adapt import Transformer
+from psycopg.copy import TextFormatter
+
+
+class FakeCopy:
+    """Stands in for `psycopg.Copy`: rows get encoded (COPY text format) like for a real server, but are discarded."""
+
+    def __init__(self, cursor: "FakeCursor", statement):
+        self._cursor = cursor
+        self._formatter = TextFormatter(Transformer())
+        self.statement = statement
+        self.rows: List[tuple] = []
+        self.bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        self.bytes += len(self._formatter.end())
+        if exc_type is None:
+            rejected = self._cursor.connection.reject_row
+            if rejected is not None and any(rejected(row) for row in self.rows):
+                raise errors.StringDataRightTruncation("value too long (fake)")  # whole COPY fails like on a server
+            self._cursor.rowcount = len(self.rows)
+            self._cursor.connection.on_copied(self)
+
+    def write_row(self, row):
+        self.bytes += len(self._formatter.write_row(row))
+        if self._cursor.connection.keep_rows:
+            self.rows.append(row)
+        else:
+            self.rows.append(None)
+
+
+class FakeCursor:
+
+    def __init__(self, connection: "FakeConnection"):
+        self.connection = connection
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def copy(self, statement):
+        self.connection.in_transaction = True  # like psycopg (no autocommit): the first statement begins a transaction
+        return FakeCopy(self, statement)
+
+    def execute(self, statement, params=None):
+        self.connection.in_transaction = True
+        self.connection.statements.append(statement)
+        self.rowcount = self.connection.rowcounts.pop(0) if self.connection.rowcounts else 0
+
+
+class FakeConnection:
+    """COPY sink which replaces a psycopg connection (no server needed), e.g. `message_store._connection = FakeConnection()`"""
+
+    def __init__(self, keep_rows=True, reject_row: Optional[Callable[[tuple], bool]] = None):
+        self.keep_rows = keep_rows
+        self.reject_row = reject_row  # COPYs containing such rows fail (needs `keep_rows`)
+        self.statements = []
+        self.rowcounts: List[int] = []  # results of the next `execute` calls
+        self.copied_rows: List[tuple] = []
+        self.copy_count = 0
+        self.commit_count = 0
+        self.rollback_count = 0
+        self.savepoint_count = 0
+        self.closed = False
+        self.in_transaction = False
+        self.last_copy: Optional[FakeCopy] = None
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def on_copied(self, copy: FakeCopy):
+        self.copy_count += 1
+        self.last_copy = copy
+        if self.keep_rows:
+            self.copied_rows.extend(copy.rows)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Like psycopg: a savepoint within a transaction, otherwise a transaction of its own (committed at exit). Failed COPYs
+        are not added to `copied_rows`, so nothing to undo.
+        """
+        if self.in_transaction:
+            self.savepoint_count += 1
+            yield
+            return
+
+        self.in_transaction = True
+        try:
+            yield
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    def commit(self):
+        self.commit_count += 1
+        self.in_transaction = False
+
+    def rollback(self):
+        self.rollback_count += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
@@ -0,0 +1,333 @@
+import logging
+import socket
+import struct
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+_logger = logging.getLogger(__name__)
+
+
+class MqttPacketType:
+    CONNECT = 1
+    CONNACK = 2
+    PUBLISH = 3
+    PUBACK = 4
+    PUBREC = 5
+    PUBREL = 6
+    PUBCOMP = 7
+    SUBSCRIBE = 8
+    SUBACK = 9
+    UNSUBSCRIBE = 10
+    UNSUBACK = 11
+    PINGREQ = 12
+    PINGRESP = 13
+    DISCONNECT = 14
+
+
+def topic_matches(subscription: str, topic: str) -> bool:
+    """MQTT topic filter matching ("+" single level, "#" multi level wildcard)"""
+    sub_levels = subscription.split("/")
+    topic_levels = topic.split("/")
+
+    for index, sub_level in enumerate(sub_levels):
+        if sub_level == "#":
+            return True
+        if index >= len(topic_levels):
+            return False
+        if sub_level != "+" and sub_level != topic_levels[index]:
+            return False
+
+    return len(sub_levels) == len(topic_levels)
+
+
+class _BrokerSession:
+    """Connection of a single client to the `MqttBroker`"""
+
+    def __init__(self, broker: "MqttBroker", sock: socket.socket):
+        self.broker = broker
+        self.sock = sock
+        self.client_id: Optional[str] = None
+        self.subscriptions: Dict[str, int] = {}
+
+        self._stream = sock.makefile("rb")
+        self._send_lock = threading.Lock()
+        self._next_packet_id = 0
+
+    def next_packet_id(self) -> int:
+        with self._send_lock:
+            self._next_packet_id = self._next_packet_id % 65535 + 1
+            return self._next_packet_id
+
+    def send(self, data: bytes):
+        with self._send_lock:
+            self.sock.sendall(data)
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def run(self):
+        try:
+            while True:
+                packet = self._read_packet()
+                if packet is None:
+                    break
+                packet_type, flags, body = packet
+                if not self.broker.handle_packet(self, packet_type, flags, body):
+                    break
+        except (OSError, ValueError) as ex:
+            _logger.debug("broker session %s aborted: %s", self.client_id, ex)
+        finally:
+            self.broker.remove_session(self)
+            self.close()
+
+    def _read_packet(self) -> Optional[Tuple[int, int, bytes]]:
+        header = self._stream.read(1)
+        if not header:
+            return None
+
+        remaining_length = 0
+        multiplier = 1
+        while True:
+            encoded = self._stream.read(1)
+            if not encoded:
+                return None
+            remaining_length += (encoded[0] & 0x7F) * multiplier
+            if encoded[0] & 0x80 == 0:
+                break
+            multiplier *= 128
+
+        body = self._stream.read(remaining_length) if remaining_length else b""
+        if len(body) < remaining_length:
+            return None
+
+        return header[0] >> 4, header[0] & 0x0F, body
+
+
+class MqttBroker:
+    """
+    Minimal in-process MQTT broker (protocol 3.1 and 3.1.1) as stand-in for tests and benchmarks.
+
+    Supports QoS 0-2 for incoming messages, QoS 0/1 delivery, retained messages and wildcard subscriptions.
+    There is no authentication, no persistent session and no will message.
+    """
+
+    MAX_DELIVERY_QOS = 1
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((host, port))
+        self._server.listen(16)
+        self._server.settimeout(0.1)  # recheck `_closing` regularly
+
+        self._lock = threading.Lock()
+        self._sessions: List[_BrokerSession] = []
+        self._retained: Dict[str, Tuple[bytes, int]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._closing = False
+
+        self.received_count = 0
+
+    @property
+    def host(self) -> str:
+        return self._server.getsockname()[0]
+
+    @property
+    def port(self) -> int:
+        return self._server.getsockname()[1]
+
+    @property
+    def subscription_count(self) -> int:
+        with self._lock:
+            return sum(len(s.subscriptions) for s in self._sessions)
+
+    @property
+    def subscriptions(self) -> Set[str]:
+        with self._lock:
+            return {subscription for s in self._sessions for subscription in s.subscriptions}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._accept_loop, name="MqttBroker", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._closing = True
+        try:
+            self._server.close()
+        except OSError:
+            pass
+
+        with self._lock:
+            sessions = list(self._sessions)
+        for session in sessions:
+            session.close()
+
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def disconnect_clients(self):
+        """Drops all client connections (without DISCONNECT packet) to simulate network failures."""
+        with self._lock:
+            sessions = list(self._sessions)
+        for session in sessions:
+            session.close()
+
+    def remove_session(self, session: _BrokerSession):
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+
+    def _accept_loop(self):
+        while not self._closing:
+            try:
+                sock, _address = self._server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            sock.settimeout(None)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            session = _BrokerSession(self, sock)
+            with self._lock:
+                self._sessions.append(session)
+            threading.Thread(target=session.run, name="MqttBrokerSession", daemon=True).start()
+
+    def handle_packet(self, session: _BrokerSession, packet_type: int, flags: int, body: bytes) -> bool:
+        if packet_type == MqttPacketType.CONNECT:
+            self._handle_connect(session, body)
+        elif packet_type == MqttPacketType.PUBLISH:
+            self._handle_publish(session, flags, body)
+        elif packet_type == MqttPacketType.PUBREL:
+            session.send(self._packet(MqttPacketType.PUBCOMP, 0, body[:2]))
+        elif packet_type == MqttPacketType.SUBSCRIBE:
+            self._handle_subscribe(session, body)
+        elif packet_type == MqttPacketType.UNSUBSCRIBE:
+            self._handle_unsubscribe(session, body)
+        elif packet_type == MqttPacketType.PINGREQ:
+            session.send(self._packet(MqttPacketType.PINGRESP, 0, b""))
+        elif packet_type == MqttPacketType.DISCONNECT:
+            return False
+        # PUBACK, PUBREC, PUBCOMP of delivered messages are ignored (no redelivery)
+        return True
+
+    def _handle_connect(self, session: _BrokerSession, body: bytes):
+        protocol_name, pos = self._read_string(body, 0)
+        pos += 4  # protocol level (1), connect flags (1), keep alive (2)
+        session.client_id, pos = self._read_string(body, pos)
+        session.send(self._packet(MqttPacketType.CONNACK, 0, b"\x00\x00"))
+
+    def _handle_publish(self, session: _BrokerSession, flags: int, body: bytes):
+        qos = (flags >> 1) & 0x03
+        retain = bool(flags & 0x01)
+
+        topic, pos = self._read_string(body, 0)
+        packet_id = None
+        if qos > 0:
+            packet_id = body[pos:pos + 2]
+            pos += 2
+        payload = body[pos:]
+
+        if qos == 1:
+            session.send(self._packet(MqttPacketType.PUBACK, 0, packet_id))
+        elif qos == 2:
+            session.send(self._packet(MqttPacketType.PUBREC, 0, packet_id))
+
+        self.publish(topic, payload, qos, retain)
+
+    def publish(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False):
+        """Delivers a message to all subscribers (can be used directly to skip a publishing client)."""
+        with self._lock:
+            self.received_count += 1
+            if retain:
+                if payload:
+                    self._retained[topic] = (payload, qos)
+                else:
+                    self._retained.pop(topic, None)
+            sessions = list(self._sessions)
+
+        for target in sessions:
+            sub_qos = None
+            for subscription, granted_qos in list(target.subscriptions.items()):
+                if topic_matches(subscription, topic):
+                    sub_qos = granted_qos if sub_qos is None else max(sub_qos, granted_qos)
+            if sub_qos is not None:
+                self._deliver(target, topic, payload, min(qos, sub_qos), False)
+
+    def _handle_subscribe(self, session: _BrokerSession, body: bytes):
+        packet_id = body[:2]
+        pos = 2
+        granted = []
+        new_subscriptions = []
+        while pos < len(body):
+            subscription, pos = self._read_string(body, pos)
+            qos = min(body[pos] & 0x03, self.MAX_DELIVERY_QOS)
+            pos += 1
+            session.subscriptions[subscription] = qos
+            new_subscriptions.append(subscription)
+            granted.append(qos)
+
+        session.send(self._packet(MqttPacketType.SUBACK, 0, packet_id + bytes(granted)))
+
+        with self._lock:
+            retained = list(self._retained.items())
+        for topic, (payload, qos) in retained:
+            for subscription in new_subscriptions:
+                if topic_matches(subscription, topic):
+                    self._deliver(session, topic, payload, min(qos, session.subscriptions[subscription]), True)
+                    break
+
+    def _handle_unsubscribe(self, session: _BrokerSession, body: bytes):
+        packet_id = body[:2]
+        pos = 2
+        while pos < len(body):
+            subscription, pos = self._read_string(body, pos)
+            session.subscriptions.pop(subscription, None)
+        session.send(self._packet(MqttPacketType.UNSUBACK, 0, packet_id))
+
+    def _deliver(self, session: _BrokerSession, topic: str, payload: bytes, qos: int, retain: bool):
+        qos = min(qos, self.MAX_DELIVERY_QOS)
+        body = self._encode_string(topic)
+        if qos > 0:
+            body += struct.pack("!H", session.next_packet_id())
+        body += payload
+        try:
+            session.send(self._packet(MqttPacketType.PUBLISH, (qos << 1) | (1 if retain else 0), body))
+        except OSError as ex:
+            _logger.debug("delivery to %s failed: %s", session.client_id, ex)
+
+    @classmethod
+    def _packet(cls, packet_type: int, flags: int, body: bytes) -> bytes:
+        remaining_length = len(body)
+        encoded_length = bytearray()
+        while True:
+            digit = remaining_length % 128
+            remaining_length //= 128
+            if remaining_length > 0:
+                digit |= 0x80
+            encoded_length.append(digit)
+            if remaining_length == 0:
+                break
+        return bytes([(packet_type << 4) | flags]) + bytes(encoded_length) + body
+
+    @classmethod
+    def _read_string(cls, data: bytes, pos: int) -> Tuple[str, int]:
+        length = struct.unpack("!H", data[pos:pos + 2])[0]
+        pos += 2
+        return data[pos:pos + length].decode("utf-8"), pos + length
+
+    @classmethod
+    def _encode_string(cls, value: str) -> bytes:
+        encoded = value.encode("utf-8")
+        return struct.pack("!H", len(encoded)) + encoded
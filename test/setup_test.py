@@ -11,6 +11,7 @@ import yaml
 from jsonschema import validate
 from psycopg.rows import dict_row
 
+from src.database import DatabaseConfKey
 from src.mqtt_client import MqttConfKey, MQTT_JSONSCHEMA
 from src.schema_creator import SchemaCreator
 
@@ -158,6 +159,14 @@ class SetupTest:
         else:
             return {}
 
+    @classmethod
+    def get_fake_database_config(cls, **config) -> Dict:
+        """Database config of tests without server (see `FakeConnection`)"""
+        return {
+            DatabaseConfKey.HOST: "localhost", DatabaseConfKey.PORT: 5432, DatabaseConfKey.USER: "user", DatabaseConfKey.DATABASE: "db",
+            **config
+        }
+
     @classmethod
     def execute_commands(cls, commands: List[str]):
         if not cls._postgresql:
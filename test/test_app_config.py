@@ -1,7 +1,7 @@
 import os
 import unittest
 
-from src.app_config import AppConfig
+from src.app_config import AppConfig, CONFIG_JSONSCHEMA
 from test.setup_test import SetupTest
 
 
@@ -25,3 +25,25 @@ class TestAppConfig(unittest.TestCase):
 
         os.chmod(config_file, 0o600)
         AppConfig.check_config_file_access(config_file)  # no exception
+
+    def test_schema(self):
+        validator = AppConfig.get_validator()
+        validator.check_schema(CONFIG_JSONSCHEMA)  # skipped at runtime
+
+        self.assertIs(AppConfig.get_validator(), validator)
+
+    def test_mqtt_broker_list(self):
+        config_file = SetupTest.get_test_path("app_config_brokers.yaml")
+        with open(config_file, 'w') as f:
+            f.write(
+                "database: {host: localhost, port: 5432, database: db, broker_id_column: true}\n"
+                "mqtt:\n"
+                "  - {host: broker1, port: 1883, subscriptions: ['a/#'], broker_id: site1}\n"
+                "  - {host: broker2, port: 1883, subscriptions: ['b/#'], broker_id: site2}\n"
+            )
+        os.chmod(config_file, 0o600)
+
+        app_config = AppConfig(config_file)
+
+        self.assertEqual([c["broker_id"] for c in app_config.get_mqtt_configs()], ["site1", "site2"])
+        self.assertEqual(app_config.get_mqtt_config()["host"], "broker1")
@@ -0,0 +1,62 @@
+import os
+import threading
+import time
+import tracemalloc
+import unittest
+
+from src.app_profiling import AppProfiling, ProfilingConfKey
+from test.setup_test import SetupTest
+
+
+class TestAppProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = SetupTest.ensure_clean_dir(SetupTest.get_test_path("profiling"))
+        AppProfiling.configure({ProfilingConfKey.OUTPUT_DIR: self.output_dir, ProfilingConfKey.SAMPLE_INTERVAL: 0.005})
+
+    def tearDown(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def test_sample_threads(self):
+        stop_event = threading.Event()
+
+        def busy_loop():
+            while not stop_event.is_set():
+                time.sleep(0.001)
+
+        worker = threading.Thread(target=busy_loop, name="ProfiledWorker", daemon=True)
+        worker.start()
+
+        try:
+            file_path = AppProfiling.start_sampling(0.2)
+            self.assertIsNone(AppProfiling.start_sampling(0.2))  # already running
+
+            while AppProfiling.is_sampling():
+                time.sleep(0.05)
+        finally:
+            stop_event.set()
+            worker.join()
+
+        self.assertTrue(os.path.isfile(file_path))
+        with open(file_path) as f:
+            lines = f.readlines()
+
+        worker_lines = [line for line in lines if line.startswith("ProfiledWorker;")]
+        self.assertTrue(worker_lines)
+        self.assertTrue(any("busy_loop" in line for line in worker_lines))
+        for line in lines:
+            stack, count = line.rsplit(" ", 1)
+            self.assertGreater(int(count), 0)
+
+    def test_snapshot_memory(self):
+        self.assertIsNone(AppProfiling.snapshot_memory())  # starts tracing
+
+        data = [str(i) * 10 for i in range(1000)]
+
+        file_path = AppProfiling.snapshot_memory()
+        self.assertTrue(os.path.isfile(file_path))
+        with open(file_path) as f:
+            self.assertTrue(f.readline().startswith("traced memory:"))
+
+        self.assertEqual(len(data), 1000)
@@ -0,0 +1,60 @@
+import unittest
+
+from src.batch_controller import BatchController
+from src.metrics import Metrics
+
+
+class TestBatchController(unittest.TestCase):
+
+    def test_static(self):
+        controller = BatchController(batch_size=100, wait_max_seconds=10)
+
+        controller.on_stored(100, 5.0, 10000)
+        self.assertEqual(controller.batch_size, 100)
+        self.assertEqual(controller.wait_max_seconds, 10)
+        self.assertEqual(Metrics.get("store.last_store_seconds"), 5.0)
+
+    def test_static_small_batch_size(self):
+        controller = BatchController(batch_size=5, wait_max_seconds=10, batch_size_min=10)  # min: adaptive mode only
+        self.assertEqual(controller.batch_size, 5)
+
+    def test_grow_on_backlog(self):
+        controller = BatchController(batch_size=100, wait_max_seconds=10, adaptive=True, batch_size_max=1000, target_store_seconds=1)
+
+        controller.on_stored(100, 0.1, 50)  # no backlog
+        self.assertEqual(controller.batch_size, 100)
+
+        for _ in range(10):
+            controller.on_stored(controller.batch_size, 0.1, 100000)
+        self.assertEqual(controller.batch_size, 1000)  # bound
+        self.assertEqual(Metrics.get("store.batch_size"), 1000)
+
+    def test_shrink_on_slow_store(self):
+        controller = BatchController(batch_size=1000, wait_max_seconds=10, adaptive=True, batch_size_min=10, target_store_seconds=1)
+
+        controller.on_stored(1000, 4.0, 100000)
+        self.assertEqual(controller.batch_size, 200)  # 1000 * 1/4 * 0.8
+
+        for _ in range(10):
+            controller.on_stored(controller.batch_size, 100, 100000)
+        self.assertEqual(controller.batch_size, 10)  # bound
+
+    def test_target_latency(self):
+        controller = BatchController(batch_size=100, wait_max_seconds=10, adaptive=True, target_latency_seconds=5)
+
+        controller.on_stored(100, 1.0, 0)
+        self.assertAlmostEqual(controller.wait_max_seconds, 4.0)
+
+        for _ in range(10):
+            controller.on_stored(100, 10.0, 0)  # smoothed
+        self.assertEqual(controller.wait_max_seconds, 0)
+
+    def test_live_setters(self):
+        controller = BatchController(batch_size=100, wait_max_seconds=10, batch_size_max=500)
+
+        controller.batch_size = 10000
+        self.assertEqual(controller.batch_size, 500)
+        controller.wait_max_seconds = 3
+        self.assertEqual(controller.wait_max_seconds, 3)
+        controller.wait_max_seconds = 3600
+        self.assertEqual(controller.wait_max_seconds, BatchController.MAX_WAIT_MAX_SECONDS)
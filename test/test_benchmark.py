@@ -0,0 +1,59 @@
+import unittest
+
+from benchmark.benchmark_results import BenchmarkResults
+from benchmark.micro_benchmark import BENCHMARKS, measure
+from benchmark.throughput_benchmark import expand_scenarios
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_expand_scenarios(self):
+        scenarios = expand_scenarios([
+            {"name": "grid", "batch_size": [10, 100], "wait_max_seconds": [1, 5]},
+            {"name": "single", "rate": 100},
+        ])
+
+        self.assertEqual(len(scenarios), 5)
+        self.assertEqual(scenarios[0].name, "grid[batch_size=10,wait_max_seconds=1]")
+        self.assertEqual(scenarios[3].batch_size, 100)
+        self.assertEqual(scenarios[3].wait_max_seconds, 5)
+        self.assertEqual(scenarios[4].name, "single")
+        self.assertEqual(scenarios[4].rate, 100)
+
+    def test_compare(self):
+        baseline = BenchmarkResults.create("test", {
+            "a": {"messages_per_second": 1000, "latency_p99_ms": 10},
+            "b": {"messages_per_second": 1000, "latency_p99_ms": 10},
+        })
+        current = BenchmarkResults.create("test", {
+            "a": {"messages_per_second": 900, "latency_p99_ms": 11},  # within tolerance
+            "b": {"messages_per_second": 700, "latency_p99_ms": 20},
+            "c": {"messages_per_second": 1, "latency_p99_ms": 1000},  # not in baseline
+        })
+
+        regressions = BenchmarkResults.compare(current, baseline, ["messages_per_second"], ["latency_p99_ms"], 0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(r.startswith("b:") for r in regressions))
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(BenchmarkResults.percentile(values, 50), 50)
+        self.assertEqual(BenchmarkResults.percentile(values, 99), 99)
+        self.assertIsNone(BenchmarkResults.percentile([], 50))
+
+    def test_micro_benchmarks(self):
+        for name, create_benchmark in BENCHMARKS.items():
+            result = measure(create_benchmark(), rounds=1, min_round_seconds=0)
+            self.assertGreater(result["messages_per_second"], 0, name)
+
+    def test_peak_rss_reset(self):
+        if not BenchmarkResults.reset_peak_rss():
+            self.skipTest("no /proc/self/clear_refs")
+
+        data = bytearray(100 * 1024 * 1024)
+        data[::4096] = b"x" * len(data[::4096])  # resident
+        peak_rss_mb = BenchmarkResults.get_peak_rss_mb()
+        del data
+
+        self.assertTrue(BenchmarkResults.reset_peak_rss())
+        self.assertLess(BenchmarkResults.get_peak_rss_mb(), peak_rss_mb - 50)
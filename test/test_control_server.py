@@ -0,0 +1,87 @@
+import os
+import socket
+import stat
+import threading
+import unittest
+from unittest import mock
+
+from src.control_server import ControlServer
+from src.database import DatabaseConfKey
+from src.message import Message
+from src.proxy_store import ProxyStore
+from test.fake_connection import FakeConnection
+from test.setup_test import SetupTest
+
+
+class TestControlServer(unittest.TestCase):
+
+    def setUp(self):
+        work_dir = SetupTest.ensure_clean_dir(SetupTest.get_test_path("control_server"))
+        self.socket_path = os.path.join(work_dir, "control.sock")
+
+        database_config = SetupTest.get_fake_database_config(**{
+            DatabaseConfKey.BATCH_SIZE: 10, DatabaseConfKey.BATCH_SIZE_MAX: 100,
+        })
+        with mock.patch.object(threading.Thread, "start"):  # no writer thread, methods are called directly
+            self.proxy_store = ProxyStore(database_config)
+        self.proxy_store._message_store._connection = FakeConnection()
+
+        self.control_server = ControlServer(self.socket_path, self.proxy_store, [])
+
+    def tearDown(self):
+        self.control_server.close()
+        self.control_server.join(5)
+
+    def test_status(self):
+        self.proxy_store.queue([Message(message_id=1, topic="a", text="1")])
+
+        response = ControlServer.send(self.socket_path, "status")
+
+        self.assertEqual(response["result"]["store"]["queue_depth"], 1)
+        self.assertEqual(response["result"]["store"]["batch_size"], 10)
+        self.assertEqual(response["result"]["mqtt_listeners"], [])
+        self.assertEqual(stat.S_IMODE(os.stat(self.socket_path).st_mode), 0o600)
+
+    def test_socket_mode_at_bind(self):
+        self.control_server.close()
+        self.control_server.join(5)
+        bind = socket.socket.bind
+        modes = []
+
+        def bind_and_check(sock, address):
+            bind(sock, address)
+            modes.append(stat.S_IMODE(os.stat(address).st_mode))
+
+        umask = os.umask(0o022)
+        try:
+            with mock.patch.object(socket.socket, "bind", bind_and_check):
+                self.control_server = ControlServer(self.socket_path, self.proxy_store, [])
+            self.assertEqual(os.umask(0o022), 0o022)  # restored
+        finally:
+            os.umask(umask)
+
+        self.assertEqual(modes, [0o600])  # no window with a wider mode
+
+    def test_set(self):
+        self.assertEqual(ControlServer.send(self.socket_path, "set batch_size 50"), {"result": {"batch_size": 50}})
+        self.assertEqual(ControlServer.send(self.socket_path, "set batch_size 500"), {"result": {"batch_size": 100}})  # max
+        self.assertEqual(ControlServer.send(self.socket_path, "set wait_max_seconds 2.5"), {"result": {"wait_max_seconds": 2.5}})
+        self.assertEqual(self.proxy_store.batch_controller.wait_max_seconds, 2.5)
+
+        self.assertIn("error", ControlServer.send(self.socket_path, "set batch_size x"))
+        self.assertIn("error", ControlServer.send(self.socket_path, "set timeout 1"))
+        self.assertIn("error", ControlServer.send(self.socket_path, "reboot"))
+
+    def test_flush_and_clean_up(self):
+        self.proxy_store._first_store = False
+        self.proxy_store.queue([Message(message_id=1, topic="a", text="1")])
+        self.assertFalse(self.proxy_store._should_store_messages())
+
+        ControlServer.send(self.socket_path, "flush")
+        self.assertTrue(self.proxy_store._should_store_messages())
+
+        ControlServer.send(self.socket_path, "clean_up")
+        with mock.patch.object(self.proxy_store._message_store, "clean_up") as clean_up:
+            self.assertTrue(self.proxy_store._clean_up())
+            self.assertFalse(self.proxy_store._clean_up())  # once
+        clean_up.assert_called_once()
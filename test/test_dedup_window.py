@@ -0,0 +1,34 @@
+import unittest
+from unittest import mock
+
+from src.dedup_window import DedupWindow
+from src.message import Message
+
+
+class TestDedupWindow(unittest.TestCase):
+
+    def test_duplicates(self):
+        window = DedupWindow(max_age_seconds=60)
+
+        self.assertFalse(window.is_duplicate(Message(message_id=1, topic="a", text="1", qos=1)))
+        self.assertTrue(window.is_duplicate(Message(message_id=1, topic="a", text="1", qos=1)))  # redelivery
+
+        self.assertFalse(window.is_duplicate(Message(message_id=2, topic="a", text="1", qos=1)))
+        self.assertFalse(window.is_duplicate(Message(message_id=1, topic="b", text="1", qos=1)))
+        self.assertFalse(window.is_duplicate(Message(message_id=1, topic="a", text="2", qos=1)))
+
+        self.assertFalse(window.is_duplicate(Message(message_id=0, topic="q", text="0", qos=0)))
+        self.assertFalse(window.is_duplicate(Message(message_id=0, topic="q", text="0", qos=0)))  # QoS 0: never
+
+    def test_eviction(self):
+        window = DedupWindow(max_age_seconds=10, max_size=3)
+
+        with mock.patch("time.monotonic", return_value=100):
+            for i in range(4):
+                window.is_duplicate(Message(message_id=i + 1, topic="a", text="x", qos=1))
+            self.assertEqual(len(window), 3)  # size bound: oldest dropped
+            self.assertFalse(window.is_duplicate(Message(message_id=1, topic="a", text="x", qos=1)))
+
+        with mock.patch("time.monotonic", return_value=111):
+            self.assertFalse(window.is_duplicate(Message(message_id=4, topic="a", text="x", qos=1)))  # expired
+            self.assertEqual(len(window), 1)
@@ -0,0 +1,88 @@
+import datetime
+import unittest
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+from src.journal_migrator import JournalMigrator
+from test.setup_test import SetupTest
+
+
+class TestJournalMigrator(unittest.TestCase):
+
+    def test_add_months(self):
+        time_value = datetime.datetime(2023, 11, 1, tzinfo=datetime.timezone.utc)
+
+        self.assertEqual(JournalMigrator.add_months(time_value, 1), datetime.datetime(2023, 12, 1, tzinfo=datetime.timezone.utc))
+        self.assertEqual(JournalMigrator.add_months(time_value, 2), datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc))
+        self.assertEqual(JournalMigrator.add_months(time_value, 14), datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc))
+
+    def test_partition_bounds(self):
+        zone = ZoneInfo("Europe/Berlin")
+        time_from = datetime.datetime(2023, 2, 17, 13, 5, tzinfo=zone)
+        time_to = datetime.datetime(2023, 5, 1, tzinfo=zone)
+
+        partitions = JournalMigrator.partition_bounds("journal", time_from, time_to)
+
+        self.assertEqual([p[0] for p in partitions], ["journal_y2023m02", "journal_y2023m03", "journal_y2023m04"])
+        self.assertEqual(partitions[0][1], datetime.datetime(2023, 2, 1, tzinfo=zone))
+        self.assertEqual(partitions[1][2].utcoffset(), datetime.timedelta(hours=2))  # local midnight (summer time)
+        for (_, _, partition_to), (_, next_from, _) in zip(partitions, partitions[1:]):
+            self.assertEqual(partition_to, next_from)  # no gaps
+
+
+class TestJournalMigratorDatabase(unittest.TestCase):
+
+    ROW_COUNT = 25
+
+    def setUp(self):
+        SetupTest.init_database(recreate=True)  # the migration replaces the journal table
+        SetupTest.execute_commands([
+            "INSERT INTO journal (topic, text, qos, retain, time) "
+            "SELECT 'topic/' || i, i::text, 1, 0, now() - (i || ' days')::interval FROM generate_series(1, {}) i".format(self.ROW_COUNT)
+        ])
+
+        self.database_params = SetupTest.get_database_params()
+
+    def tearDown(self):
+        SetupTest.close_database(shutdown=True)  # other tests need the flat journal table
+
+    @classmethod
+    def count(cls, table_name: str) -> int:
+        return SetupTest.query_one(f"SELECT count(*) AS count FROM {table_name}")["count"]
+
+    def test_migrate_interrupt_resume(self):
+        with JournalMigrator(self.database_params) as migrator:
+            with mock.patch.object(JournalMigrator, "LOG_INTERVAL_SECONDS", 0), \
+                    mock.patch.object(JournalMigrator, "_log_progress", side_effect=InterruptedError):
+                with self.assertRaises(InterruptedError):
+                    migrator.migrate(chunk_size=10, months_ahead=1)  # interrupted after the first chunk
+
+        self.assertEqual(self.count("journal"), 10)
+        self.assertEqual(SetupTest.query_one("SELECT copied_count, done FROM journal_migration"), {"copied_count": 10, "done": False})
+
+        SetupTest.execute_commands(["INSERT INTO journal (topic, text, qos, retain) VALUES ('topic/new', 'new', 1, 0)"])  # logger
+
+        with JournalMigrator(self.database_params) as migrator:
+            migrator.migrate(chunk_size=10, months_ahead=1)
+            self.assertEqual(migrator.copied_count, self.ROW_COUNT - 10)
+
+        self.assertEqual(self.count("journal"), self.ROW_COUNT + 1)
+        self.assertEqual(self.count("journal_unpartitioned"), self.ROW_COUNT)
+        self.assertEqual(self.count("journal_default"), 0)
+        self.assertEqual(SetupTest.query_one("SELECT copied_count, done FROM journal_migration"), {
+            "copied_count": self.ROW_COUNT, "done": True
+        })
+
+    def test_partition_for_default_rows(self):
+        with JournalMigrator(self.database_params) as migrator:
+            migrator.migrate(months_ahead=1)
+
+            SetupTest.execute_commands([
+                "INSERT INTO journal (topic, text, qos, retain, time) VALUES ('topic/late', 'x', 1, 0, now() + interval '400 days')"
+            ])
+            self.assertEqual(self.count("journal_default"), 1)
+
+            migrator.migrate(months_ahead=15)  # creates the partition of this row
+
+        self.assertEqual(self.count("journal_default"), 0)
+        self.assertEqual(self.count("journal"), self.ROW_COUNT + 1)
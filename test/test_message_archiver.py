@@ -0,0 +1,130 @@
+import csv
+import datetime
+import gzip
+import os
+import threading
+import unittest
+from zoneinfo import ZoneInfo
+
+from tzlocal import get_localzone
+
+from src.database import DatabaseConfKey
+from src.message_archiver import MessageArchiver
+from src.message_exporter import ExportFormat
+from test.setup_test import SetupTest
+
+
+class TestMessageArchiver(unittest.TestCase):
+
+    def setUp(self):
+        self.archive_dir = SetupTest.ensure_clean_dir(SetupTest.get_test_path("archive"))
+
+    def create_archiver(self, **config) -> MessageArchiver:
+        return MessageArchiver(SetupTest.get_fake_database_config(**{
+            DatabaseConfKey.ARCHIVE_DIR: self.archive_dir,
+            **config
+        }), threading.Event())
+
+    def test_archive_file_path(self):
+        archiver = self.create_archiver()
+        day = datetime.date(2023, 1, 2)
+
+        file_path = archiver.get_archive_file_path(day, "smarthome")
+        self.assertEqual(file_path, os.path.join(self.archive_dir, "2023", "01", "02", "smarthome.parquet"))
+
+        os.makedirs(os.path.dirname(file_path))
+        open(file_path, "w").close()
+        self.assertTrue(archiver.get_archive_file_path(day, "smarthome").endswith("smarthome.1.parquet"))  # late rows
+
+        self.assertRegex(os.path.basename(archiver.get_archive_file_path(day, "a b")), r"^a_b-[0-9a-f]{8}\.parquet$")
+        self.assertRegex(os.path.basename(archiver.get_archive_file_path(day, "")), r"^_-[0-9a-f]{8}\.parquet$")
+
+        archiver = self.create_archiver(**{DatabaseConfKey.ARCHIVE_FORMAT: ExportFormat.CSV})
+        self.assertTrue(archiver.get_archive_file_path(day, "other").endswith("other.csv.gz"))
+
+    def test_day_range(self):
+        zone = ZoneInfo("Europe/Berlin")
+        time_limit = datetime.datetime(2023, 3, 27, 12, tzinfo=zone)
+
+        day_from, day_to = MessageArchiver.get_day_range(datetime.date(2023, 3, 26), time_limit)  # DST switch
+        self.assertEqual(day_from, datetime.datetime(2023, 3, 26, tzinfo=zone))
+        self.assertEqual(day_to.timestamp() - day_from.timestamp(), 23 * 3600)
+
+        self.assertIsNone(MessageArchiver.get_day_range(datetime.date(2023, 3, 27), time_limit))  # not expired completely
+
+    def test_throttle(self):
+        stop_event = threading.Event()
+        archiver = MessageArchiver(SetupTest.get_fake_database_config(**{
+            DatabaseConfKey.ARCHIVE_DIR: self.archive_dir,
+            DatabaseConfKey.ARCHIVE_MAX_ROWS_PER_SECOND: 100,
+        }), stop_event)
+        stop_event.set()
+
+        archiver._start_throttle()
+        archiver._chunk_exported(0)  # no wait
+        with self.assertRaises(InterruptedError):  # per chunk, not only per file
+            archiver._chunk_exported(1000)
+
+
+class TestMessageArchiverDatabase(unittest.TestCase):
+
+    def setUp(self):
+        SetupTest.init_database()
+        SetupTest.execute_commands(["delete from journal"])
+
+        self.archive_dir = SetupTest.ensure_clean_dir(SetupTest.get_test_path("archive_database"))
+        self.archiver = MessageArchiver({
+            **SetupTest.get_database_params(),
+            DatabaseConfKey.ARCHIVE_DIR: self.archive_dir,
+            DatabaseConfKey.ARCHIVE_FORMAT: ExportFormat.CSV,  # no `pyarrow` needed
+            DatabaseConfKey.ARCHIVE_MAX_ROWS_PER_SECOND: 0,
+        })
+        self.archiver.connect()
+
+    def tearDown(self):
+        self.archiver.close()
+        SetupTest.close_database()
+
+    @classmethod
+    def insert(cls, topic, time: datetime.datetime):
+        topic = "NULL" if topic is None else "'{}'".format(topic)
+        SetupTest.execute_commands([
+            f"INSERT INTO journal (topic, text, qos, retain, time) VALUES ({topic}, 'x', 1, 0, '{time.isoformat()}'::timestamptz)"
+        ])
+
+    @classmethod
+    def read_rows(cls, file_path):
+        with gzip.open(file_path, "rt") as stream:
+            return list(csv.DictReader(stream))
+
+    def test_archive_day(self):
+        time_now = datetime.datetime.now(tz=get_localzone())
+        day = (time_now - datetime.timedelta(days=30)).date()
+        time_noon = datetime.datetime.combine(day, datetime.time(12), tzinfo=get_localzone())
+        for topic in ["a/1", "a/2", "b", None]:
+            self.insert(topic, time_noon)
+        self.insert("a/1", time_noon + datetime.timedelta(days=1))  # next day
+
+        archived_count = self.archiver.archive_day(*self.archiver.get_day_range(day, time_now))
+
+        self.assertEqual(archived_count, 4)
+        day_dir = os.path.join(self.archive_dir, "{:04d}".format(day.year), "{:02d}".format(day.month), "{:02d}".format(day.day))
+        self.assertEqual(sorted(os.listdir(day_dir)), ["_null.csv.gz", "a.csv.gz", "b.csv.gz"])
+        self.assertEqual([r["topic"] for r in self.read_rows(os.path.join(day_dir, "a.csv.gz"))], ["a/1", "a/2"])
+        self.assertEqual([r["topic"] for r in self.read_rows(os.path.join(day_dir, "_null.csv.gz"))], [""])
+
+        self.assertEqual(SetupTest.query_one("SELECT count(*) AS count FROM journal")["count"], 1)
+
+    def test_archive_topic_root_with_wildcard_characters(self):
+        time_now = datetime.datetime.now(tz=get_localzone())
+        day = (time_now - datetime.timedelta(days=30)).date()
+        time_noon = datetime.datetime.combine(day, datetime.time(12), tzinfo=get_localzone())
+        for topic in ["+/1", "a/1", "#"]:  # no MQTT wildcards within topic names
+            self.insert(topic, time_noon)
+        self.archiver.DELETE_CHUNK_SIZE = 2
+        file_path = self.archiver.get_archive_file_path(day, "+")
+
+        self.assertEqual(self.archiver.archive_day(*self.archiver.get_day_range(day, time_now)), 3)
+
+        self.assertEqual([r["topic"] for r in self.read_rows(file_path)], ["+/1"])
+        self.assertEqual(SetupTest.query_one("SELECT count(*) AS count FROM journal")["count"], 0)
@@ -0,0 +1,55 @@
+import datetime
+import re
+import unittest
+from unittest import mock
+
+from src.message_exporter import ExportFormat, MessageExporter
+from test.setup_test import SetupTest
+
+
+class TestMessageExporter(unittest.TestCase):
+
+    def test_split_time_range(self):
+        time_from = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+        time_to = datetime.datetime(2023, 1, 4, tzinfo=datetime.timezone.utc)
+
+        slices = MessageExporter.split_time_range(time_from, time_to, 3)
+
+        self.assertEqual(len(slices), 3)
+        self.assertEqual(slices[0], (time_from, datetime.datetime(2023, 1, 2, tzinfo=datetime.timezone.utc)))
+        self.assertEqual(slices[1][1], slices[2][0])
+        self.assertEqual(slices[2][1], time_to)
+
+    def test_get_part_file_path(self):
+        self.assertEqual(MessageExporter.get_part_file_path("/tmp/journal.csv.gz", 2), "/tmp/journal.part002.csv.gz")
+        self.assertEqual(MessageExporter.get_part_file_path("journal", 12), "journal.part012")
+
+    def test_export_format(self):
+        self.assertEqual(ExportFormat.from_file_name("a.parquet"), ExportFormat.PARQUET)
+        self.assertEqual(ExportFormat.from_file_name("a.csv.gz"), ExportFormat.CSV)
+
+    def test_topic_condition(self):
+        self.assertEqual(MessageExporter.topic_condition([]).as_string(None), "TRUE")
+        self.assertEqual(MessageExporter.topic_condition(["a/b", "#"]).as_string(None), "TRUE")
+
+        condition = MessageExporter.topic_condition(["a/b", "c/#"]).as_string(None)
+        self.assertEqual(condition, "(topic = 'a/b' OR topic = 'c' OR topic LIKE 'c/%')")
+        self.assertEqual(MessageExporter.topic_condition([None]).as_string(None), "(topic IS NULL)")
+
+        condition = MessageExporter.topic_condition(["a/+/c.d/#"]).as_string(None)
+        regex = re.search(r"topic ~ +E'(.*)'", condition).group(1).replace("\\\\", "\\")  # unescape SQL literal
+        self.assertTrue(re.match(regex, "a/x/c.d"))
+        self.assertTrue(re.match(regex, "a/x/c.d/e/f"))
+        self.assertFalse(re.match(regex, "a/x/y/c.d"))
+        self.assertFalse(re.match(regex, "a/x/cxd"))
+
+    def test_optional_columns(self):
+        exporter = MessageExporter(SetupTest.get_fake_database_config())
+        time_from = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+
+        with mock.patch.object(MessageExporter, "_get_optional_columns", return_value=["value_num", "broker_id"]) as get_optional_columns:
+            statement = exporter._select_statement(time_from, time_from, None, text_columns=True)
+            exporter._select_statement(time_from, time_from, None)
+
+        get_optional_columns.assert_called_once_with("journal")  # cached
+        self.assertIn("Identifier('time'), SQL(', '), Identifier('value_num'), SQL(', '), Identifier('broker_id')", repr(statement))
@@ -0,0 +1,78 @@
+import datetime
+import gzip
+import json
+import unittest
+from unittest import mock
+
+from src.message_importer import MessageImporter
+from src.message_store import MessageStore
+from src.mqtt_client import MqttConfKey
+from test.fake_connection import FakeConnection
+from test.setup_test import SetupTest
+
+
+class TestMessageImporter(unittest.TestCase):
+
+    DATABASE_CONFIG = SetupTest.get_fake_database_config()
+    MQTT_CONFIG = {MqttConfKey.SKIP_SUBSCRIPTION_REGEXES: ["^skip/"], MqttConfKey.FILTER_MESSAGE_ID_0: True}
+
+    def setUp(self):
+        SetupTest.ensure_test_dir()
+
+    @classmethod
+    def write_json_lines(cls, file_name, count, open_func=open):
+        file_path = SetupTest.get_test_path(file_name)
+        with open_func(file_path, "wt") as f:
+            for i in range(count):
+                record = {"topic": f"skip/{i}" if i % 10 == 0 else f"topic/{i}", "payload": str(i), "time": 1600000000 + i, "qos": 1}
+                f.write(json.dumps(record) + "\n")
+            f.write("no json\n")
+            f.write(json.dumps({"topic": "topic/no-time", "payload": "1"}) + "\n")
+        return file_path
+
+    def test_read_json_lines(self):
+        file_path = self.write_json_lines("import.jsonl.gz", 100, gzip.open)
+        importer = MessageImporter(self.DATABASE_CONFIG, self.MQTT_CONFIG)
+
+        messages = list(importer.read_messages(file_path))
+
+        self.assertEqual(len(messages), 90)
+        self.assertEqual(importer.skipped_count, 10)
+        self.assertEqual(importer.invalid_count, 2)
+        self.assertEqual(messages[0].topic, "topic/1")
+        self.assertEqual(messages[0].text, "1")
+        self.assertEqual(messages[0].qos, 1)
+        self.assertEqual(messages[0].time.timestamp(), 1600000001)
+
+    def test_read_csv(self):
+        file_path = SetupTest.get_test_path("import.csv")
+        with open(file_path, "w") as f:
+            f.write("journal_id,topic,text,data,message_id,qos,retain,time\n")
+            f.write('1,topic/1,"{""a"": 1}","{""a"": 1}",5,1,0,2023-01-02 03:04:05.123+01\n')
+            f.write('2,topic/2,text,,0,1,1,2023-01-02 03:04:06+01\n')  # message id 0 is filtered
+
+        importer = MessageImporter(self.DATABASE_CONFIG, self.MQTT_CONFIG)
+        messages = list(importer.read_messages(file_path))
+
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0].text, '{"a": 1}')
+        self.assertEqual(messages[0].message_id, 5)
+        self.assertEqual(messages[0].retain, 0)
+        self.assertEqual(messages[0].time, datetime.datetime(2023, 1, 2, 2, 4, 5, 123000, tzinfo=datetime.timezone.utc))
+
+    def test_import_files(self):
+        file_path = self.write_json_lines("import.jsonl", 1000)
+        connections = []
+
+        def connect(message_store):
+            message_store._connection = FakeConnection()
+            connections.append(message_store._connection)
+
+        with mock.patch.object(MessageStore, "connect", connect):
+            importer = MessageImporter(self.DATABASE_CONFIG, self.MQTT_CONFIG, workers=3, batch_size=100)
+            stored_count = importer.import_files([file_path, file_path])
+
+        self.assertEqual(stored_count, 1800)
+        self.assertEqual(len(connections), 3)
+        self.assertEqual(sum(len(c.copied_rows) for c in connections), 1800)
+        self.assertEqual(sum(c.commit_count for c in connections), 18)
@@ -1,11 +1,15 @@
 import datetime
+import os
 import unittest
+from unittest import mock
 
 from tzlocal import get_localzone
 
-from src.database import DatabaseConfKey
+from src.database import DatabaseConfKey, IngestMode
 from src.message_store import MessageStore
 from src.message import Message
+from src.message_spool import MessageSpool
+from test.fake_connection import FakeConnection
 from test.setup_test import SetupTest
 
 
@@ -147,3 +151,96 @@ class TestMessageStore(unittest.TestCase):
         check_message(1, message1)
         check_message(2, message2)
         check_message(3, message3)
+
+
+class TestMessageStoreFakeConnection(unittest.TestCase):
+
+    @classmethod
+    def create_message_store(cls, **config) -> MessageStore:
+        message_store = MessageStore(SetupTest.get_fake_database_config(**config))
+        message_store._connection = FakeConnection()
+        return message_store
+
+    @classmethod
+    def generate_messages(cls, count):
+        return [
+            Message(message_id=i, topic=f"topic/{i % 3}", text=str(i), qos=i % 3, retain=0, time=datetime.datetime.now(tz=get_localzone()))
+            for i in range(count)
+        ]
+
+    def test_synchronous_commit(self):
+        message_store = self.create_message_store()
+        connection = message_store._connection
+
+        message_store.store(self.generate_messages(10))
+
+        self.assertEqual(connection.copy_count, 1)
+        self.assertEqual(connection.commit_count, 1)
+        self.assertEqual(len(connection.copied_rows), 10)
+        self.assertEqual(connection.statements, [])
+
+    def test_async_commit_split(self):
+        message_store = self.create_message_store(**{
+            DatabaseConfKey.ASYNC_COMMIT_QOS: [0],
+            DatabaseConfKey.ASYNC_COMMIT_TOPIC_REGEXES: ["^topic/2$"],
+        })
+        connection = message_store._connection
+
+        message_store.store(self.generate_messages(9))
+
+        self.assertEqual(connection.copy_count, 2)
+        self.assertEqual(connection.commit_count, 2)
+        self.assertEqual(connection.statements, ["SET LOCAL synchronous_commit = off"])
+        self.assertEqual(len(connection.last_copy.rows), 6)  # async batch: qos 0 or topic/2
+        self.assertTrue(all(row[3] == 1 for row in connection.copied_rows[:3]))  # sync batch first
+
+    def test_staging_ingest_mode(self):
+        message_store = self.create_message_store(**{DatabaseConfKey.INGEST_MODE: IngestMode.STAGING})
+
+        message_store.store(self.generate_messages(3))
+
+        self.assertIn("Identifier('journal_staging')", repr(message_store._connection.last_copy.statement))
+
+    def test_poison_rows_isolated(self):
+        dead_letter_file = os.path.join(SetupTest.ensure_clean_dir(SetupTest.get_test_path("dead_letter")), "dead.jsonl")
+        message_store = self.create_message_store(**{DatabaseConfKey.DEAD_LETTER_FILE: dead_letter_file})
+        connection = FakeConnection(reject_row=lambda row: row[0] in [5, 11])
+        message_store._connection = connection
+
+        message_store.store(self.generate_messages(16))
+
+        self.assertEqual([row[0] for row in connection.copied_rows], [i for i in range(16) if i not in [5, 11]])
+        self.assertEqual(connection.commit_count, 1)
+        self.assertEqual(connection.rollback_count, 1)
+        self.assertLessEqual(connection.savepoint_count, 2 * 2 * 4)  # O(k log n)
+
+        dead_letters = MessageSpool(dead_letter_file).load()
+        self.assertEqual([m.message_id for m in dead_letters], [5, 11])
+
+    def test_value_columns(self):
+        message_store = self.create_message_store(**{DatabaseConfKey.VALUE_COLUMNS: True})
+        messages = [Message(message_id=1, topic="a", text="1.5"), Message(message_id=2, topic="a", text='{"value": true}')]
+
+        message_store.store(messages)
+
+        connection = message_store._connection
+        self.assertIn("Identifier('value_num')", repr(connection.last_copy.statement))
+        self.assertEqual([row[6:] for row in connection.copied_rows], [(1.5, None), (None, True)])
+
+    def test_value_extraction_errors_ignored(self):
+        message_store = self.create_message_store(**{DatabaseConfKey.VALUE_COLUMNS: True})
+
+        with mock.patch.object(message_store._value_extractor, "extract", side_effect=RuntimeError("broken")):
+            message_store.store([Message(message_id=1, topic="a", text="1.5")])
+
+        self.assertEqual([row[6:] for row in message_store._connection.copied_rows], [(None, None)])
+
+    def test_broker_id_column(self):
+        message_store = self.create_message_store(**{DatabaseConfKey.VALUE_COLUMNS: True, DatabaseConfKey.BROKER_ID_COLUMN: True})
+        messages = [Message(message_id=1, topic="a", text="1.5", broker_id="site1"), Message(message_id=2, topic="a", text="x")]
+
+        message_store.store(messages)
+
+        connection = message_store._connection
+        self.assertIn("Identifier('broker_id')", repr(connection.last_copy.statement))
+        self.assertEqual([row[6:] for row in connection.copied_rows], [(1.5, None, "site1"), (None, None, None)])
@@ -0,0 +1,55 @@
+import time
+import unittest
+
+from src.mqtt_client import MqttConfKey
+from src.mqtt_listener import MqttListener
+from test.mqtt_broker import MqttBroker, topic_matches
+from test.mqtt_publisher import MqttPublisher
+
+
+class TestMqttBroker(unittest.TestCase):
+
+    def test_topic_matches(self):
+        self.assertTrue(topic_matches("a/b", "a/b"))
+        self.assertTrue(topic_matches("a/#", "a/b/c"))
+        self.assertTrue(topic_matches("a/#", "a"))
+        self.assertTrue(topic_matches("a/+/c", "a/b/c"))
+        self.assertTrue(topic_matches("#", "a/b"))
+
+        self.assertFalse(topic_matches("a/b", "a/b/c"))
+        self.assertFalse(topic_matches("a/+", "a/b/c"))
+        self.assertFalse(topic_matches("a/+/c", "a/b/d"))
+
+    def test_publish_subscribe(self):
+        with MqttBroker() as broker:
+            broker.publish("base/retained", b"retained", qos=1, retain=True)
+
+            config = {
+                MqttConfKey.HOST: broker.host,
+                MqttConfKey.PORT: broker.port,
+                MqttConfKey.SUBSCRIPTIONS: ["base/#"],
+                MqttConfKey.SKIP_SUBSCRIPTION_REGEXES: ["^base/skip"],
+            }
+            listener = MqttListener(config)
+            listener.connect()
+
+            publisher = MqttPublisher({**config, MqttConfKey.CLIENT_ID: MqttPublisher.get_default_client_id()})
+            publisher.connect()
+            try:
+                while not publisher.is_connected:
+                    time.sleep(0.01)
+
+                for topic in ["base/1", "base/skip", "other/1", "base/2"]:
+                    publisher.publish(topic, topic)
+
+                messages = []
+                time_end = time.monotonic() + 5
+                while len(messages) < 3 and time.monotonic() < time_end:
+                    messages.extend(listener.get_messages())
+                    time.sleep(0.01)
+            finally:
+                publisher.close()
+                listener.close()
+
+        self.assertEqual([m.text for m in messages], ["retained", "base/1", "base/2"])
+        self.assertEqual(messages[0].retain, 1)
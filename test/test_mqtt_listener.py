@@ -1,10 +1,17 @@
+import time
 import unittest
 from unittest import mock
 from unittest.mock import MagicMock
 
+from paho.mqtt.client import MQTTMessage
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
 from src.lifecycle_control import LifecycleControl
+from src.memory_budget import MemoryBudget
 from src.mqtt_client import MqttConfKey, MqttException
 from src.mqtt_listener import MqttListener
+from test.mqtt_broker import MqttBroker
 from test.setup_test import SetupTest
 
 
@@ -108,3 +115,174 @@ class TestMqttListenerConnectionErrors(unittest.TestCase):
             listener.connect()
 
         self.assertFalse(listener.is_connected)
+
+
+class TestMqttListenerReload(unittest.TestCase):
+
+    @classmethod
+    def wait_for_messages(cls, listener, count):
+        messages = []
+        time_end = time.monotonic() + 5
+        while len(messages) < count and time.monotonic() < time_end:
+            messages.extend(listener.get_messages())
+            time.sleep(0.01)
+        return messages
+
+    @mock.patch.object(LifecycleControl, "_instance", None)  # real `sleep` (other tests replace it)
+    def test_reload_subscriptions(self):
+        with MqttBroker() as broker:
+            config = {
+                MqttConfKey.HOST: broker.host,
+                MqttConfKey.PORT: broker.port,
+                MqttConfKey.SUBSCRIPTIONS: ["a/#", "b/#"],
+            }
+            listener = MqttListener(config)
+            listener.connect()
+            try:
+                listener.reload({**config, MqttConfKey.SUBSCRIPTIONS: ["b/#", "c/#"], MqttConfKey.SKIP_SUBSCRIPTION_REGEXES: ["^c/skip"]})
+
+                time_end = time.monotonic() + 5
+                while broker.subscriptions != {"b/#", "c/#"} and time.monotonic() < time_end:
+                    time.sleep(0.01)
+                self.assertEqual(broker.subscriptions, {"b/#", "c/#"})
+
+                for topic in ["a/1", "b/1", "c/skip", "c/1"]:
+                    broker.publish(topic, topic.encode("utf-8"), qos=1)
+
+                messages = self.wait_for_messages(listener, 2)
+            finally:
+                listener.close()
+
+        self.assertEqual([m.topic for m in messages], ["b/1", "c/1"])
+
+
+class TestMqttListenerSubscriptionIdentifiers(unittest.TestCase):
+
+    @classmethod
+    def create_mqtt_message(cls, topic, subscription_id, content_type=None):
+        mqtt_message = MQTTMessage(mid=1, topic=topic.encode("utf-8"))
+        mqtt_message.payload = b"{}"
+        mqtt_message.properties = Properties(PacketTypes.PUBLISH)
+        mqtt_message.properties.SubscriptionIdentifier = subscription_id
+        if content_type:
+            mqtt_message.properties.UserProperty = ("Content-Type", content_type)
+        return mqtt_message
+
+    def test_subscription_filters(self):
+        listener = MqttListener({
+            MqttConfKey.HOST: "localhost",
+            MqttConfKey.PORT: 1883,
+            MqttConfKey.PROTOCOL: 5,
+            MqttConfKey.SUBSCRIPTIONS: ["a/#", "b/#"],
+            MqttConfKey.SKIP_SUBSCRIPTION_REGEXES: ["^b/skip"],
+        })
+        subscription_id_a = listener._subscription_ids["a/#"]
+        subscription_id_b = listener._subscription_ids["b/#"]
+        self.assertFalse(listener._subscription_filters[subscription_id_a])  # no regex check for "a/#"
+
+        listener._on_message(None, None, self.create_mqtt_message("a/1", subscription_id_a, "application/json"))
+        listener._on_message(None, None, self.create_mqtt_message("b/skip", subscription_id_b))
+        listener._on_message(None, None, self.create_mqtt_message("b/1", 99))  # unknown id => full filter
+
+        messages = listener.get_messages()
+        self.assertEqual([m.topic for m in messages], ["a/1", "b/1"])
+        self.assertEqual(messages[0].content_type, "application/json")
+
+        listener.reload({MqttConfKey.SUBSCRIPTIONS: ["b/#", "c/#"]})
+        self.assertEqual(listener._subscription_ids["b/#"], subscription_id_b)  # kept
+        self.assertNotIn(listener._subscription_ids["c/#"], [subscription_id_a, subscription_id_b])
+
+        # the topic filter and the subscription filters got replaced together
+        listener._on_message(None, None, self.create_mqtt_message("b/skip", subscription_id_b))
+        listener._on_message(None, None, self.create_mqtt_message("b/skip", 99))
+        self.assertEqual([m.topic for m in listener.get_messages()], ["b/skip", "b/skip"])
+
+
+class TestMqttListenerReconnect(unittest.TestCase):
+
+    @mock.patch.object(LifecycleControl, "_instance", None)  # real `sleep` (other tests replace it)
+    def test_reconnect_and_resubscribe(self):
+        with MqttBroker() as broker:
+            listener = MqttListener({
+                MqttConfKey.HOST: broker.host,
+                MqttConfKey.PORT: broker.port,
+                MqttConfKey.CLIENT_ID: "test-reconnect",
+                MqttConfKey.SUBSCRIPTIONS: ["a/#"],
+                MqttConfKey.RECONNECT: True,
+            })
+            self.assertFalse(listener._clean_session)  # persistent session by default
+
+            listener.connect()
+            try:
+                broker.disconnect_clients()  # network failure
+                time_end = time.monotonic() + 5
+                while listener.is_connected and time.monotonic() < time_end:
+                    time.sleep(0.01)
+                self.assertFalse(listener.is_connected)
+
+                time_end = time.monotonic() + 10
+                while not listener.is_connected and time.monotonic() < time_end:
+                    listener.ensure_connection()  # no exception, resubscribes after the reconnect
+                    time.sleep(0.01)
+                self.assertTrue(listener.is_connected)
+
+                time_end = time.monotonic() + 5
+                while broker.subscriptions != {"a/#"} and time.monotonic() < time_end:
+                    time.sleep(0.01)
+                broker.publish("a/1", b"1", qos=1)
+
+                messages = TestMqttListenerReload.wait_for_messages(listener, 1)
+            finally:
+                listener.close()
+
+        self.assertEqual([m.topic for m in messages], ["a/1"])
+
+    def test_persistent_session_needs_client_id(self):
+        config = {MqttConfKey.HOST: "localhost", MqttConfKey.PORT: 1883, MqttConfKey.SUBSCRIPTIONS: ["a/#"]}
+
+        self.assertTrue(MqttListener({**config, MqttConfKey.RECONNECT: True})._clean_session)
+        with self.assertRaises(ValueError):
+            MqttListener({**config, MqttConfKey.CLEAN_SESSION: False})
+
+
+class TestMqttListenerMemoryBudget(unittest.TestCase):
+
+    def test_budget_accounting(self):
+        memory_budget = MemoryBudget(3 * (MemoryBudget.MESSAGE_OVERHEAD_BYTES + 5))  # topic "a/0" + payload "xx"
+        listener = MqttListener({MqttConfKey.HOST: "localhost", MqttConfKey.PORT: 1883, MqttConfKey.SUBSCRIPTIONS: ["a/#"]}, memory_budget)
+
+        for i in range(5):
+            mqtt_message = MQTTMessage(mid=i + 1, topic=f"a/{i}".encode("utf-8"))
+            mqtt_message.payload = b"xx"
+            listener._on_message(None, None, mqtt_message)
+
+        self.assertEqual(memory_budget.used_bytes, 3 * (MemoryBudget.MESSAGE_OVERHEAD_BYTES + 5))
+        self.assertEqual(memory_budget.dropped_count, 2)
+
+        messages = listener.get_messages()
+        self.assertEqual([m.topic for m in messages], ["a/0", "a/1", "a/2"])
+        self.assertEqual(memory_budget.used_bytes, 0)  # handed over
+
+
+class TestMqttListenerDedup(unittest.TestCase):
+
+    def test_redelivery_of_dropped_message(self):
+        memory_budget = MemoryBudget(MemoryBudget.MESSAGE_OVERHEAD_BYTES + 5)  # one message: topic "a/0" + payload "xx"
+        listener = MqttListener({
+            MqttConfKey.HOST: "localhost", MqttConfKey.PORT: 1883, MqttConfKey.SUBSCRIPTIONS: ["a/#"],
+            MqttConfKey.DEDUP_WINDOW_SECONDS: 60,
+        }, memory_budget)
+
+        def receive(mid):
+            mqtt_message = MQTTMessage(mid=mid, topic=b"a/0")
+            mqtt_message.payload = b"xx"
+            mqtt_message.qos = 1
+            listener._on_message(None, None, mqtt_message)
+
+        receive(1)
+        receive(2)  # budget exhausted: dropped
+        self.assertEqual([m.message_id for m in listener.get_messages()], [1])
+
+        receive(2)  # redelivery of the dropped message
+        receive(1)  # duplicate
+        self.assertEqual([m.message_id for m in listener.get_messages()], [2])
@@ -0,0 +1,30 @@
+import subprocess
+import sys
+import unittest
+
+from src import mqtt_pg_logger
+from src.journal_migrator import JournalMigrator
+from src.message_exporter import ExportFormat, MessageExporter
+from src.message_importer import MessageImporter
+from test.setup_test import SetupTest
+
+
+class TestCommandLine(unittest.TestCase):
+
+    def test_defaults(self):
+        self.assertEqual(mqtt_pg_logger.IMPORT_DEFAULT_WORKERS, MessageImporter.DEFAULT_WORKERS)
+        self.assertEqual(mqtt_pg_logger.IMPORT_DEFAULT_BATCH_SIZE, MessageImporter.DEFAULT_BATCH_SIZE)
+        self.assertEqual(mqtt_pg_logger.EXPORT_FORMAT_CHOICES, ExportFormat.CHOICES)
+        self.assertEqual(mqtt_pg_logger.EXPORT_DEFAULT_ROW_GROUP_SIZE, MessageExporter.DEFAULT_ROW_GROUP_SIZE)
+        self.assertEqual(mqtt_pg_logger.MIGRATE_DEFAULT_CHUNK_SIZE, JournalMigrator.DEFAULT_CHUNK_SIZE)
+        self.assertEqual(mqtt_pg_logger.MIGRATE_DEFAULT_MONTHS_AHEAD, JournalMigrator.DEFAULT_MONTHS_AHEAD)
+
+    def test_modules_imported_on_demand(self):
+        code = "import sys; import src.mqtt_pg_logger; print(' '.join(m for m in sys.modules if m.startswith('src.')))"
+        output = subprocess.run([sys.executable, "-c", code], cwd=SetupTest.get_project_dir(), capture_output=True, check=True, text=True)
+        modules = output.stdout.split()
+
+        self.assertIn("src.app_config", modules)
+        for module in ["src.control_server", "src.journal_migrator", "src.message_exporter", "src.message_importer",
+                       "src.message_store", "src.runner"]:
+            self.assertNotIn(module, modules)
@@ -0,0 +1,62 @@
+import unittest
+
+from src.database import DatabaseConfKey
+from src.message import Message
+from src.priority_queues import PriorityQueues
+
+
+class TestPriorityQueues(unittest.TestCase):
+
+    @classmethod
+    def create_queues(cls, messages, priority_classes=None) -> PriorityQueues:
+        queues = PriorityQueues({DatabaseConfKey.PRIORITY_CLASSES: priority_classes})
+        for message in messages:
+            queues.append(message)
+        return queues
+
+    @classmethod
+    def messages(cls, prefix, count):
+        return [Message(topic=prefix + "/x", text="{}{}".format(prefix, i)) for i in range(count)]
+
+    def test_single_fifo(self):
+        queues = self.create_queues(self.messages("a", 5))
+        self.assertFalse(queues.has_classes)
+        self.assertEqual([m.text for m in queues.pop_batch(3)], ["a0", "a1", "a2"])
+        self.assertEqual(len(queues), 2)
+
+    def test_weighted_batch(self):
+        queues = self.create_queues(self.messages("tele", 20) + self.messages("alarm", 20), [
+            {"name": "alarm", "topic_regexes": ["^alarm/"], "weight": 3},
+            {"name": "telemetry", "weight": 1},
+        ])
+
+        batch = queues.pop_batch(8)
+        self.assertEqual([m.text for m in batch], ["alarm0", "alarm1", "alarm2", "alarm3", "alarm4", "alarm5", "tele0", "tele1"])
+        self.assertEqual(queues.depths(), {"alarm": 14, "telemetry": 18})
+
+        queues.put_back(batch)
+        self.assertEqual(queues.depths(), {"alarm": 20, "telemetry": 20})
+        self.assertEqual(next(iter(queues)).text, "alarm0")
+
+    def test_top_up_by_priority(self):
+        queues = self.create_queues(self.messages("tele", 20) + self.messages("alarm", 2), [
+            {"name": "alarm", "topic_regexes": ["^alarm/"], "weight": 3},
+        ])
+        self.assertEqual(queues.depths(), {"alarm": 2, "default": 20})
+
+        self.assertEqual(len(queues.pop_batch(8)), 8)
+        self.assertEqual(queues.depths(), {"alarm": 0, "default": 14})
+
+    def test_shed_lowest_first(self):
+        queues = self.create_queues(self.messages("a", 3) + self.messages("b", 3) + self.messages("c", 3), [
+            {"name": "a", "topic_regexes": ["^a/"]}, {"name": "b", "topic_regexes": ["^b/"]}, {"name": "c"},
+        ])
+
+        released_bytes, dropped_count = queues.shed(1, below_index=2)
+        self.assertEqual((released_bytes, dropped_count), (0, 0))  # nothing below the lowest class
+
+        _, dropped_count = queues.shed(4 * 400, below_index=0)
+        self.assertEqual(dropped_count, 4)
+        self.assertEqual(queues.depths(), {"a": 3, "b": 2, "c": 0})
+        self.assertEqual([m.text for m in queues.pop_all()], ["a0", "a1", "a2", "b1", "b2"])
+        self.assertEqual(len(queues), 0)
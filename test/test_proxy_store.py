@@ -0,0 +1,231 @@
+import datetime
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+from psycopg import errors
+from tzlocal import get_localzone
+
+from src.database import DatabaseConfKey
+from src.memory_budget import MemoryBudget, OverflowPolicy
+from src.message import Message
+from src.message_store import MessageStore, PartialStoreException
+from src.proxy_store import ProxyStore
+from test.fake_connection import FakeConnection
+from test.setup_test import SetupTest
+
+
+class FailingConnection(FakeConnection):
+
+    def cursor(self, *args, **kwargs):
+        raise RuntimeError("database is gone")
+
+
+class AbortingConnection(FakeConnection):
+    """The first COPY fails (e.g. a timeout), afterwards any statement fails until the rollback (like a server)"""
+
+    def __init__(self):
+        super().__init__()
+        self.copy_failures = 1
+        self.aborted = False
+
+    def cursor(self, *args, **kwargs):
+        if self.aborted:
+            raise errors.InFailedSqlTransaction("current transaction is aborted (fake)")
+        if self.copy_failures:
+            self.copy_failures -= 1
+            self.aborted = True
+            raise errors.QueryCanceled("statement timeout (fake)")
+        return super().cursor(*args, **kwargs)
+
+    def rollback(self):
+        super().rollback()
+        self.aborted = False
+
+
+class FailingAfterFirstCopyConnection(FakeConnection):
+
+    def cursor(self, *args, **kwargs):
+        if self.copy_count:
+            raise RuntimeError("database is gone")
+        return super().cursor(*args, **kwargs)
+
+
+class TestProxyStore(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = SetupTest.ensure_clean_dir(SetupTest.get_test_path("proxy_store"))
+        self.spool_file = os.path.join(self.work_dir, "spool.jsonl")
+
+    def create_proxy_store(self, connection: FakeConnection, memory_budget=None, **config) -> ProxyStore:
+        database_config = SetupTest.get_fake_database_config(**{
+            DatabaseConfKey.BATCH_SIZE: 10, DatabaseConfKey.BATCH_SIZE_MAX: 100, DatabaseConfKey.SPOOL_FILE: self.spool_file,
+            **config
+        })
+        with mock.patch.object(threading.Thread, "start"):  # no writer thread, methods are called directly
+            proxy_store = ProxyStore(database_config, memory_budget)
+        proxy_store._message_store._connection = connection
+        return proxy_store
+
+    def wait_for(self, condition):
+        time_end = time.monotonic() + 5
+        while not condition() and time.monotonic() < time_end:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    @classmethod
+    def generate_messages(cls, count):
+        time_now = datetime.datetime.now(tz=get_localzone())
+        return [Message(message_id=i + 1, topic=f"topic/{i:05d}", text=f"{i:05d}", qos=1, retain=0, time=time_now) for i in range(count)]
+
+    def test_drain_max_size_batches(self):
+        connection = FakeConnection()
+        proxy_store = self.create_proxy_store(connection)
+        proxy_store.queue(self.generate_messages(250))
+
+        proxy_store._drain()
+
+        self.assertEqual(len(connection.copied_rows), 250)
+        self.assertEqual(connection.copy_count, 3)  # batch_size_max, not batch_size
+        self.assertFalse(os.path.exists(self.spool_file))
+
+    def test_drain_after_failed_store(self):
+        connection = AbortingConnection()
+        proxy_store = self.create_proxy_store(connection)
+        proxy_store.queue(self.generate_messages(20))
+
+        with self.assertRaises(errors.QueryCanceled):
+            proxy_store._store_messages()
+        proxy_store._drain()
+
+        self.assertEqual(len(connection.copied_rows), 20)
+        self.assertFalse(os.path.exists(self.spool_file))
+
+    def test_spool_and_replay(self):
+        proxy_store = self.create_proxy_store(FailingConnection())
+        messages = self.generate_messages(20)
+        proxy_store.queue(messages)
+
+        proxy_store._drain()
+        self.assertTrue(os.path.exists(self.spool_file))
+
+        connection = FakeConnection()
+        proxy_store = self.create_proxy_store(connection)
+        proxy_store._replay_spool()
+
+        self.assertFalse(os.path.exists(self.spool_file))
+        self.assertEqual(len(connection.copied_rows), 20)
+        self.assertEqual([row[1] for row in connection.copied_rows], [m.topic for m in messages])
+
+    def test_memory_budget_ignored_while_closing(self):
+        proxy_store = self.create_proxy_store(FakeConnection(), **{DatabaseConfKey.MEMORY_BUDGET_MB: 0.001})
+        proxy_store.close()
+
+        proxy_store.queue(self.generate_messages(20))
+
+        self.assertEqual(len(proxy_store._messages), 20)
+
+    def test_memory_budget_drop_newest(self):
+        messages = self.generate_messages(20)
+        budget_bytes = sum(MemoryBudget.message_size(m) for m in messages[:10])
+        memory_budget = MemoryBudget(budget_bytes, OverflowPolicy.DROP_NEWEST)
+        connection = FakeConnection()
+        proxy_store = self.create_proxy_store(connection, memory_budget=memory_budget)
+
+        proxy_store.queue(messages)
+        self.assertEqual([m.message_id for m in proxy_store._messages], list(range(1, 11)))
+        self.assertEqual(memory_budget.used_bytes, budget_bytes)
+        self.assertEqual(memory_budget.dropped_count, 10)
+
+        proxy_store._store_messages()
+        self.assertEqual(memory_budget.used_bytes, 0)  # released after storing
+
+    def test_memory_budget_drop_oldest(self):
+        messages = self.generate_messages(20)
+        budget_bytes = sum(MemoryBudget.message_size(m) for m in messages[:10])
+        memory_budget = MemoryBudget(budget_bytes, OverflowPolicy.DROP_OLDEST)
+        proxy_store = self.create_proxy_store(FakeConnection(), memory_budget=memory_budget)
+
+        proxy_store.queue(messages)
+        self.assertEqual([m.message_id for m in proxy_store._messages], list(range(11, 21)))
+        self.assertEqual(memory_budget.used_bytes, budget_bytes)
+        self.assertEqual(memory_budget.dropped_count, 10)
+
+    def test_queue_limit_without_memory_budget(self):
+        proxy_store = self.create_proxy_store(FakeConnection(), **{DatabaseConfKey.MEMORY_BUDGET_MB: 0})
+
+        with mock.patch.object(ProxyStore, "QUEUE_LIMIT", 5):
+            proxy_store.queue(self.generate_messages(20))
+            self.assertEqual([m.message_id for m in proxy_store._messages], list(range(1, 6)))
+
+            proxy_store.close()  # closing: no limit to drain the listener
+            proxy_store.queue(self.generate_messages(20))
+            self.assertEqual(len(proxy_store._messages), 25)
+
+    def test_split_batch_retries_only_uncommitted(self):
+        messages = self.generate_messages(10)
+        for m in messages[::2]:
+            m.qos = 0
+        memory_budget = MemoryBudget(None)
+        connection = FailingAfterFirstCopyConnection()  # the asynchronous COPY fails
+        proxy_store = self.create_proxy_store(connection, memory_budget=memory_budget, **{DatabaseConfKey.ASYNC_COMMIT_QOS: [0]})
+        proxy_store.queue(messages)
+
+        with self.assertRaises(PartialStoreException):
+            proxy_store._store_messages()
+
+        self.assertEqual(len(connection.copied_rows), 5)  # sync part committed
+        self.assertEqual([m.message_id for m in proxy_store._messages], [m.message_id for m in messages[::2]])
+        self.assertEqual(memory_budget.used_bytes, sum(MemoryBudget.message_size(m) for m in messages[::2]))
+
+    def test_priority_shedding(self):
+        time_now = datetime.datetime.now(tz=get_localzone())
+        telemetry = [Message(message_id=i + 1, topic="tele/x", text="1", qos=1, time=time_now) for i in range(10)]
+        alarms = [Message(message_id=i + 11, topic="alarm/", text="1", qos=1, time=time_now) for i in range(5)]
+        budget_bytes = sum(MemoryBudget.message_size(m) for m in telemetry)
+        memory_budget = MemoryBudget(budget_bytes, OverflowPolicy.DROP_NEWEST)
+        proxy_store = self.create_proxy_store(FakeConnection(), memory_budget=memory_budget, **{
+            DatabaseConfKey.PRIORITY_CLASSES: [{"name": "alarm", "topic_regexes": ["^alarm"]}, {"name": "telemetry"}]
+        })
+
+        proxy_store.queue(telemetry + alarms)  # full: alarms displace the oldest telemetry
+        self.assertEqual([m.message_id for m in proxy_store._messages], list(range(11, 16)) + list(range(6, 11)))
+        self.assertEqual(memory_budget.dropped_count, 5)
+
+        proxy_store.queue(telemetry[:1])  # lowest class: dropped itself
+        self.assertEqual(len(proxy_store._messages), 10)
+        self.assertEqual(memory_budget.dropped_count, 6)
+
+    def test_first_store_immediately(self):
+        connection = FakeConnection()
+        proxy_store = self.create_proxy_store(connection)
+
+        proxy_store.queue(self.generate_messages(1))
+        self.assertTrue(proxy_store._should_store_messages())  # no waiting for a full batch after start
+        proxy_store._store_messages()
+
+        proxy_store.queue(self.generate_messages(1))
+        self.assertFalse(proxy_store._should_store_messages())
+
+    def test_connection_rotation(self):
+        old_connection = FakeConnection()
+        proxy_store = self.create_proxy_store(old_connection, **{DatabaseConfKey.CONNECTION_ROTATION_SECONDS: 60})
+        message_store = proxy_store._message_store
+        message_store._last_connect_time = ProxyStore._now() - datetime.timedelta(seconds=61)
+
+        new_connection = FakeConnection()
+        with mock.patch.object(MessageStore, "create_connection", return_value=new_connection):
+            self.assertFalse(proxy_store._rotate_connection())  # standby gets created in background
+            self.wait_for(lambda: proxy_store._standby_connection is not None)
+
+            self.assertIs(message_store._connection, old_connection)
+            self.assertTrue(proxy_store._rotate_connection())  # switched between batches
+
+        self.assertIs(message_store._connection, new_connection)
+        self.wait_for(lambda: old_connection.closed)  # closed asynchronously
+
+        self.wait_for(lambda: proxy_store._rotation_thread is None)
+        self.assertFalse(proxy_store._rotate_connection())  # not due
+        self.assertIsNone(proxy_store._rotation_thread)
@@ -0,0 +1,69 @@
+import unittest
+from unittest import mock
+
+from src.message import Message
+from src.metrics import Metrics
+from src.rate_limiter import RateLimiter, RateLimitMode
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        Metrics.reset()
+
+    def tearDown(self):
+        Metrics.reset()
+
+    @classmethod
+    def accept(cls, limiter, topics, now):
+        with mock.patch("time.monotonic", return_value=now):
+            return [limiter.accept(Message(topic=t, text="x")) for t in topics]
+
+    def test_drop(self):
+        limiter = RateLimiter([{"topic_regex": "^flood/", "rate": 1, "burst": 2}])
+
+        self.assertEqual(self.accept(limiter, ["flood/a"] * 3 + ["flood/b", "other"] * 2, 100), [
+            True, True, False, True, True, True, True
+        ])
+        self.assertEqual(Metrics.get_all("rate_limit.dropped."), {"rate_limit.dropped.^flood/": 1})
+
+        self.assertEqual(self.accept(limiter, ["flood/a"] * 2, 101.5), [True, False])  # refilled 1.5 tokens
+
+    def test_shared_bucket(self):
+        limiter = RateLimiter([{"topic_regex": "^flood/", "rate": 2, "per_topic": False}])
+
+        self.assertEqual(self.accept(limiter, ["flood/a", "flood/b", "flood/c"], 100), [True, True, False])
+
+    def test_sample(self):
+        limiter = RateLimiter([{"topic_regex": "^flood/", "rate": 1, "mode": RateLimitMode.SAMPLE, "sample_every": 3}])
+
+        self.assertEqual(self.accept(limiter, ["flood/a"] * 7, 100), [True, False, False, True, False, False, True])
+        self.assertEqual(Metrics.get("rate_limit.dropped.^flood/"), 4)
+
+    def test_aggregate(self):
+        limiter = RateLimiter([{"topic_regex": "^flood/", "rate": 1, "mode": RateLimitMode.AGGREGATE}])
+
+        with mock.patch("time.monotonic", return_value=100):
+            self.assertTrue(limiter.accept(Message(topic="flood/a", text="1")))
+            self.assertFalse(limiter.accept(Message(topic="flood/a", text="2")))
+            self.assertFalse(limiter.accept(Message(topic="flood/a", text="3")))
+            self.assertEqual(limiter.pop_pending(), [])
+
+        with mock.patch("time.monotonic", return_value=101):
+            self.assertFalse(limiter.accept(Message(topic="flood/a", text="4")))  # after the kept back one
+            self.assertEqual([m.text for m in limiter.pop_pending()], ["4"])
+            self.assertEqual(limiter.pop_pending(), [])
+
+        self.assertEqual(Metrics.get("rate_limit.dropped.^flood/"), 2)
+
+    def test_no_rules(self):
+        limiter = RateLimiter(None)
+        self.assertFalse(limiter)
+        self.assertEqual(self.accept(limiter, ["a"] * 3, 100), [True] * 3)
+
+    def test_metrics_per_rule(self):
+        limiter = RateLimiter([{"topic_regex": "^flood/", "rate": 1}])
+
+        self.accept(limiter, [f"flood/{i}" for i in range(100) for _ in range(2)], 100)
+
+        self.assertEqual(Metrics.get_all("rate_limit."), {"rate_limit.dropped.^flood/": 100})  # not a metric per topic
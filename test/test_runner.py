@@ -0,0 +1,66 @@
+import datetime
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+from tzlocal import get_localzone
+
+from src.database import DatabaseConfKey
+from src.message import Message
+from src.message_spool import MessageSpool
+from src.mqtt_client import MqttConfKey
+from src.mqtt_listener import MqttListener
+from src.runner import Runner
+from test.setup_test import SetupTest
+
+
+class TestRunner(unittest.TestCase):
+
+    @classmethod
+    def create_app_config(cls, control_config, **database_config):
+        app_config = mock.Mock()
+        app_config.get_database_config.return_value = SetupTest.get_fake_database_config(**{
+            DatabaseConfKey.PORT: 1, DatabaseConfKey.SHUTDOWN_DRAIN_SECONDS: 0, **database_config
+        })
+        app_config.get_mqtt_configs.return_value = [
+            {MqttConfKey.HOST: "localhost", MqttConfKey.PORT: 1883, MqttConfKey.SUBSCRIPTIONS: ["test/#"]}
+        ]
+        app_config.get_control_config.return_value = control_config
+        return app_config
+
+    @mock.patch.object(MqttListener, "connect")
+    def test_failed_start_stops_started_threads(self, _):
+        socket_path = SetupTest.get_test_path("missing_dir/control.sock")  # bind fails
+        app_config = self.create_app_config({"socket_path": socket_path})
+
+        with self.assertRaises(OSError):
+            Runner(app_config)
+
+        self.assertEqual([t.name for t in threading.enumerate() if t.name == "ProxyStore"], [])
+
+    @mock.patch.dict(sys.modules, {"pyarrow": None})  # not installed
+    def test_missing_pyarrow_before_threads(self):
+        app_config = self.create_app_config({}, **{DatabaseConfKey.ARCHIVE_DIR: SetupTest.get_test_path("archive")})
+
+        with mock.patch("src.runner.ProxyStore") as proxy_store:
+            with self.assertRaises(RuntimeError):
+                Runner(app_config)
+        proxy_store.assert_not_called()
+
+    @mock.patch.object(MqttListener, "connect")
+    def test_close_spools_if_store_died(self, _):
+        work_dir = SetupTest.ensure_clean_dir(SetupTest.get_test_path("runner"))
+        spool_file = os.path.join(work_dir, "spool.jsonl")
+        app_config = self.create_app_config({}, **{DatabaseConfKey.SPOOL_FILE: spool_file})
+
+        runner = Runner(app_config)  # no database => store thread dies
+        runner._store.join(10)
+        self.assertFalse(runner._store.is_alive())
+
+        message = Message(message_id=1, topic="a", text="1", qos=1, retain=0, time=datetime.datetime.now(tz=get_localzone()))
+        with mock.patch.object(MqttListener, "get_messages", return_value=[message]):
+            runner.close()
+
+        self.assertEqual([m.topic for m in MessageSpool(spool_file).load()], ["a"])
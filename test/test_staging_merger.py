@@ -0,0 +1,42 @@
+import threading
+import unittest
+from unittest import mock
+
+from src.database import DatabaseConfKey, IngestMode
+from src.staging_merger import StagingMerger
+from test.fake_connection import FakeConnection
+from test.setup_test import SetupTest
+
+
+class TestStagingMerger(unittest.TestCase):
+
+    CONFIG = SetupTest.get_fake_database_config(**{
+        DatabaseConfKey.INGEST_MODE: IngestMode.STAGING,
+        DatabaseConfKey.STAGING_MERGE_CHUNK_SIZE: 100,
+    })
+
+    def create_merger(self) -> StagingMerger:
+        with mock.patch.object(threading.Thread, "start"):  # no thread, `merge` is called directly
+            merger = StagingMerger(self.CONFIG)
+        merger._store._connection = FakeConnection()
+        return merger
+
+    def test_merge_chunks(self):
+        merger = self.create_merger()
+        connection = merger._store._connection
+        connection.rowcounts = [100, 100, 42]
+
+        self.assertEqual(merger.merge(), 242)
+        self.assertEqual(merger.merged_count, 242)
+        self.assertEqual(connection.commit_count, 3)  # one transaction per chunk
+
+        statement = repr(connection.statements[0])
+        self.assertIn("Identifier('journal_staging')", statement)
+        self.assertIn("Identifier('journal')", statement)
+        self.assertIn("Literal(100)", statement)
+
+    def test_merge_nothing(self):
+        merger = self.create_merger()
+
+        self.assertEqual(merger.merge(), 0)
+        self.assertEqual(merger._store._connection.commit_count, 1)
@@ -0,0 +1,51 @@
+import datetime
+import unittest
+
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
+from src.message import Message
+from src.mqtt_client import MqttConfKey
+from src.timestamp_extractor import TimestampExtractor
+
+
+class TestTimestampExtractor(unittest.TestCase):
+
+    EXPECTED = datetime.datetime(2023, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc)
+
+    def test_json_formats(self):
+        extractor = TimestampExtractor({MqttConfKey.TIMESTAMP_JSON_FIELD: "meta.ts"})
+
+        for value in ['1672628645', '1672628645000', '"1672628645"', '"2023-01-02T03:04:05Z"', '"2023-01-02T04:04:05+01:00"']:
+            message = Message(topic="t", text='{"meta": {"ts": ' + value + '}}')
+            self.assertEqual(extractor.extract(message), self.EXPECTED, value)
+
+        self.assertEqual(extractor._parsers["t"], extractor.parse_iso)  # cached, re-detected on change
+
+        for text in ['{"meta": {"other": 1}}', '{"meta": 1}', '[1]', 'no json', None, '{"meta": {"ts": "invalid"}}']:
+            self.assertIsNone(extractor.extract(Message(topic="t", text=text)), text)
+
+    def test_user_property_and_topics(self):
+        extractor = TimestampExtractor({
+            MqttConfKey.TIMESTAMP_USER_PROPERTY: "ts",
+            MqttConfKey.TIMESTAMP_TOPIC_REGEXES: ["^device/"],
+        })
+        properties = Properties(PacketTypes.PUBLISH)
+        properties.UserProperty = ("ts", "2023-01-02T03:04:05Z")
+
+        self.assertEqual(extractor.extract(Message(topic="device/1"), properties), self.EXPECTED)
+        self.assertIsNone(extractor.extract(Message(topic="other/1"), properties))
+        self.assertIsNone(extractor.extract(Message(topic="device/1"), None))
+
+    def test_future_ignored(self):
+        extractor = TimestampExtractor({MqttConfKey.TIMESTAMP_JSON_FIELD: "ts", MqttConfKey.TIMESTAMP_MAX_FUTURE_SECONDS: 60})
+        future = datetime.datetime.now(tz=datetime.timezone.utc) + datetime.timedelta(seconds=120)
+
+        self.assertIsNone(extractor.extract(Message(topic="t", text='{"ts": %f}' % future.timestamp())))
+
+    def test_past_ignored(self):
+        extractor = TimestampExtractor({MqttConfKey.TIMESTAMP_JSON_FIELD: "ts", MqttConfKey.TIMESTAMP_MAX_PAST_SECONDS: 3600})
+        recent = datetime.datetime.now(tz=datetime.timezone.utc) - datetime.timedelta(seconds=60)
+
+        self.assertIsNone(extractor.extract(Message(topic="t", text='{"ts": 0}')))  # clock not synchronized
+        self.assertEqual(extractor.extract(Message(topic="t", text='{"ts": %f}' % recent.timestamp())), recent)
@@ -0,0 +1,32 @@
+import unittest
+
+from src.topic_filter import TopicFilter
+
+
+class TestTopicFilter(unittest.TestCase):
+
+    def test_literal_prefix(self):
+        self.assertEqual(TopicFilter.literal_prefix("^abc/def"), "abc/def")
+        self.assertEqual(TopicFilter.literal_prefix("abc/de.*"), "abc/de")
+        self.assertEqual(TopicFilter.literal_prefix("^abc/def?"), "abc/de")
+        self.assertEqual(TopicFilter.literal_prefix("^abc/(x|y)"), "")
+        self.assertEqual(TopicFilter.literal_prefix("(?i)abc"), "")
+
+    def test_restrict(self):
+        topic_filter = TopicFilter(["^zigbee/bridge", "^home/debug", ".*/debug$", "^home/cellar/temp$"])
+
+        self.assertTrue(topic_filter.restrict("tasmota/#"))  # ".*/debug$" (empty prefix) remains
+        self.assertFalse(TopicFilter(["^zigbee/bridge", "^home/debug"]).restrict("tasmota/#"))
+        self.assertTrue(topic_filter.restrict("tasmota/#").accept("tasmota/1"))
+        self.assertFalse(topic_filter.restrict("tasmota/#").accept("tasmota/debug"))
+
+        home = topic_filter.restrict("home/+/temp")
+        self.assertFalse(home.accept("home/debug/temp"))
+        self.assertFalse(home.accept("home/cellar/temp"))
+        self.assertTrue(home.accept("home/attic/temp"))
+
+        # no wildcards: only the regexes matching the topic remain
+        self.assertFalse(topic_filter.restrict("home/attic/temp"))
+        self.assertTrue(topic_filter.restrict("home/cellar/temp"))
+
+        self.assertTrue(topic_filter.restrict("$share/group/zigbee/#"))
@@ -0,0 +1,29 @@
+import unittest
+
+from src.topic_rules import TopicRules
+
+
+class TestTopicRules(unittest.TestCase):
+
+    def test_get(self):
+        rules = TopicRules([("^alarm/", "high"), ("^sensor/.*/raw$", "low"), ("^sensor/", "normal")], default="default")
+
+        self.assertTrue(rules)
+        self.assertEqual(rules.get("alarm/door"), "high")
+        self.assertEqual(rules.get("sensor/a/raw"), "low")
+        self.assertEqual(rules.get("sensor/a/value"), "normal")
+        self.assertEqual(rules.get("other"), "default")
+        self.assertEqual(rules.get("other"), "default")  # cached
+
+    def test_cache_limit(self):
+        rules = TopicRules([("^a", 1)], default=0)
+        rules.MAX_CACHE_SIZE = 10
+
+        for i in range(25):
+            self.assertEqual(rules.get(f"a{i}"), 1)
+        self.assertLessEqual(len(rules._cache), 10)
+
+    def test_empty(self):
+        rules = TopicRules([])
+        self.assertFalse(rules)
+        self.assertIsNone(rules.get("a"))
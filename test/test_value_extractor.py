@@ -0,0 +1,38 @@
+import unittest
+
+from src.database import DatabaseConfKey
+from src.message import Message
+from src.value_extractor import ValueExtractor
+
+
+class TestValueExtractor(unittest.TestCase):
+
+    def test_bare_payloads(self):
+        extractor = ValueExtractor({})
+
+        self.assertEqual(extractor.extract(Message(topic="t", text="23.5")), (23.5, None))
+        self.assertEqual(extractor.extract(Message(topic="t", text=" -4 ")), (-4.0, None))
+        self.assertEqual(extractor.extract(Message(topic="t", text="ON")), (None, True))
+        self.assertEqual(extractor.extract(Message(topic="t", text="false")), (None, False))
+
+        for text in ["nan", "1e999", "online", "", None, "[1, 2]", "12:30"]:
+            self.assertEqual(extractor.extract(Message(topic="t", text=text)), (None, None), text)
+
+    def test_json_paths(self):
+        extractor = ValueExtractor({DatabaseConfKey.VALUE_JSON_PATHS: {"^zigbee/": "state.temperature", "^plain/": ""}})
+
+        self.assertEqual(extractor.extract(Message(topic="other", text='{"value": 7}')), (7.0, None))  # default path
+        self.assertEqual(extractor.extract(Message(topic="other", text='{"value": "on"}')), (None, True))
+        self.assertEqual(extractor.extract(Message(topic="zigbee/1", text='{"state": {"temperature": 21.5}}')), (21.5, None))
+        self.assertEqual(extractor.extract(Message(topic="zigbee/1", text='{"value": 7}')), (None, None))
+        self.assertEqual(extractor.extract(Message(topic="plain/1", text='{"value": 7}')), (None, None))  # no JSON path
+        self.assertEqual(extractor.extract(Message(topic="plain/1", text='7')), (7.0, None))
+
+        self.assertEqual(extractor.extract(Message(topic="other", text='{"value": 7', content_type=None)), (None, None))
+        self.assertEqual(extractor.extract(Message(topic="other", text='{"value": 7}', content_type="text/plain")), (None, None))
+
+    def test_huge_json_integer(self):
+        extractor = ValueExtractor({})
+
+        text = '{"value": 1' + "0" * 400 + "}"  # too large for a float
+        self.assertEqual(extractor.extract(Message(topic="t", text=text)), (None, None))